@@ -27,6 +27,20 @@ DEALINGS IN THE SOFTWARE.
 `include "global.svh"
 `endif
 
+/* Defaults for the shared model: images and reset vector come from plusargs */
+`ifndef ICCM_INIT_FILE
+`define ICCM_INIT_FILE ""
+`endif
+`ifndef DCCM_INIT_FILE
+`define DCCM_INIT_FILE ""
+`endif
+`ifndef RESET_VECTOR
+`define RESET_VECTOR 32'h0
+`endif
+`ifndef STACK_POINTER_INIT_VALUE
+`define STACK_POINTER_INIT_VALUE 32'h80000000
+`endif
+
 module core_top_tb;
 
   localparam string ICCM_INIT_FILE = `ICCM_INIT_FILE;
@@ -41,8 +55,43 @@ module core_top_tb;
   integer            branch_count = 0;
   integer            mispredict_count = 0;
 
+  /* Watchdog: +MAX_CYCLES=<n> total cycle budget, +HANG_CYCLES=<n> cycles without retiring (0 = off) */
+  int unsigned     max_cycles = 0;
+  int unsigned     hang_cycles = 0;
+  logic [XLEN-1:0] last_retired_pc = 0;
+
   int              fd;
   int              fd_console;
+
+  /* +COMMIT_TRACE: binary records (tools/commit_trace.py) in rtl.trc/rtl.cyc instead of rtl.log lines */
+  localparam logic [31:0] TRACE_REG = 1, TRACE_STORE = 2, TRACE_TAKEN = 3, TRACE_NOT_TAKEN = 4;
+  int              fd_trace = 0;
+  int              fd_trace_cycles = 0;
+
+  /* +PMU_SAMPLE=<n>: every n cycles the low 32 bits of mcycle, minstret and the PMU_* event counters go to
+     pmu.smp as uint32 words, after a header (magic, words per sample); a last sample is taken at the end */
+  localparam logic [31:0] PMU_SAMPLE_MAGIC = 32'h31534d50;  // "PMS1"
+  int unsigned     pmu_sample = 0;
+  int unsigned     pmu_countdown = 0;
+  int              fd_pmu = 0;
+
+  /* +SIM_SERVER=<socket>: run the jobs of dv/verilator/core_top_tb.cpp one after the other, without $finish */
+  bit              server_mode = 0;
+  logic            run_over;
+
+`ifdef VERILATOR
+  import "DPI-C" function int sim_server_next_job();
+  import "DPI-C" function string sim_server_job_dir();
+  import "DPI-C" function string sim_server_job_imem();
+  import "DPI-C" function string sim_server_job_dmem();
+  import "DPI-C" function int unsigned sim_server_job_reset_vector();
+  import "DPI-C" function int unsigned sim_server_job_max_cycles();
+  import "DPI-C" function int unsigned sim_server_job_hang_cycles();
+  import "DPI-C" function int sim_server_job_commit_trace();
+  import "DPI-C" function int unsigned sim_server_job_pmu_sample();
+  import "DPI-C" function void sim_server_job_done(input longint unsigned mcycle, input longint unsigned minstret,
+                                                   input int branches, input int mispredicts);
+`endif
   /* DUT Instantiation */
   core_top #(
       .ICCM_INIT_FILE          (ICCM_INIT_FILE),
@@ -55,28 +104,112 @@ module core_top_tb;
   always #5 clk = ~clk;  // 100 MHz clock
 
   initial begin
-    /* Create a log file in the current directory */
     $timeformat(-9, 3, " ns", 10);
+    rst_n = 0;
+    server_mode = $test$plusargs("SIM_SERVER");
+    if (server_mode) begin
+`ifdef VERILATOR
+      serve_jobs();
+`else
+      $fatal(1, "+SIM_SERVER is only supported by the Verilator model");
+`endif
+    end
+    /* Create a log file in the current directory */
     fd = $fopen("rtl.log", "w");
     fd_console = $fopen("console.log", "w");
-    rst_n = 0;
+    if ($test$plusargs("COMMIT_TRACE")) begin
+      fd_trace = $fopen("rtl.trc", "wb");
+      fd_trace_cycles = $fopen("rtl.cyc", "wb");
+    end
+    void'($value$plusargs("RESET_VECTOR=%h", reset_vector));
+    void'($value$plusargs("MAX_CYCLES=%d", max_cycles));
+    void'($value$plusargs("HANG_CYCLES=%d", hang_cycles));
+    void'($value$plusargs("PMU_SAMPLE=%d", pmu_sample));
+    if (pmu_sample != 0) pmu_open("pmu.smp");
     for (int i = 0; i < 10; i++) begin
       @(negedge clk);
     end
     rst_n = 1;
   end
 
+`ifdef VERILATOR
+  /* Per job: logs in the job directory, full ICCM/DCCM images reloaded, core reset, report and counters back */
+  task automatic serve_jobs();
+    string job_dir;
+    longint unsigned mcycle, minstret;
+    int branches, mispredicts;
+    while (sim_server_next_job() != 0) begin
+      job_dir = sim_server_job_dir();
+      fd = $fopen({job_dir, "/rtl.log"}, "w");
+      fd_console = $fopen({job_dir, "/console.log"}, "w");
+      if (sim_server_job_commit_trace() != 0) begin
+        fd_trace = $fopen({job_dir, "/rtl.trc"}, "wb");
+        fd_trace_cycles = $fopen({job_dir, "/rtl.cyc"}, "wb");
+      end
+      $readmemh(sim_server_job_imem(), core_top_i.iccm_inst.mem);
+      $readmemh(sim_server_job_dmem(), core_top_i.dccm_inst.mem);
+      pmu_sample = sim_server_job_pmu_sample();
+      if (pmu_sample != 0) pmu_open({job_dir, "/pmu.smp"});
+      reset_vector = sim_server_job_reset_vector();
+      max_cycles = sim_server_job_max_cycles();
+      hang_cycles = sim_server_job_hang_cycles();
+      rst_n = 0;
+      for (int i = 0; i < 10; i++) begin
+        @(negedge clk);
+      end
+      rst_n = 1;
+      wait (run_over);
+      @(negedge clk);
+      mcycle = core_top_i.pmu_inst.mcycle_q;
+      minstret = core_top_i.pmu_inst.minstret_q;
+      branches = branch_count;
+      mispredicts = mispredict_count;
+      rst_n = 0;
+      /* Every job file is closed (flushed) before DONE: the client reads them as soon as it gets the reply */
+      $fclose(fd);
+      $fclose(fd_console);
+      if (fd_trace != 0) begin
+        $fclose(fd_trace);
+        $fclose(fd_trace_cycles);
+        fd_trace = 0;
+        fd_trace_cycles = 0;
+      end
+      if (fd_pmu != 0) begin
+        $fclose(fd_pmu);
+        fd_pmu = 0;
+      end
+      sim_server_job_done(mcycle, minstret, branches, mispredicts);
+    end
+    $finish;
+  endtask
+`endif
+
   /* Finish Sequence Detector */
   logic finish_seq_detected;
   always_ff @(posedge clk) begin
-    if (core_top_i.dccm_wen & core_top_i.dccm_waddr == 32'h10000000) begin
+    if (!rst_n) begin
+      finish_seq_detected <= 0;
+    end else if (core_top_i.dccm_wen & core_top_i.dccm_waddr == 32'h10000000) begin
       finish_seq_detected <= 1;
     end
   end
 
-  logic [31:0] cycle_count_last_retired;
+  /* End of a run: last PMU sample, then $finish, or back to the job loop in server mode */
+  task automatic end_run();
+    if (fd_pmu != 0) begin
+      pmu_write_sample();
+      $fflush(fd_pmu);
+    end
+    if (!server_mode) $finish;
+  endtask
+
+  logic [31:0] cycle_count_last_retired = 0;
     always_ff @(posedge clk) begin
-        if (finish_seq_detected) begin
+        if (!rst_n) begin
+            run_over <= 0;
+        end else if (run_over) begin
+            /* Il job è finito, il server lo chiude e rimette il core in reset */
+        end else if (finish_seq_detected) begin
             // ---> STAMPA IL RIEPILOGO FINALE CON TUTTE LE STATISTICHE <---
             $fdisplay(fd, "\n=============================================");
             $fdisplay(fd, "======         SIMULATION REPORT         ======");
@@ -97,12 +230,26 @@ module core_top_tb;
                 real misprediction_rate = (real'(mispredict_count) / real'(branch_count)) * 100.0;
                 $fdisplay(fd, "Misprediction Rate        : %.2f %%", misprediction_rate);
             end
+
+            $fdisplay(fd, "\n--- PMU Events ---");
+            $fdisplay(fd, "Load-Use Stall Cycles     : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_LOAD_USE_CYCLES]);
+            $fdisplay(fd, "MUL Busy Cycles           : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_MUL_BUSY_CYCLES]);
+            $fdisplay(fd, "DIV Busy Cycles           : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_DIV_BUSY_CYCLES]);
+            $fdisplay(fd, "MAC Busy Cycles           : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_MAC_BUSY_CYCLES]);
+            $fdisplay(fd, "Flush Cycles              : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_FLUSH_CYCLES]);
+            $fdisplay(fd, "BTB Misses                : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_BTB_MISSES]);
+            $fdisplay(fd, "Store-to-Load Forwards    : %0d", core_top_i.pmu_inst.mhpmcounter_q[PMU_STORE_FORWARDS]);
             $fdisplay(fd, "=============================================");
-            $finish;
-        end
-        if (cycle_count_last_retired > 1e10) begin
-            $fdisplay(fd, "Nothing retired in 1e10 cycles... Aborting");
-            $finish;
+            run_over <= 1;
+            end_run();
+        end else if (hang_cycles != 0 && cycle_count_last_retired >= hang_cycles) begin
+            $fdisplay(fd, "TIMEOUT: nothing retired in %0d cycles at cycle %0d, last retired pc 0x%H", hang_cycles, cycle_count, last_retired_pc);
+            run_over <= 1;
+            end_run();
+        end else if (max_cycles != 0 && cycle_count >= max_cycles) begin
+            $fdisplay(fd, "TIMEOUT: cycle budget of %0d cycles exhausted, last retired pc 0x%H", max_cycles, last_retired_pc);
+            run_over <= 1;
+            end_run();
         end
     end
 
@@ -110,11 +257,19 @@ module core_top_tb;
   always_ff @(posedge clk) begin
     if (rst_n) begin
       cycle_count <= cycle_count + 1;
-      cycle_count_last_retired <= cycle_count + 1;
+      cycle_count_last_retired <= cycle_count_last_retired + 1;
+    end else begin
+      cycle_count <= 0;
+      cycle_count_last_retired <= 0;
     end
     if (core_top_i.exu_wb_rd_wr_en | (core_top_i.exu_inst.lsu_inst.dc2_legal & core_top_i.exu_inst.lsu_inst.dc2_store) | (core_top_i.exu_inst.lsu_inst.dc3_legal & core_top_i.exu_inst.lsu_inst.dc3_store)) begin
       cycle_count_last_retired <= 'b0;
     end
+    if (core_top_i.exu_wb_rd_wr_en) begin
+      last_retired_pc <= core_top_i.exu_instr_tag_out;
+    end else if (core_top_i.exu_inst.lsu_inst.dc2_legal & core_top_i.exu_inst.lsu_inst.dc2_store) begin
+      last_retired_pc <= core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_tag_out;
+    end
   end
 
   always_ff @(posedge clk) begin
@@ -130,55 +285,111 @@ module core_top_tb;
             if (core_top_i.exu_inst.alu_inst.mispredict) begin
                 mispredict_count <= mispredict_count + 1;
             end
+        end else begin
+            branch_count <= 0;
+            mispredict_count <= 0;
         end
     end
 
+  task automatic pmu_open(input string path);
+    fd_pmu = $fopen(path, "wb");
+    $fwrite(fd_pmu, "%u%u", PMU_SAMPLE_MAGIC, 32'(PMU_EVENTS + 2));
+  endtask
+
+  task automatic pmu_write_sample();
+    $fwrite(fd_pmu, "%u%u", core_top_i.pmu_inst.mcycle_q[31:0], core_top_i.pmu_inst.minstret_q[31:0]);
+    for (int i = 0; i < PMU_EVENTS; i++) begin
+      $fwrite(fd_pmu, "%u", core_top_i.pmu_inst.mhpmcounter_q[i][31:0]);
+    end
+  endtask
+
+  /* PMU sampler: one record every pmu_sample cycles (the last one is written by end_run) */
+  always_ff @(posedge clk) begin
+    if (!rst_n) begin
+      pmu_countdown <= pmu_sample;
+    end else if (fd_pmu != 0 && !run_over && !finish_seq_detected) begin
+      if (pmu_countdown <= 1) begin
+        pmu_write_sample();
+        pmu_countdown <= pmu_sample;
+      end else begin
+        pmu_countdown <= pmu_countdown - 1;
+      end
+    end
+  end
+
+  /* Bytes a store writes from its address on, logged by both trace formats: the 2*XLEN store buffer holds
+     split stores whole, so every store is a single record with the value the ISS logs */
+  logic [2*XLEN-1:0] dc2_stored_bytes;
+  assign dc2_stored_bytes = (core_top_i.exu_inst.lsu_inst.dc2_store_buffer >> {core_top_i.exu_inst.lsu_inst.dc2_computed_addr[1:0], 3'b000}) &
+                            core_top_i.exu_inst.lsu_inst.dc2_store_mask_base;
+
+  task automatic trace_record(input logic [31:0] pc, input logic [31:0] instr, input logic [31:0] kind,
+                              input logic [31:0] addr, input logic [31:0] value);
+    $fwrite(fd_trace, "%u%u%u%u%u", pc, instr, kind, addr, value);
+    $fwrite(fd_trace_cycles, "%u", cycle_count);
+  endtask
+
   /* Use the monitor to log the log file */
   always_ff @(posedge clk) begin
     /* Log everytime we touch the state of our core: Write to the register file, change the PC and store to memory */
     if (core_top_i.exu_wb_rd_wr_en & ~core_top_i.ifu_inst.pc_load) begin  /* Hierarchical naming */
-      $fdisplay(fd, "%5d;0x%H;0x%H;x%0D=0x%H", cycle_count, core_top_i.exu_instr_tag_out,
-                core_top_i.exu_instr_out, core_top_i.exu_wb_rd_addr, core_top_i.exu_wb_data);
+      if (fd_trace != 0)
+        trace_record(core_top_i.exu_instr_tag_out, core_top_i.exu_instr_out, TRACE_REG,
+                     32'(core_top_i.exu_wb_rd_addr), core_top_i.exu_wb_data);
+      else
+        $fdisplay(fd, "%5d;0x%H;0x%H;x%0D=0x%H", cycle_count, core_top_i.exu_instr_tag_out,
+                  core_top_i.exu_instr_out, core_top_i.exu_wb_rd_addr, core_top_i.exu_wb_data);
     end
-    if (finish_seq_detected) begin
+    if (finish_seq_detected & ~run_over) begin
       $fdisplay(fd, "Simulation finished successfully at cycle %0d", cycle_count);
       $fdisplay(fd, "MCYCLE   = %0d", core_top_i.pmu_inst.mcycle_q);
       $fdisplay(fd, "MINSTRET = %0d", core_top_i.pmu_inst.minstret_q);
     end
     if (core_top_i.exu_wb_rd_wr_en & core_top_i.ifu_inst.pc_load) begin  /* JAL/JALR */
-      $fdisplay(fd, "%5d;0x%H;0x%H;x%0D=0x%H;pc=0x%H", cycle_count, core_top_i.exu_instr_tag_out,
-                core_top_i.exu_instr_out, core_top_i.exu_wb_rd_addr, core_top_i.exu_wb_data,
-                core_top_i.ifu_inst.pc_exu);
+      if (fd_trace != 0)
+        trace_record(core_top_i.exu_instr_tag_out, core_top_i.exu_instr_out, TRACE_REG,
+                     32'(core_top_i.exu_wb_rd_addr), core_top_i.exu_wb_data);
+      else
+        $fdisplay(fd, "%5d;0x%H;0x%H;x%0D=0x%H;pc=0x%H", cycle_count, core_top_i.exu_instr_tag_out,
+                  core_top_i.exu_instr_out, core_top_i.exu_wb_rd_addr, core_top_i.exu_wb_data,
+                  core_top_i.ifu_inst.pc_exu);
     end
 
     if (core_top_tb.core_top_i.ifu_inst.exu_branch_taken) begin  /* BEQ/BNE/BGE/BLT/BLTU/BGEU taken */
-      $fdisplay(fd, "%5d;0x%H;0x%H;taken=true;pc=0x%H", cycle_count,
-                core_top_i.exu_inst.alu_instr_tag_out, core_top_i.exu_inst.alu_instr_out,
-                core_top_tb.core_top_i.ifu_inst.exu_target_pc);
+      if (fd_trace != 0)
+        trace_record(core_top_i.exu_inst.alu_instr_tag_out, core_top_i.exu_inst.alu_instr_out, TRACE_TAKEN, 0, 0);
+      else
+        $fdisplay(fd, "%5d;0x%H;0x%H;taken=true;pc=0x%H", cycle_count,
+                  core_top_i.exu_inst.alu_instr_tag_out, core_top_i.exu_inst.alu_instr_out,
+                  core_top_tb.core_top_i.ifu_inst.exu_target_pc);
     end
 
     if (core_top_i.exu_inst.alu_inst.alu_ctrl.condbr & ~core_top_i.exu_inst.alu_inst.brn_taken & core_top_i.exu_inst.alu_inst.alu_ctrl.legal) begin  /* BEQ/BNE/BGE/BLT/BLTU/BGEU not taken */
-      $fdisplay(fd, "%5d;0x%H;0x%H;taken=false", cycle_count,
-                core_top_i.exu_inst.alu_inst.alu_ctrl.instr_tag,
-                core_top_i.exu_inst.alu_inst.alu_ctrl.instr);
+      if (fd_trace != 0)
+        trace_record(core_top_i.exu_inst.alu_inst.alu_ctrl.instr_tag, core_top_i.exu_inst.alu_inst.alu_ctrl.instr,
+                     TRACE_NOT_TAKEN, 0, 0);
+      else
+        $fdisplay(fd, "%5d;0x%H;0x%H;taken=false", cycle_count,
+                  core_top_i.exu_inst.alu_inst.alu_ctrl.instr_tag,
+                  core_top_i.exu_inst.alu_inst.alu_ctrl.instr);
     end
 
     if (core_top_i.exu_inst.lsu_inst.dc2_legal & core_top_i.exu_inst.lsu_inst.dc2_store) begin
-      $fdisplay(
-          fd, "%5d;0x%H;0x%H;mem[0x%8H]=0x%H", cycle_count,
-          core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_tag_out,
-          core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_out,
-          core_top_i.exu_inst.lsu_inst.dc2_computed_addr,
-          core_top_i.exu_inst.lsu_inst.dc2_store_buffer[XLEN-1:0] & core_top_i.exu_inst.lsu_inst.dc2_store_mask_base[XLEN-1:0]);
-    end
-
-    if (core_top_i.exu_inst.lsu_inst.dc3_legal & core_top_i.exu_inst.lsu_inst.dc3_store & core_top_i.exu_inst.lsu_inst.dc3_unaligned_addr) begin
-      $fdisplay(
-          fd, "%5d;0x%H;0x%H;mem[0x%8H]=0x%H", cycle_count,
-          core_top_i.exu_inst.lsu_inst.dc3_lsu_instr_tag_out,
-          core_top_i.exu_inst.lsu_inst.dc3_lsu_instr_out,
-          core_top_i.exu_inst.lsu_inst.dc3_computed_addr,
-          core_top_i.exu_inst.lsu_inst.dc3_store_buffer[XLEN-1:0] & core_top_i.exu_inst.lsu_inst.dc3_wb_data_mask[XLEN-1:0]);
+      if (fd_trace != 0)
+        trace_record(core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_tag_out, core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_out,
+                     TRACE_STORE, core_top_i.exu_inst.lsu_inst.dc2_computed_addr, dc2_stored_bytes[XLEN-1:0]);
+      else
+        $fdisplay(
+            fd, "%5d;0x%H;0x%H;mem[0x%8H]=0x%H", cycle_count,
+            core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_tag_out,
+            core_top_i.exu_inst.lsu_inst.dc2_lsu_instr_out,
+            core_top_i.exu_inst.lsu_inst.dc2_computed_addr, dc2_stored_bytes[XLEN-1:0]);
+    end
+
+    /* Annotation for the profiler: empty effect, so it is not compared against the ISS */
+    if (rst_n & core_top_i.exu_inst.alu_inst.mispredict) begin
+      $fdisplay(fd, "%5d;0x%H;0x%H;;mispredict", cycle_count, core_top_i.exu_inst.alu_inst.alu_ctrl.instr_tag,
+                core_top_i.exu_inst.alu_inst.alu_ctrl.instr);
     end
   end
 
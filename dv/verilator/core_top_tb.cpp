@@ -22,26 +22,160 @@ DEALINGS IN THE SOFTWARE.
 
 */
 
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <string>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <unistd.h>
+
 #include "Vcore_top_tb.h"
+#include "Vcore_top_tb__Dpi.h"
+#include "verilated.h"
+
+/* The trace format is chosen when the model is built (--trace or --trace-fst) */
+#if VM_TRACE_FST
+#include "verilated_fst_c.h"
+typedef VerilatedFstC TraceFile;
+#define TRACE_FILE "core_top.fst"
+#elif VM_TRACE
 #include "verilated_vcd_c.h"
+typedef VerilatedVcdC TraceFile;
+#define TRACE_FILE "core_top.vcd"
+#endif
+
+/* Value of +<name><value> as an unsigned integer, or dflt when the plusarg is absent */
+static uint64_t plusarg_u64(const char* name, uint64_t dflt) {
+    const char* arg = Verilated::commandArgsPlusMatch(name);
+    if (!arg[0]) return dflt;
+    return strtoull(arg + 1 + strlen(name), nullptr, 10);
+}
+
+/* ---- Simulation server (+SIM_SERVER=<socket>) ----
+ * One client at a time sends newline-terminated requests:
+ *   RUN <job dir> <imem.hex> <dmem.hex> <reset vector hex> <max cycles> <hang cycles> <commit trace 0|1> <pmu sample>
+ *   QUIT
+ * core_top_tb.sv reloads both memories, resets the core and writes rtl.log (and rtl.trc/rtl.cyc, pmu.smp) in the
+ * job directory; the reply is "DONE <mcycle> <minstret> <branches> <mispredicts>". */
+static int server_fd = -1;
+static int client_fd = -1;
+static std::string pending;
+static struct {
+    std::string dir, imem, dmem;
+    unsigned int reset_vector, max_cycles, hang_cycles, pmu_sample;
+    int commit_trace;
+} job;
+
+static bool server_listen(const char* path) {
+    struct sockaddr_un addr;
+    memset(&addr, 0, sizeof(addr));
+    addr.sun_family = AF_UNIX;
+    if (strlen(path) >= sizeof(addr.sun_path)) return false;
+    strcpy(addr.sun_path, path);
+    unlink(path);
+    server_fd = socket(AF_UNIX, SOCK_STREAM, 0);
+    return server_fd >= 0 && bind(server_fd, (struct sockaddr*)&addr, sizeof(addr)) == 0 && listen(server_fd, 1) == 0;
+}
+
+/* Next request line, accepting a new client when the previous one went away; false when there is none */
+static bool server_read_line(std::string& line) {
+    while (true) {
+        size_t eol = pending.find('\n');
+        if (eol != std::string::npos) {
+            line = pending.substr(0, eol);
+            pending.erase(0, eol + 1);
+            return true;
+        }
+        if (client_fd < 0) {
+            client_fd = accept(server_fd, nullptr, nullptr);
+            if (client_fd < 0) return false;
+            pending.clear();
+        }
+        char buf[4096];
+        ssize_t n = read(client_fd, buf, sizeof(buf));
+        if (n <= 0) {
+            close(client_fd);
+            client_fd = -1;
+            continue;
+        }
+        pending.append(buf, n);
+    }
+}
+
+int sim_server_next_job() {
+    std::string line;
+    while (server_read_line(line)) {
+        if (line == "QUIT") return 0;
+        char dir[4096], imem[4096], dmem[4096];
+        if (sscanf(line.c_str(), "RUN %4095s %4095s %4095s %x %u %u %d %u", dir, imem, dmem, &job.reset_vector,
+                   &job.max_cycles, &job.hang_cycles, &job.commit_trace, &job.pmu_sample) == 8) {
+            job.dir = dir;
+            job.imem = imem;
+            job.dmem = dmem;
+            return 1;
+        }
+        const char* error = "ERROR bad request\n";
+        if (write(client_fd, error, strlen(error)) < 0) perror("sim server");
+    }
+    return 0;
+}
+
+const char* sim_server_job_dir() { return job.dir.c_str(); }
+const char* sim_server_job_imem() { return job.imem.c_str(); }
+const char* sim_server_job_dmem() { return job.dmem.c_str(); }
+unsigned int sim_server_job_reset_vector() { return job.reset_vector; }
+unsigned int sim_server_job_max_cycles() { return job.max_cycles; }
+unsigned int sim_server_job_hang_cycles() { return job.hang_cycles; }
+int sim_server_job_commit_trace() { return job.commit_trace; }
+unsigned int sim_server_job_pmu_sample() { return job.pmu_sample; }
+
+void sim_server_job_done(unsigned long long mcycle, unsigned long long minstret, int branches, int mispredicts) {
+    char reply[256];
+    int len = snprintf(reply, sizeof(reply), "DONE %llu %llu %d %d\n", mcycle, minstret, branches, mispredicts);
+    if (client_fd >= 0 && write(client_fd, reply, len) < 0) perror("sim server");
+}
 
 int main(int argc, char **argv, char **env) {
     Verilated::commandArgs(argc, argv);
     Vcore_top_tb* top = new Vcore_top_tb;
-    Verilated::traceEverOn(true);
-    VerilatedVcdC* tfp = new VerilatedVcdC;
-    top->trace(tfp, 99);
-    tfp->open("core_top.vcd");
+    const char* server_arg = Verilated::commandArgsPlusMatch("SIM_SERVER=");
+    if (server_arg[0] && !server_listen(server_arg + strlen("+SIM_SERVER="))) {
+        perror("sim server");
+        return 1;
+    }
+#if VM_TRACE
+    /* Dump only when +waves_start= is given, and only inside [waves_start, waves_end] */
+    TraceFile* tfp = nullptr;
+    uint64_t waves_start = plusarg_u64("waves_start=", UINT64_MAX);
+    uint64_t waves_end = plusarg_u64("waves_end=", UINT64_MAX);
+    bool waves_exit = Verilated::commandArgsPlusMatch("waves_exit")[0];
+    if (waves_start != UINT64_MAX) {
+        Verilated::traceEverOn(true);
+        tfp = new TraceFile;
+        top->trace(tfp, 99);
+        tfp->open(TRACE_FILE);
+    }
+#endif
 
     printf("****** START of CORE TOP SIM ****** \n");
 
     while (!Verilated::gotFinish()) {
         top->eval();
-        tfp->dump(Verilated::time());
+#if VM_TRACE
+        if (tfp && Verilated::time() >= waves_start && Verilated::time() <= waves_end) {
+            tfp->dump(Verilated::time());
+        }
+        /* +waves_exit: stop as soon as the window has been captured */
+        if (tfp && waves_exit && Verilated::time() > waves_end) break;
+#endif
         Verilated::timeInc(1);
     }
-    tfp->close();
+#if VM_TRACE
+    if (tfp) tfp->close();
+#endif
     printf("****** END of CORE TOP SIM ****** \n");
     delete top;
     return 0;
-}
\ No newline at end of file
+}
@@ -105,6 +105,9 @@ module core_top #(
   logic incr_instr;     // pulse @commit
   logic commit_valid;   // pulse @commit
   logic [63:0] mcycle_q, minstret_q;
+  logic [PMU_EVENTS-1:0] pmu_event;  // Un bit per evento, indici PMU_* in global.svh
+  logic [63:0] mhpmcounter_q [PMU_EVENTS];
+  logic pmu_refill_q;   // Dopo un flush, finché l'IFU non consegna di nuovo un'istruzione
 
   /* Modules Instantiations */
 
@@ -113,6 +116,26 @@ module core_top #(
   assign incr_cycle = 1'b1; 
   assign commit_valid = exu_wb_rd_wr_en | dccm_wen | ifu_inst.pc_load;
   assign incr_instr = commit_valid; //exu_wb_rd_wr_en & ~pc_load;
+
+  /* Extended events. Load-use: IDU1 held behind an in-flight load/store (the interlock waits for the LSU).
+     Flush: the redirect cycle and the bubbles until the IFU delivers again. BTB miss: the BHT predicts
+     taken but the BTB has no target, so fetch falls through. Store forward: a load access served by the
+     store forwarding path (each half of a split load counts). */
+  always_ff @(posedge clk or negedge rst_n) begin
+    if (!rst_n) pmu_refill_q <= 1'b0;
+    else if (pc_load) pmu_refill_q <= 1'b1;
+    else if (instr_valid) pmu_refill_q <= 1'b0;
+  end
+
+  assign pmu_event[PMU_LOAD_USE_CYCLES] = pipe_stall & idu1_inst.last_issued_instr.lsu;
+  assign pmu_event[PMU_MUL_BUSY_CYCLES] = exu_mul_busy;
+  assign pmu_event[PMU_DIV_BUSY_CYCLES] = exu_div_busy;
+  assign pmu_event[PMU_MAC_BUSY_CYCLES] = exu_mac_busy;
+  assign pmu_event[PMU_FLUSH_CYCLES] = pc_load | (pmu_refill_q & ~instr_valid);
+  assign pmu_event[PMU_BTB_MISSES] = instr_mem_rdata_valid & ifu_inst.bht_predicted_taken & ~ifu_inst.btb_hit & ~pipe_stall & ~pc_load;
+  assign pmu_event[PMU_STORE_FORWARDS] = (exu_inst.lsu_inst.dc1_load & exu_inst.lsu_inst.dc1_store_forward & ~exu_inst.lsu_inst.lsu_stall_q) |
+                                         (exu_inst.lsu_inst.dc2_load & exu_inst.lsu_inst.dc2_store_forward_next);
+
   perf_counter #(
         .CNT_WIDTH(64)
     ) pmu_inst (
@@ -120,11 +143,13 @@ module core_top #(
         .rst_n(rst_n),
         .incr_cycle(incr_cycle),
         .incr_instr(incr_instr),
+        .incr_event(pmu_event),
         .csr_we(1'b0),
         .csr_addr(12'd0),
         .csr_wdata('0),
         .mcycle_q(mcycle_q),
-        .minstret_q(minstret_q)
+        .minstret_q(minstret_q),
+        .mhpmcounter_q(mhpmcounter_q)
     );
 
   /* Instruction Memory */
@@ -35,7 +35,8 @@
 `endif
 
 module perf_counter #(
-    parameter CNT_WIDTH = 64
+    parameter CNT_WIDTH = 64,
+    parameter N_EVENTS  = PMU_EVENTS
 ) (
     input  logic                  clk,
     input  logic                  rst_n,
@@ -43,13 +44,15 @@ module perf_counter #(
     // Pulsi di incremento (1‑cycle high)
     input  logic                  incr_cycle,
     input  logic                  incr_instr,   // exu_wb_rd_wr_en && ~pipe_flush
+    input  logic [N_EVENTS-1:0]   incr_event,   // Un bit per evento, indici PMU_* in global.svh
 
     input  logic                  csr_we,
     input  logic [11:0]           csr_addr,
     input  logic [CNT_WIDTH-1:0]  csr_wdata,
 
     output logic [CNT_WIDTH-1:0]  mcycle_q,
-    output logic [CNT_WIDTH-1:0]  minstret_q
+    output logic [CNT_WIDTH-1:0]  minstret_q,
+    output logic [CNT_WIDTH-1:0]  mhpmcounter_q [N_EVENTS]
 );
 
     // MCYCLE
@@ -66,4 +69,13 @@ module perf_counter #(
         else if (incr_instr)       minstret_q <= minstret_q + 1'b1;
     end
 
+    // MHPMCOUNTER3..: un contatore per evento
+    for (genvar i = 0; i < N_EVENTS; i++) begin : g_mhpmcounter
+        always_ff @(posedge clk or negedge rst_n) begin
+            if (!rst_n)                mhpmcounter_q[i] <= '0;
+            else if (csr_we && csr_addr == 12'(12'hB03 + i))  mhpmcounter_q[i] <= csr_wdata;
+            else if (incr_event[i])    mhpmcounter_q[i] <= mhpmcounter_q[i] + 1'b1;
+        end
+    end
+
 endmodule
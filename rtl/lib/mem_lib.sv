@@ -53,9 +53,12 @@ module iccm #(
 
   assign line_idx = raddr[$clog2(DEPTH*WIDTH/8)-1:$clog2(WIDTH/8)];
 
-  /* Initialize memory */
+  /* Initialize memory, +ICCM_INIT_FILE=<path> overrides INIT_FILE at runtime */
   initial begin
-    $readmemh(INIT_FILE, mem);
+    string init_file;
+    init_file = INIT_FILE;
+    void'($value$plusargs("ICCM_INIT_FILE=%s", init_file));
+    if (init_file != "") $readmemh(init_file, mem);
   end
 
   /*
@@ -113,9 +116,12 @@ module dccm #(
 
   logic [WIDTH-1:0] mem[DEPTH];
 
-  /* Initialize memory */
+  /* Initialize memory, +DCCM_INIT_FILE=<path> overrides INIT_FILE at runtime */
   initial begin
-    $readmemh(INIT_FILE, mem);
+    string init_file;
+    init_file = INIT_FILE;
+    void'($value$plusargs("DCCM_INIT_FILE=%s", init_file));
+    if (init_file != "") $readmemh(init_file, mem);
   end
 
   /* Read Port */
@@ -0,0 +1,44 @@
+    .globl   _start
+    .section .text
+
+_start:
+
+# Init Memory regions with a pattern, so a wrong byte lane shows up in the value
+    li       x1, 0x11223344
+    sw       x1, 0(x0)
+    sw       x1, 4(x0)
+    sw       x1, 8(x0)
+    sw       x1, 12(x0)
+    sw       x1, 16(x0)
+    sw       x1, 20(x0)
+    sw       x1, 24(x0)
+    sw       x1, 28(x0)
+
+    li       x31, 0xcafebabe
+# Byte stores at offsets 1, 2 and 3
+    sb       x31, 1(x0)
+    sb       x31, 2(x0)
+    sb       x31, 3(x0)
+    lw       x2, 0(x0)
+
+# Halfword stores at offsets 1 and 2, and at offset 3 (split across two words)
+    sh       x31, 5(x0)
+    lw       x3, 4(x0)
+    sh       x31, 10(x0)
+    lw       x4, 8(x0)
+    sh       x31, 15(x0)
+    lw       x5, 12(x0)
+    lw       x6, 16(x0)
+
+# Word stores at offsets 1, 2 and 3 (all split across two words)
+    li       x30, 0x89abcdef
+    sw       x30, 17(x0)
+    lw       x7, 16(x0)
+    lw       x8, 20(x0)
+    sw       x30, 22(x0)
+    lw       x9, 20(x0)
+    lw       x10, 24(x0)
+    sw       x30, 27(x0)
+    lw       x11, 24(x0)
+    lw       x12, 28(x0)
+    .include "eot_sequence.s"
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Binary commit trace shared by core_top_tb.sv (+COMMIT_TRACE), the ISS stage and sim_manager.py.
+
+A trace is a flat array of fixed-width little-endian records `pc, instr, kind, addr, value`
+(5 x uint32), one per instruction that touches architectural state, in the order the text logs
+list them. `kind` says what `addr`/`value` hold:
+
+    REG        addr = destination register, value = written data (jal/jalr included)
+    STORE      addr = byte address, value = stored data (the whole access, split stores included)
+    TAKEN      conditional branch taken, addr = value = 0
+    NOT_TAKEN  conditional branch not taken, addr = value = 0
+
+The fields are exactly the ones compare_results looks at in the text logs, so two traces match
+if and only if their bytes do. The testbench also writes the cycle of every record as a uint32
+array in a sibling `.cyc` file, used to place the waveform window around a mismatch.
+
+Usage: commit_trace.py work/<test>/rtl.trc [--start N] [--count N]
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from typing import Optional
+
+RECORD = struct.Struct("<5I")
+CYCLE = struct.Struct("<I")
+REG, STORE, TAKEN, NOT_TAKEN = 1, 2, 3, 4
+CHUNK = 1 << 20
+
+def effect_record(pc: int, instr: int, effect: str) -> Optional[bytes]:
+    """Record of a text-log effect (`xN=0x..`, `mem[0x..]=0x..`, `taken=..`), None for no effect."""
+    field = effect.split(";", 1)[0].strip().lower()
+    if not field:
+        return None
+    if field.startswith("x"):
+        reg, value = field[1:].split("=")
+        return RECORD.pack(pc, instr, REG, int(reg), int(value, 16))
+    if field.startswith("mem["):
+        addr, value = field[4:].split("]=")
+        return RECORD.pack(pc, instr, STORE, int(addr, 16), int(value, 16))
+    if field == "taken=true":
+        return RECORD.pack(pc, instr, TAKEN, 0, 0)
+    if field == "taken=false":
+        return RECORD.pack(pc, instr, NOT_TAKEN, 0, 0)
+    raise ValueError(f"Unknown effect '{effect}'")
+
+class TraceWriter:
+    """File-like sink for iss.log-style lines (`0xPC;0xINSTR;mnemonic;effect`) that writes records instead."""
+    def __init__(self, f):
+        self.f = f
+
+    def writelines(self, lines) -> None:
+        records = []
+        for line in lines:
+            parts = line.rstrip("\n").split(";")
+            if len(parts) >= 4 and parts[3].strip():
+                records.append(effect_record(int(parts[0], 16), int(parts[1], 16), parts[3]))
+        self.f.write(b"".join(records))
+
+    def write(self, line: str) -> None:
+        self.writelines([line])
+
+def convert_log(log_path: str, trace_path: str) -> None:
+    """Binary trace of an iss.log written by Spike or riscv_sim."""
+    with open(log_path, 'r') as log, open(trace_path, 'wb') as f:
+        TraceWriter(f).writelines(log)
+
+def record_count(path: str) -> int:
+    return os.path.getsize(path) // RECORD.size
+
+def format_effect(kind: int, addr: int, value: int) -> str:
+    if kind == REG:
+        return f"x{addr}=0x{value:08x}"
+    if kind == STORE:
+        return f"mem[0x{addr:08x}]=0x{value:08x}"
+    if kind in (TAKEN, NOT_TAKEN):
+        return "taken=true" if kind == TAKEN else "taken=false"
+    return f"kind{kind}:0x{addr:08x}=0x{value:08x}"
+
+def format_record(record: tuple) -> str:
+    pc, instr, kind, addr, value = record
+    return f"0x{pc:08x};0x{instr:08x};{format_effect(kind, addr, value)}"
+
+def _map(f):
+    """Read-only mapping of a whole file (empty files have nothing to map)."""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+def _first_differing_byte(a, b, length: int) -> Optional[int]:
+    """memcmp over 1 MiB chunks, then bisection inside the first chunk that differs."""
+    for start in range(0, length, CHUNK):
+        end = min(start + CHUNK, length)
+        if a[start:end] == b[start:end]:
+            continue
+        while end - start > 64:
+            mid = (start + end) // 2
+            if a[start:mid] != b[start:mid]:
+                end = mid
+            else:
+                start = mid
+        return next(i for i in range(start, end) if a[i] != b[i])
+    return None
+
+def find_record(path: str, kind: int, addr: int, value: int) -> Optional[int]:
+    """Index of the first record with the given kind/addr/value, if any."""
+    key = RECORD.pack(0, 0, kind, addr, value)[8:]
+    with open(path, 'rb') as f:
+        data = _map(f)
+        pos = data.find(key, 8)
+        while pos != -1 and (pos - 8) % RECORD.size:
+            pos = data.find(key, pos + 1)
+        return None if pos == -1 else (pos - 8) // RECORD.size
+
+def first_difference(path_a: str, path_b: str, limit_b: Optional[int] = None):
+    """(index, record_a, record_b) of the first differing record, None if the traces are equal.
+    The record of the shorter trace is None past its end; limit_b truncates the second trace."""
+    with open(path_a, 'rb') as fa, open(path_b, 'rb') as fb:
+        a, b = _map(fa), _map(fb)
+        len_a = len(a) // RECORD.size * RECORD.size
+        len_b = len(b) // RECORD.size * RECORD.size
+        if limit_b is not None:
+            len_b = min(len_b, limit_b * RECORD.size)
+        common = min(len_a, len_b)
+        offset = _first_differing_byte(a, b, common)
+        if offset is None:
+            if len_a == len_b:
+                return None
+            offset = common
+        index = offset // RECORD.size
+        at = index * RECORD.size
+        record_a = RECORD.unpack_from(a, at) if at < len_a else None
+        record_b = RECORD.unpack_from(b, at) if at < len_b else None
+        return index, record_a, record_b
+
+def cycles_path(trace_path: str) -> str:
+    return os.path.splitext(trace_path)[0] + ".cyc"
+
+def cycle_at(trace_path: str, index: int) -> int:
+    """Cycle of the index-th record (or of the last one, when the trace is shorter)."""
+    try:
+        with open(cycles_path(trace_path), 'rb') as f:
+            count = os.fstat(f.fileno()).st_size // CYCLE.size
+            if count == 0:
+                return 0
+            f.seek(min(index, count - 1) * CYCLE.size)
+            return CYCLE.unpack(f.read(CYCLE.size))[0]
+    except FileNotFoundError:
+        return 0
+
+def dump(trace_path: str, start: int = 0, count: Optional[int] = None, out=sys.stdout) -> None:
+    """Text view of a trace: rtl.log-style lines when the cycles are available, iss.log-style otherwise."""
+    cyc = cycles_path(trace_path)
+    with open(trace_path, 'rb') as f:
+        data = _map(f)
+        cycles = None
+        if os.path.exists(cyc) and os.path.getsize(cyc):
+            with open(cyc, 'rb') as fc:
+                cycles = _map(fc)
+        total = len(data) // RECORD.size
+        end = total if count is None else min(total, start + count)
+        for index in range(start, end):
+            record = RECORD.unpack_from(data, index * RECORD.size)
+            if cycles is not None and (index + 1) * CYCLE.size <= len(cycles):
+                out.write(f"{CYCLE.unpack_from(cycles, index * CYCLE.size)[0]:5d};{format_record(record)}\n")
+            else:
+                out.write(format_record(record) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a binary commit trace (rtl.trc/iss.trc) as text")
+    parser.add_argument("trace", help="Trace file")
+    parser.add_argument("--start", type=int, default=0, help="First record to print")
+    parser.add_argument("--count", type=int, default=None, help="Number of records to print (default: all)")
+    args = parser.parse_args()
+    try:
+        dump(args.trace, args.start, args.count)
+    except BrokenPipeError:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,83 @@
 # Open the decode table file
-import sys
 import os, tempfile
 import re
 import subprocess
+import argparse
+import hashlib
+import concurrent.futures
+import random
 
-with open(sys.argv[1], 'r') as f:
-    lines = f.readlines()
-
-# Get the indexes of .definition, .input, .ouput, .decode and .end
-definition_idx = None
-input_idx = None
-output_idx = None
-decode_idx = None
-end_idx = None
-
-for i, line in enumerate(lines):
-    if line.startswith('.definition'):
-        definition_idx = i
-    elif line.startswith('.input'):
-        input_idx = i
-    elif line.startswith('.output'):
-        output_idx = i
-    elif line.startswith('.decode'):
-        decode_idx = i
-    elif line.startswith('.end'):
-        end_idx = i
-
-# Let's create a temp file for the decodes
-outputs = []
-instr_encoding = {}
-decode_file = tempfile.NamedTemporaryFile(delete=True)
-with open(decode_file.name, 'w') as f:
-    f.write(".i 32\n")
+CACHE_DIR = os.path.join("work", ".cache", "espresso")
+ESPRESSO_CMD = "espresso -o eqntott"
+
+def pla_header(names):
+    header = ".i 32\n"
+    header += f".o {len(names)}\n"
+    header += ".ilb "
+    for i in range(32):
+        header += f"i[{31 - i}] "
+    header += "\n"
+    header += ".ob " + " ".join(names) + " \n"
+    return header
+
+def single_output_pla(name, cubes):
+    """PLA of one output: its on-set cubes, everything else is the off-set."""
+    body = "".join(f"{encoding} 1 # {instr}\n" for instr, encoding in cubes)
+    return pla_header([name]) + body + ".e\n"
+
+def minimize(name, pla, use_cache=True, cmd=ESPRESSO_CMD):
+    """espresso result for one PLA (by default the eqntott equation of one output), memoized on the hash of the PLA."""
+    key = hashlib.sha256(f"{cmd}\0{pla}".encode()).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, key)
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            return f.read(), True
+    with tempfile.NamedTemporaryFile('w', suffix=".pla", delete=True) as pla_file:
+        pla_file.write(pla)
+        pla_file.flush()
+        output = subprocess.check_output(f"{cmd} {pla_file.name}", shell=True).decode('utf-8')
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(output)
+        os.replace(tmp_path, cache_path)
+    return output, False
+
+# --- MODALITÀ DEPTH: termini prodotto condivisi sui campi opcode/funct3/funct7 ---
+FIELD_BITS = list(range(0, 7)) + list(range(12, 15)) + list(range(25, 32))
+GATE_INPUTS = 4
+
+def parse_table(path):
+    """(outputs, {instr: encoding}, {instr: output bits}) of a decode table."""
+    with open(path, 'r') as f:
+        lines = f.readlines()
+
+    # Get the indexes of .definition, .input, .ouput, .decode and .end
+    definition_idx = None
+    input_idx = None
+    output_idx = None
+    decode_idx = None
+    end_idx = None
+
+    for i, line in enumerate(lines):
+        if line.startswith('.definition'):
+            definition_idx = i
+        elif line.startswith('.input'):
+            input_idx = i
+        elif line.startswith('.output'):
+            output_idx = i
+        elif line.startswith('.decode'):
+            decode_idx = i
+        elif line.startswith('.end'):
+            end_idx = i
+
+    outputs = []
+    instr_encoding = {}
     # Calculate the output
     for i in range(output_idx + 1, decode_idx):
         if "{" not in lines[i] and "}" not in lines[i] and lines[i].strip() != "":
             outputs.append(lines[i].strip())
-    f.write(f".o {len(outputs)}\n")
-    f.write(f".ilb ")
-    for i in range (32):
-        f.write(f"i[{31 - i}] ")
-    f.write("\n")
-    f.write(f".ob ")
-    for output in outputs:
-        f.write(f"{output} ")
-    f.write("\n")
 
     # Generate the input matching expressions
     for i in range(definition_idx + 1, input_idx):
@@ -66,103 +99,251 @@ with open(decode_file.name, 'w') as f:
         l = re.search(r'\{(.*?)\}', lines[i])
         if l:
             decoding_expression = []
-            # Start from revrse order on the outputs
+            # Substring match on purpose: the generated decode.sv relies on it (e.g. macrst also raises mac)
             for output in outputs:
                 if output in l.group(1):
                     decoding_expression.append('1')
                 else:
                     decoding_expression.append('0')
             instr_output[instr_name] = ''.join(decoding_expression)
-    
+
     # Make sure that the keys of instr_output are the same as the keys of instr_encoding
     for key in instr_encoding.keys():
         if key not in instr_output.keys():
             # Throw an error
             raise ValueError(f"Instruction {key} not found in the output")
-            exit(1)
-    
-    for key in instr_encoding.keys():
-        f.write(f"{instr_encoding[key]} {instr_output[key]} # {key}\n")
-    
-    f.write(".e\n")
-
-# Let's create the legal encoding file
-legal_encoding = tempfile.NamedTemporaryFile(delete=True)
-with open(legal_encoding.name, 'w') as f:
-    f.write(".i 32\n")
-    f.write(".o 1\n")
-    f.write(".ilb ")
-    for i in range(32):
-        f.write(f"i[{31-i}] ")
-    f.write("\n")
-    f.write(".ob legal\n")
-    for key in instr_encoding.keys():
-        f.write(f"{instr_encoding[key]} 1 # {key}\n")
-    f.write(".e\n")
+    return outputs, instr_encoding, instr_output
+
+def flat_equations(outputs, instr_encoding, instr_output, jobs, use_cache):
+    """eqntott text of every output and of legal, one espresso run per output."""
+    # One PLA per output plus the legal-encoding PLA, minimized concurrently (espresso runs as a subprocess)
+    plas = {}
+    for idx, output in enumerate(outputs):
+        cubes = [(key, instr_encoding[key]) for key in instr_encoding.keys() if instr_output[key][idx] == '1']
+        plas[output] = single_output_pla(output, cubes) if cubes else None
+    plas['legal'] = single_output_pla('legal', list(instr_encoding.items()))
+
+    equations = {}
+    reused = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(minimize, name, pla, use_cache): name for name, pla in plas.items() if pla is not None}
+        for future in concurrent.futures.as_completed(futures):
+            equations[futures[future]], cached = future.result()
+            reused += cached
+    print(f"Minimized {len(equations) - reused} of {len(equations)} equations ({reused} from {CACHE_DIR})")
+    return plas, equations
+
+def parse_eqntott(text):
+    """Terms of an eqntott equation: a list of {signal: polarity} (empty term = constant 1)."""
+    rhs = " ".join(line for line in text.split("\n") if not line.startswith("#")).split("=", 1)[1].split(";")[0].strip()
+    if rhs in ("", "()", "0"):
+        return []
+    terms = []
+    for term in (re.findall(r"\(([^()]*)\)", rhs) or [rhs]):
+        literals = {}
+        for lit in term.split("&"):
+            lit = lit.strip()
+            if lit and lit != "1":
+                literals[lit.lstrip("!~")] = not lit.startswith(("!", "~"))
+        terms.append(literals)
+    return terms
+
+def aux_inputs(instr_encoding):
+    """Conditions on bits outside opcode/funct3/funct7 (e.g. the all-zero operands of nop), one per distinct pattern."""
+    patterns = []
+    for encoding in instr_encoding.values():
+        pattern = tuple((31 - k, c) for k, c in enumerate(encoding) if c != '-' and (31 - k) not in FIELD_BITS)
+        if pattern and pattern not in patterns:
+            patterns.append(pattern)
+    return patterns
+
+def shared_pla(outputs, instr_encoding, instr_output, field_bits, aux):
+    """Multi-output PLA (outputs + legal) over the used field bits and the aux conditions."""
+    names = [f"i[{b}]" for b in field_bits] + [f"aux[{a}]" for a in range(len(aux))]
+    pla = f".i {len(names)}\n.o {len(outputs) + 1}\n.ilb {' '.join(names)} \n.ob {' '.join(outputs)} legal \n"
+    for key, encoding in instr_encoding.items():
+        cube = "".join(encoding[31 - b] for b in field_bits)
+        pattern = tuple((31 - k, c) for k, c in enumerate(encoding) if c != '-' and (31 - k) not in FIELD_BITS)
+        cube += "".join('1' if pattern and aux[a] == pattern else '-' for a in range(len(aux)))
+        pla += f"{cube} {instr_output[key]}1 # {key}\n"
+    return pla + ".e\n"
+
+def parse_pla_cover(text, n_inputs):
+    """(input cube, output part) of every product term of an espresso PLA."""
+    cover = []
+    for line in text.split("\n"):
+        tokens = line.split()
+        if len(tokens) == 2 and not line.startswith(".") and len(tokens[0]) == n_inputs:
+            cover.append((tokens[0], tokens[1]))
+    return cover
+
+def shared_terms(outputs, instr_encoding, instr_output, use_cache):
+    """(aux patterns, product terms as {signal: polarity}, {output: [term index]})."""
+    used = [b for b in FIELD_BITS if any(enc[31 - b] != '-' for enc in instr_encoding.values())]
+    field_bits = sorted(used, reverse=True)
+    aux = aux_inputs(instr_encoding)
+    names = [f"i[{b}]" for b in field_bits] + [f"aux[{a}]" for a in range(len(aux))]
+    text, _ = minimize("shared", shared_pla(outputs, instr_encoding, instr_output, field_bits, aux), use_cache, "espresso")
+    terms, fanout = [], {name: [] for name in outputs + ['legal']}
+    for cube, outs in parse_pla_cover(text, len(names)):
+        literals = {names[k]: c == '1' for k, c in enumerate(cube) if c != '-'}
+        if literals not in terms:
+            terms.append(literals)
+        idx = terms.index(literals)
+        for name, bit in zip(outputs + ['legal'], outs):
+            if bit == '1' and idx not in fanout[name]:
+                fanout[name].append(idx)
+    return aux, terms, fanout
+
+def literal_sv(signal, polarity):
+    return signal if polarity else f"~{signal}"
+
+def levels(fan_in):
+    """Gate levels of a balanced tree of GATE_INPUTS-input gates."""
+    n = 0
+    while fan_in > 1:
+        fan_in = -(-fan_in // GATE_INPUTS)
+        n += 1
+    return n
 
-# Run Espresso on both files and record output on a variable using subprocess
-decode_output = subprocess.check_output(f"espresso -o eqntott {decode_file.name}", shell=True)
-legal_output = subprocess.check_output(f"espresso -o eqntott {legal_encoding.name}", shell=True)
+def output_stats(terms):
+    """(terms, max AND fan-in, OR fan-in, estimated levels) of a sum of products."""
+    and_fan_in = max((len(t) for t in terms), default=0)
+    return len(terms), and_fan_in, len(terms), levels(and_fan_in) + levels(len(terms))
 
-# Print legal_output
-with open(legal_encoding.name, 'r') as f:
-    print(f.read())
+# Vettorizzazione bit-parallela: ogni segnale è un intero il cui bit j è il suo valore sull'encoding j
+def sample_encodings(instr_encoding, per_entry=16, seed=0):
+    """Every table entry with its don't-cares all 0, all 1 and random."""
+    rng = random.Random(seed)
+    samples = []
+    for encoding in instr_encoding.values():
+        for n in range(per_entry):
+            bits = ""
+            for c in encoding:
+                bits += c if c != '-' else ('0' if n == 0 else '1' if n == 1 else rng.choice('01'))
+            samples.append(int(bits, 2))
+    return samples
 
-decode_output = decode_output.decode('utf-8')
-legal_output = legal_output.decode('utf-8')
+def eval_sum_of_products(terms, signals, all_ones):
+    value = 0
+    for literals in terms:
+        t = all_ones
+        for signal, polarity in literals.items():
+            t &= signals[signal] if polarity else ~signals[signal] & all_ones
+        value |= t
+    return value
 
-decode_output = decode_output.replace("!", "~")
-legal_output = legal_output.replace("!", "~")
+def input_vectors(samples, aux):
+    all_ones = (1 << len(samples)) - 1
+    signals = {}
+    for b in range(32):
+        signals[f"i[{b}]"] = sum(((s >> b) & 1) << j for j, s in enumerate(samples))
+    for a, pattern in enumerate(aux):
+        signals[f"aux[{a}]"] = eval_sum_of_products([{f"i[{b}]": c == '1' for b, c in pattern}], signals, all_ones)
+    return signals, all_ones
 
-# Remove all the lines that start with "#"
-decode_output = "\n".join([line for line in decode_output.split("\n") if not line.startswith("#")])
-legal_output = "\n".join([line for line in legal_output.split("\n") if not line.startswith("#")])
+def check_equivalence(flat, aux, terms, fanout, instr_encoding):
+    samples = sample_encodings(instr_encoding)
+    signals, all_ones = input_vectors(samples, aux)
+    for name, flat_terms in flat.items():
+        expected = eval_sum_of_products(flat_terms, signals, all_ones)
+        got = eval_sum_of_products([terms[t] for t in fanout[name]], signals, all_ones)
+        if expected != got:
+            j = ((expected ^ got) & -(expected ^ got)).bit_length() - 1
+            raise ValueError(f"Shared decoder differs from the flat one on {name} for encoding 0x{samples[j]:08x}")
+    return len(samples)
 
-# Join the two outputs
-output = decode_output + legal_output
+def depth_report(outputs, flat, aux, terms, fanout):
+    lines = [f"# Decoder logic depth (gate levels with {GATE_INPUTS}-input gates, inverters not counted)",
+             f"# shared product terms: {len(terms)}, flat product terms: {sum(len(t) for t in flat.values())}",
+             f"{'output':<10} {'flat terms':>10} {'flat fan-in':>11} {'flat lvls':>9} {'terms':>6} {'fan-in':>6} {'OR fan-in':>9} {'lvls':>5}"]
+    aux_levels = max((levels(len(p)) for p in aux), default=0)
+    for name in outputs + ['legal']:
+        f_terms, f_and, _, f_levels = output_stats(flat.get(name, []))
+        s_terms = [terms[t] for t in fanout[name]]
+        n, and_fan_in, or_fan_in, s_levels = output_stats(s_terms)
+        if any(sig.startswith("aux") for t in s_terms for sig in t):
+            # aux arriva come ingresso del termine dopo i suoi livelli di AND
+            s_levels = max(levels(and_fan_in), aux_levels + 1) + levels(or_fan_in)
+        lines.append(f"{name:<10} {f_terms:>10} {f_and:>11} {f_levels:>9} {n:>6} {and_fan_in:>6} {or_fan_in:>9} {s_levels:>5}")
+    return "\n".join(lines) + "\n"
 
-output = output.split("\n")
+def shared_body(outputs, aux, terms, fanout):
+    body = []
+    if aux:
+        body.append(f"logic [{len(aux) - 1}:0] aux;")
+    body.append(f"logic [{len(terms) - 1}:0] pt;")
+    for a, pattern in enumerate(aux):
+        body.append(f"assign aux[{a}] = " + "&".join(literal_sv(f"i[{b}]", c == '1') for b, c in pattern) + ";")
+    for t, literals in enumerate(terms):
+        body.append(f"assign pt[{t}] = " + ("&".join(literal_sv(s, p) for s, p in literals.items()) or "1'b1") + ";")
+    for name in outputs + ['legal']:
+        body.append(f"assign decode_out.{name} = " + (" | ".join(f"pt[{t}]" for t in fanout[name]) or "1'b0") + ";")
+    return "\n".join(body) + "\n"
 
-for i in range(len(output)):
-    if '=' in output[i] :
-        output[i] = 'assign decode_out.' + output[i]
+def main():
+    global CACHE_DIR, GATE_INPUTS
+    parser = argparse.ArgumentParser(description="Generate <decode>.sv from a decode table with espresso")
+    parser.add_argument("decode", help="Decode table (e.g. rtl/idu/decode)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Concurrent espresso runs")
+    parser.add_argument("--no-cache", action="store_true", help="Re-minimize every output")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Minimized equations cache")
+    parser.add_argument("--mode", choices=["flat", "depth"], default="flat",
+                        help="flat: one sum of products per output; depth: product terms over opcode/funct3/funct7 shared by all outputs")
+    parser.add_argument("--gate-inputs", type=int, default=GATE_INPUTS, help="Gate fan-in assumed by the logic levels estimate")
+    args = parser.parse_args()
+    CACHE_DIR = args.cache_dir
+    GATE_INPUTS = args.gate_inputs
 
-output = "\n".join(output)
-# Create a new temp file for the system verilog file
-system_verilog_file = tempfile.NamedTemporaryFile(delete=True)
-with open(system_verilog_file.name, 'w') as f:
-    f.write ('module decode (\n')
-    f.write ('    input logic [31:0] \t\t\t i,\n')
-    f.write ('     output decode_out_t decode_out\n')
-    f.write(');\n')
-    f.write(output)
-    f.write('endmodule\n')
-    
-# Pass verible-verilog-format and collect the exit code and output
-formatted_output = subprocess.check_output(f"verible-verilog-format {system_verilog_file.name}", shell=True)
-formatted_output = formatted_output.decode('utf-8')
+    outputs, instr_encoding, instr_output = parse_table(args.decode)
+    plas, equations = flat_equations(outputs, instr_encoding, instr_output, args.jobs, not args.no_cache)
 
-# open file sys.argv[1] for writing and write the formatted output
-with open(f"{sys.argv[1]}.sv", 'w') as f:
-    f.write(formatted_output)
-    f.close()
+    # Print legal PLA
+    print(plas['legal'])
 
-# Close all the files
-decode_file.close()
-legal_encoding.close()
-system_verilog_file.close()
+    if args.mode == "depth":
+        flat = {name: parse_eqntott(text) for name, text in equations.items()}
+        aux, terms, fanout = shared_terms(outputs, instr_encoding, instr_output, not args.no_cache)
+        checked = check_equivalence(flat, aux, terms, fanout, instr_encoding)
+        print(f"Shared decoder matches the flat one on {checked} encodings")
+        report = depth_report(outputs, flat, aux, terms, fanout)
+        with open(f"{args.decode}.report", 'w') as f:
+            f.write(report)
+        print(report)
+        output = shared_body(outputs, aux, terms, fanout)
+    else:
+        output = []
+        for name in outputs + ['legal']:
+            if name not in equations:
+                output.append(f"{name} = 1'b0;")
+                continue
+            # Remove all the lines that start with "#"
+            output.extend(line for line in equations[name].replace("!", "~").split("\n") if not line.startswith("#"))
 
-print (f"Successfully created {sys.argv[1]}.sv")
+        for i in range(len(output)):
+            if '=' in output[i] :
+                output[i] = 'assign decode_out.' + output[i]
 
-## Print the content of the decode file
-#with open(decode_file.name, 'r') as f:
-#    print(f.read())
-#
-## Print the content of the legal encoding file
-#with open(legal_encoding.name, 'r') as f:
-#    print(f.read())
+        output = "\n".join(output)
+    # Create a new temp file for the system verilog file
+    with tempfile.NamedTemporaryFile('w', suffix=".sv", delete=True) as system_verilog_file:
+        system_verilog_file.write('module decode (\n')
+        system_verilog_file.write('    input logic [31:0] \t\t\t i,\n')
+        system_verilog_file.write('     output decode_out_t decode_out\n')
+        system_verilog_file.write(');\n')
+        system_verilog_file.write(output)
+        system_verilog_file.write('endmodule\n')
+        system_verilog_file.flush()
 
+        # Pass verible-verilog-format and collect the exit code and output
+        formatted_output = subprocess.check_output(f"verible-verilog-format {system_verilog_file.name}", shell=True)
+    formatted_output = formatted_output.decode('utf-8')
 
-f.close()
+    # open file args.decode for writing and write the formatted output
+    with open(f"{args.decode}.sv", 'w') as f:
+        f.write(formatted_output)
 
+    print(f"Successfully created {args.decode}.sv")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Constrained-random RV32IM + mac/macrst programs for the differential fuzzing mode of sim_manager.py.
+
+A program is a list of items assembled straight to machine code (no toolchain involved):
+
+    ("instr", word)                        any non control-flow instruction
+    ("branch", funct3, rs1, rs2, target)   conditional branch to item `target`
+    ("jal", rd, target)                    jump and link to item `target`
+    ("jalr", rd, target)                   auipc x29 + jalr to item `target`
+    ("loop", count, body)                  body (plain instructions) repeated count times on x30
+
+Control flow only goes forward, except the counted loops, so every program terminates. A target
+refers to an item id and resolves to the first item still present at or after it, which lets the
+minimizer drop any subset of items and still assemble a valid program. Loads and stores use x31
+as base and stay in a window of the DCCM; x27-x31 are reserved for the loop counter, the jalr
+temporary, the data pointer and the end-of-test sequence.
+"""
+
+import random
+from typing import Callable, List
+
+import rv_model
+
+MASK32 = 0xffffffff
+DATA_BASE = 0x400 # Finestra dati nel DCCM, puntata da x31
+DATA_WINDOW = 256
+DEST_REGS = list(range(1, 27))
+EDGE_VALUES = [0, 1, 2, MASK32, 0x80000000, 0x7fffffff, 0x8000, 0x7fff, 0xffff, 0xffff8000, 0x80000001]
+
+def r_type(funct7: int, rs2: int, rs1: int, funct3: int, rd: int, opcode: int) -> int:
+    return funct7 << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+
+def i_type(imm: int, rs1: int, funct3: int, rd: int, opcode: int) -> int:
+    return (imm & 0xfff) << 20 | rs1 << 15 | funct3 << 12 | rd << 7 | opcode
+
+def s_type(imm: int, rs2: int, rs1: int, funct3: int) -> int:
+    return ((imm >> 5) & 0x7f) << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | (imm & 0x1f) << 7 | 0x23
+
+def b_type(imm: int, rs2: int, rs1: int, funct3: int) -> int:
+    imm &= 0x1fff
+    return (imm >> 12 & 1) << 31 | (imm >> 5 & 0x3f) << 25 | rs2 << 20 | rs1 << 15 | funct3 << 12 | (imm >> 1 & 0xf) << 8 | (imm >> 11 & 1) << 7 | 0x63
+
+def u_type(imm20: int, rd: int, opcode: int) -> int:
+    return (imm20 & 0xfffff) << 12 | rd << 7 | opcode
+
+def j_type(imm: int, rd: int) -> int:
+    imm &= 0x1fffff
+    return (imm >> 20 & 1) << 31 | (imm >> 1 & 0x3ff) << 21 | (imm >> 11 & 1) << 20 | (imm >> 12 & 0xff) << 12 | rd << 7 | 0x6f
+
+def li(rd: int, value: int) -> List[int]:
+    """lui + addi of a 32-bit constant."""
+    value &= MASK32
+    low = value & 0xfff
+    low = low - 0x1000 if low & 0x800 else low
+    return [u_type(((value - low) & MASK32) >> 12, rd, 0x37), i_type(low, rd, 0, rd, 0x13)]
+
+EOT_SEQUENCE = li(28, 0x10000000) + li(27, 0xdeadbeef) + [s_type(0, 27, 28, 2)]
+
+R_OPS = [(0x00, 0), (0x20, 0), (0x00, 1), (0x00, 2), (0x00, 3), (0x00, 4), (0x00, 5), (0x20, 5), (0x00, 6), (0x00, 7)]
+M_OPS = [(0x01, f3) for f3 in range(8)]
+I_OPS = [0, 2, 3, 4, 6, 7]
+SHIFT_OPS = [(0x00, 1), (0x00, 5), (0x20, 5)]
+LOADS = [(0, 1), (1, 2), (2, 4), (4, 1), (5, 2)] # (funct3, dimensione)
+STORES = [(0, 1), (1, 2), (2, 4)]
+BRANCH_FUNCT3 = [0, 1, 4, 5, 6, 7]
+
+class Generator:
+    """Random instructions whose sources favour recent destinations, to exercise the forwarding paths."""
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.recent = []
+
+    def src(self) -> int:
+        if self.recent and self.rng.random() < 0.5:
+            return self.rng.choice(self.recent[-3:])
+        return self.rng.choice([0] + DEST_REGS)
+
+    def dest(self) -> int:
+        rd = self.rng.choice(DEST_REGS)
+        self.recent = (self.recent + [rd])[-4:]
+        return rd
+
+    def imm12(self) -> int:
+        return self.rng.choice([0, 1, -1, 2047, -2048, self.rng.randint(-2048, 2047)])
+
+    def mem_offset(self, size: int) -> int:
+        offset = self.rng.randrange(0, DATA_WINDOW - 4)
+        return offset if self.rng.random() < 0.3 else offset & ~(size - 1) # Accessi disallineati (split) nel 30% dei casi
+
+    def instr(self) -> int:
+        rng = self.rng
+        kind = rng.choices(["r", "m", "mac", "i", "shift", "u", "load", "store", "macrst"], [20, 12, 8, 18, 6, 4, 14, 14, 2])[0]
+        if kind == "r":
+            funct7, funct3 = rng.choice(R_OPS)
+            rs1, rs2 = self.src(), self.src()
+            return r_type(funct7, rs2, rs1, funct3, self.dest(), 0x33)
+        if kind == "m":
+            funct7, funct3 = rng.choice(M_OPS)
+            rs1, rs2 = self.src(), self.src()
+            return r_type(funct7, rs2, rs1, funct3, self.dest(), 0x33)
+        if kind == "mac":
+            rs1, rs2 = self.src(), self.src()
+            return r_type(0, rs2, rs1, 0, self.dest(), 0x0b)
+        if kind == "macrst":
+            return r_type(0, 0, 0, 1, 0, 0x0b)
+        if kind == "i":
+            rs1 = self.src()
+            return i_type(self.imm12(), rs1, rng.choice(I_OPS), self.dest(), 0x13)
+        if kind == "shift":
+            funct7, funct3 = rng.choice(SHIFT_OPS)
+            rs1 = self.src()
+            return r_type(funct7, rng.randrange(32), rs1, funct3, self.dest(), 0x13)
+        if kind == "u":
+            return u_type(rng.getrandbits(20), self.dest(), rng.choice([0x37, 0x17]))
+        if kind == "load":
+            funct3, size = rng.choice(LOADS)
+            return i_type(self.mem_offset(size), 31, funct3, self.dest(), 0x03)
+        funct3, size = rng.choice(STORES)
+        return s_type(self.mem_offset(size), self.src(), 31, funct3)
+
+def generate(rng: random.Random, length: int) -> List[tuple]:
+    """Register set-up followed by about `length` random instructions, branches, jumps and short loops."""
+    gen = Generator(rng)
+    items = []
+    for rd in DEST_REGS:
+        value = rng.choice(EDGE_VALUES) if rng.random() < 0.4 else rng.getrandbits(32)
+        items.extend(("instr", word) for word in li(rd, value))
+    end = len(items) + length
+    while len(items) < end:
+        i, choice = len(items), rng.random()
+        if choice < 0.08:
+            items.append(("branch", rng.choice(BRANCH_FUNCT3), gen.src(), gen.src(), i + rng.randint(1, 6)))
+        elif choice < 0.10:
+            items.append(("jal", rng.choice([0, 1] + DEST_REGS), i + rng.randint(1, 6)))
+        elif choice < 0.12:
+            items.append(("jalr", rng.choice([0, 1] + DEST_REGS), i + rng.randint(1, 6)))
+        elif choice < 0.15:
+            items.append(("loop", rng.randint(1, 5), [gen.instr() for _ in range(rng.randint(1, 6))]))
+        else:
+            items.append(("instr", gen.instr()))
+    return items
+
+def item_size(item: tuple) -> int:
+    if item[0] == "jalr":
+        return 2
+    if item[0] == "loop":
+        return len(item[2]) + 3
+    return 1
+
+def assemble(items: List[tuple], ids: List[int], base: int) -> bytes:
+    """Machine code of the items (ids are their original positions, for branch targets) plus the end-of-test."""
+    prologue = li(31, DATA_BASE)
+    addrs, addr = [], base + 4 * len(prologue)
+    for item in items:
+        addrs.append(addr)
+        addr += 4 * item_size(item)
+    end_addr = addr
+
+    def target(target_id):
+        for item_id, item_addr in zip(ids, addrs):
+            if item_id >= target_id:
+                return item_addr
+        return end_addr
+
+    words = list(prologue)
+    for item, pc in zip(items, addrs):
+        if item[0] == "instr":
+            words.append(item[1])
+        elif item[0] == "branch":
+            _, funct3, rs1, rs2, target_id = item
+            words.append(b_type(target(target_id) - pc, rs2, rs1, funct3))
+        elif item[0] == "jal":
+            words.append(j_type(target(item[2]) - pc, item[1]))
+        elif item[0] == "jalr":
+            words += [u_type(0, 29, 0x17), i_type(target(item[2]) - pc, 29, 0, item[1], 0x67)]
+        else:
+            _, count, body = item
+            words.append(i_type(count, 0, 0, 30, 0x13))
+            words += body
+            words += [i_type(-1, 30, 0, 30, 0x13), b_type(-4 * (len(body) + 1), 0, 30, 1)]
+    words += EOT_SEQUENCE
+    return b"".join(word.to_bytes(4, "little") for word in words)
+
+def data_image(rng: random.Random, size: int) -> bytearray:
+    image = bytearray(size)
+    image[DATA_BASE:DATA_BASE + DATA_WINDOW] = rng.randbytes(DATA_WINDOW)
+    return image
+
+def listing(code: bytes, base: int) -> str:
+    """One `address: word  mnemonic` line per instruction, decoded by the reference model."""
+    lines = []
+    for offset in range(0, len(code), 4):
+        instr = int.from_bytes(code[offset:offset + 4], "little")
+        lines.append(f"0x{base + offset:08x}: {instr:08x}  {rv_model.decode(base + offset, instr)[5]}")
+    return "\n".join(lines) + "\n"
+
+def ddmin(items: List[tuple], fails: Callable[[List[int]], bool]) -> List[int]:
+    """Delta debugging over item indices: a 1-minimal subset for which fails() still holds."""
+    keep = list(range(len(items)))
+    n = 2
+    while len(keep) >= 2:
+        chunk = (len(keep) + n - 1) // n
+        for start in range(0, len(keep), chunk):
+            candidate = keep[:start] + keep[start + chunk:]
+            if candidate and fails(candidate):
+                keep, n = candidate, max(n - 1, 2)
+                break
+        else:
+            if n >= len(keep):
+                break
+            n = min(2 * n, len(keep))
+    return keep
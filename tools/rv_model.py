@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""RV32IM + mac/macrst reference model producing the iss.log compared by sim_manager.py.
+
+Memories are addressed like core_top does: the low bits of a fetch or data address index the
+ICCM/DCCM images, so tests linked at any base address run unchanged. Every line is
+`0xPC;0xINSTR;mnemonic;effect` where effect uses the same notation as the testbench monitor
+(`xN=0x..`, `xN=0x..;pc=0x..` for jumps, `taken=true;pc=0x..`/`taken=false`, `mem[0x..]=0x..`).
+Register writes are logged for every instruction with a destination, x0 included, except the
+canonical nop, as the RTL monitor does. With binary=True the same events are written as
+commit_trace.py records instead.
+"""
+
+import argparse
+import struct
+import sys
+
+import commit_trace
+
+EOT_ADDR = 0x10000000
+EOT_VALUE = 0xdeadbeef
+MAX_BLOCK_LEN = 64
+NOP = 0x00000013
+MASK32 = 0xffffffff
+
+class IssError(Exception):
+    pass
+
+class EndOfTest(Exception):
+    pass
+
+def sext(value: int, bits: int) -> int:
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+def signed(value: int) -> int:
+    return value - (1 << 32) if value & 0x80000000 else value
+
+def booth_mac_product(rs1: int, rs2: int) -> int:
+    """16x16 product of mac.sv: radix-4 Booth on rs2[15:0], 17-bit partial products of sext(rs1[15:0])."""
+    a = sext(rs1, 16)
+    total = 0
+    for i in range(8):
+        triplet = ((rs2 >> (2 * i)) & 0x3) << 1 | ((rs2 >> (2 * i - 1)) & 1 if i else 0)
+        digit = (0, 1, 1, 2, -2, -1, -1, 0)[triplet]
+        total += sext(digit * a, 17) << (2 * i)
+    return total & MASK32
+
+# --- ESECUZIONE ---
+# Ogni handler riceve (hart, pc, rd, rs1, rs2, imm) e ritorna (effetto, pc successivo)
+
+def _write(h, rd, value, next_pc):
+    value &= MASK32
+    if rd:
+        h.x[rd] = value
+    return f"x{rd}=0x{value:08x}", next_pc
+
+def _alu(fn):
+    return lambda h, pc, rd, rs1, rs2, imm: _write(h, rd, fn(h.x[rs1], h.x[rs2]), pc + 4)
+
+def _alu_imm(fn):
+    return lambda h, pc, rd, rs1, rs2, imm: _write(h, rd, fn(h.x[rs1], imm & MASK32), pc + 4)
+
+def _div(a, b):
+    if b == 0:
+        return MASK32
+    a, b = signed(a), signed(b)
+    if a == -0x80000000 and b == -1:
+        return a
+    q = abs(a) // abs(b)
+    return -q if (a < 0) != (b < 0) else q
+
+def _rem(a, b):
+    if b == 0:
+        return a
+    a, b = signed(a), signed(b)
+    if a == -0x80000000 and b == -1:
+        return 0
+    r = abs(a) % abs(b)
+    return -r if a < 0 else r
+
+ALU_OPS = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "sll": lambda a, b: a << (b & 31),
+    "slt": lambda a, b: int(signed(a) < signed(b)),
+    "sltu": lambda a, b: int(a < b),
+    "xor": lambda a, b: a ^ b,
+    "srl": lambda a, b: a >> (b & 31),
+    "sra": lambda a, b: signed(a) >> (b & 31),
+    "or": lambda a, b: a | b,
+    "and": lambda a, b: a & b,
+    "mul": lambda a, b: a * b,
+    "mulh": lambda a, b: (signed(a) * signed(b)) >> 32,
+    "mulhsu": lambda a, b: (signed(a) * b) >> 32,
+    "mulhu": lambda a, b: (a * b) >> 32,
+    "div": _div,
+    "divu": lambda a, b: a // b if b else MASK32,
+    "rem": _rem,
+    "remu": lambda a, b: a % b if b else a,
+}
+
+OP_NAMES = {
+    (0x00, 0): "add", (0x20, 0): "sub", (0x00, 1): "sll", (0x00, 2): "slt", (0x00, 3): "sltu",
+    (0x00, 4): "xor", (0x00, 5): "srl", (0x20, 5): "sra", (0x00, 6): "or", (0x00, 7): "and",
+    (0x01, 0): "mul", (0x01, 1): "mulh", (0x01, 2): "mulhsu", (0x01, 3): "mulhu",
+    (0x01, 4): "div", (0x01, 5): "divu", (0x01, 6): "rem", (0x01, 7): "remu",
+}
+OP_IMM_NAMES = {0: ("addi", "add"), 2: ("slti", "slt"), 3: ("sltiu", "sltu"), 4: ("xori", "xor"), 6: ("ori", "or"), 7: ("andi", "and")}
+BRANCHES = {
+    0: ("beq", lambda a, b: a == b), 1: ("bne", lambda a, b: a != b),
+    4: ("blt", lambda a, b: signed(a) < signed(b)), 5: ("bge", lambda a, b: signed(a) >= signed(b)),
+    6: ("bltu", lambda a, b: a < b), 7: ("bgeu", lambda a, b: a >= b),
+}
+LOADS = {0: ("lb", 1, True), 1: ("lh", 2, True), 2: ("lw", 4, False), 4: ("lbu", 1, False), 5: ("lhu", 2, False)}
+STORES = {0: ("sb", 1), 1: ("sh", 2), 2: ("sw", 4)}
+
+def _branch(cond):
+    def run(h, pc, rd, rs1, rs2, imm):
+        if cond(h.x[rs1], h.x[rs2]):
+            target = (pc + imm) & MASK32
+            return f"taken=true;pc=0x{target:08x}", target
+        return "taken=false", pc + 4
+    return run
+
+def _load(size, is_signed):
+    def run(h, pc, rd, rs1, rs2, imm):
+        value = int.from_bytes(h.read(h.x[rs1] + imm, size), "little")
+        return _write(h, rd, sext(value, size * 8) if is_signed else value, pc + 4)
+    return run
+
+def _store(size):
+    def run(h, pc, rd, rs1, rs2, imm):
+        addr = (h.x[rs1] + imm) & MASK32
+        value = h.x[rs2] & ((1 << (size * 8)) - 1)
+        effect = f"mem[0x{addr:08x}]=0x{value:08x}"
+        if addr == EOT_ADDR and value == EOT_VALUE:
+            raise EndOfTest(effect)
+        h.write(addr, value.to_bytes(size, "little"))
+        return effect, pc + 4
+    return run
+
+def _jal(h, pc, rd, rs1, rs2, imm):
+    target = (pc + imm) & MASK32
+    effect, _ = _write(h, rd, pc + 4, target)
+    return f"{effect};pc=0x{target:08x}", target
+
+def _jalr(h, pc, rd, rs1, rs2, imm):
+    target = (h.x[rs1] + imm) & MASK32 & ~1
+    effect, _ = _write(h, rd, pc + 4, target)
+    return f"{effect};pc=0x{target:08x}", target
+
+def _lui(h, pc, rd, rs1, rs2, imm):
+    return _write(h, rd, imm, pc + 4)
+
+def _auipc(h, pc, rd, rs1, rs2, imm):
+    return _write(h, rd, pc + imm, pc + 4)
+
+def _mac(h, pc, rd, rs1, rs2, imm):
+    h.acc = (h.acc + booth_mac_product(h.x[rs1], h.x[rs2])) & MASK32
+    return _write(h, rd, h.acc, pc + 4)
+
+def _macrst(h, pc, rd, rs1, rs2, imm):
+    h.acc = 0
+    return "", pc + 4
+
+def _no_effect(h, pc, rd, rs1, rs2, imm):
+    return "", pc + 4
+
+def _illegal(h, pc, rd, rs1, rs2, imm):
+    raise IssError(f"Illegal instruction 0x{imm:08x} at pc 0x{pc:08x}")
+
+def _unsupported(h, pc, rd, rs1, rs2, imm):
+    # Il core non decodifica ecall/ebreak: fermarsi qui nasconderebbe la divergenza con l'RTL
+    raise IssError(f"{'ecall' if imm == 0x73 else 'ebreak'} at pc 0x{pc:08x} is not implemented by the core")
+
+def decode(pc: int, instr: int):
+    """(handler, rd, rs1, rs2, imm, mnemonic, ends_block) of one instruction."""
+    opcode, rd, funct3 = instr & 0x7f, (instr >> 7) & 0x1f, (instr >> 12) & 0x7
+    rs1, rs2, funct7 = (instr >> 15) & 0x1f, (instr >> 20) & 0x1f, instr >> 25
+    imm_i = sext(instr >> 20, 12)
+    if instr == NOP:
+        return _no_effect, 0, 0, 0, 0, "nop", False
+    if opcode == 0x33 and (funct7, funct3) in OP_NAMES:
+        name = OP_NAMES[funct7, funct3]
+        return _alu(ALU_OPS[name]), rd, rs1, rs2, 0, f"{name} x{rd}, x{rs1}, x{rs2}", False
+    if opcode == 0x13:
+        if funct3 in OP_IMM_NAMES:
+            name, op = OP_IMM_NAMES[funct3]
+            return _alu_imm(ALU_OPS[op]), rd, rs1, 0, imm_i, f"{name} x{rd}, x{rs1}, {imm_i}", False
+        shift = {(0x00, 1): "sll", (0x00, 5): "srl", (0x20, 5): "sra"}.get((funct7, funct3))
+        if shift:
+            return _alu_imm(ALU_OPS[shift]), rd, rs1, 0, rs2, f"{shift}i x{rd}, x{rs1}, {rs2}", False
+    if opcode == 0x03 and funct3 in LOADS:
+        name, size, is_signed = LOADS[funct3]
+        return _load(size, is_signed), rd, rs1, 0, imm_i, f"{name} x{rd}, {imm_i}(x{rs1})", False
+    if opcode == 0x23 and funct3 in STORES:
+        name, size = STORES[funct3]
+        imm_s = sext((funct7 << 5) | rd, 12)
+        return _store(size), 0, rs1, rs2, imm_s, f"{name} x{rs2}, {imm_s}(x{rs1})", False
+    if opcode == 0x63 and funct3 in BRANCHES:
+        name, cond = BRANCHES[funct3]
+        imm_b = sext(((instr >> 31) << 12) | (((instr >> 7) & 1) << 11) | (((instr >> 25) & 0x3f) << 5) | (((instr >> 8) & 0xf) << 1), 13)
+        return _branch(cond), 0, rs1, rs2, imm_b, f"{name} x{rs1}, x{rs2}, 0x{(pc + imm_b) & MASK32:x}", True
+    if opcode == 0x6f:
+        imm_j = sext(((instr >> 31) << 20) | (((instr >> 12) & 0xff) << 12) | (((instr >> 20) & 1) << 11) | (((instr >> 21) & 0x3ff) << 1), 21)
+        return _jal, rd, 0, 0, imm_j, f"jal x{rd}, 0x{(pc + imm_j) & MASK32:x}", True
+    if opcode == 0x67 and funct3 == 0:
+        return _jalr, rd, rs1, 0, imm_i, f"jalr x{rd}, {imm_i}(x{rs1})", True
+    if opcode == 0x37:
+        return _lui, rd, 0, 0, instr & 0xfffff000, f"lui x{rd}, 0x{instr >> 12:x}", False
+    if opcode == 0x17:
+        return _auipc, rd, 0, 0, instr & 0xfffff000, f"auipc x{rd}, 0x{instr >> 12:x}", False
+    if opcode == 0x0b and funct7 == 0 and funct3 == 0:
+        return _mac, rd, rs1, rs2, 0, f"mac x{rd}, x{rs1}, x{rs2}", False
+    if opcode == 0x0b and funct7 == 0 and funct3 == 1:
+        return _macrst, 0, 0, 0, 0, "macrst", False
+    if opcode == 0x0f:
+        return _no_effect, 0, 0, 0, 0, "fence", False
+    if instr in (0x00000073, 0x00100073):
+        return _unsupported, 0, 0, 0, instr, "ecall" if instr == 0x73 else "ebreak", True
+    return _illegal, 0, 0, 0, instr, "illegal", True
+
+class Hart:
+    def __init__(self, imem: bytes, dmem: bytearray, reset_vector: int, stack_pointer: int):
+        self.imem, self.dmem = imem, dmem
+        self.x = [0] * 32
+        self.x[2] = stack_pointer & MASK32
+        self.pc = reset_vector
+        self.acc = 0
+        self.retired = 0
+        # pc -> istruzioni decodificate fino alla prima che cambia il flusso (ICCM non scrivibile: nessuna invalidazione)
+        self.blocks = {}
+
+    def read(self, addr: int, size: int) -> bytes:
+        n = len(self.dmem)
+        off = addr % n
+        if off + size <= n:
+            return bytes(self.dmem[off:off + size])
+        return bytes(self.dmem[(off + i) % n] for i in range(size))
+
+    def write(self, addr: int, data: bytes) -> None:
+        n = len(self.dmem)
+        for i, b in enumerate(data):
+            self.dmem[(addr + i) % n] = b
+
+    def fetch(self, pc: int) -> int:
+        off = pc % len(self.imem)
+        return struct.unpack_from("<I", self.imem, off)[0]
+
+    def block(self, pc: int):
+        ops = self.blocks.get(pc)
+        if ops is None:
+            ops = []
+            while len(ops) < MAX_BLOCK_LEN:
+                instr = self.fetch(pc)
+                handler, rd, rs1, rs2, imm, text, ends_block = decode(pc, instr)
+                ops.append((pc, handler, rd, rs1, rs2, imm, f"0x{pc:08x};0x{instr:08x};{text};"))
+                if ends_block:
+                    break
+                pc = (pc + 4) & MASK32
+            self.blocks[ops[0][0]] = ops
+        return ops
+
+    def run(self, log, max_instructions: int) -> bool:
+        """Execute until the end-of-test store (True) or the instruction cap (False)."""
+        while self.retired < max_instructions:
+            lines = []
+            try:
+                for pc, handler, rd, rs1, rs2, imm, prefix in self.block(self.pc):
+                    effect, next_pc = handler(self, pc, rd, rs1, rs2, imm)
+                    lines.append(prefix + effect + "\n")
+                    self.retired += 1
+                    self.pc = next_pc & MASK32
+                    if next_pc != pc + 4:
+                        break
+            except EndOfTest as eot:
+                lines.append(prefix + eot.args[0] + "\n")
+                self.retired += 1
+                log.writelines(lines)
+                return True
+            except IssError:
+                log.writelines(lines) # Il log arriva fino all'ultima istruzione eseguita
+                raise
+            log.writelines(lines)
+        return False
+
+def run(imem: bytes, dmem: bytearray, log_path: str, reset_vector: int, stack_pointer: int, max_instructions: int, binary: bool = False) -> int:
+    """Run a program to its end-of-test signature writing iss.log (or iss.trc); return the retired instruction count."""
+    hart = Hart(imem, dmem, reset_vector, stack_pointer)
+    with open(log_path, 'wb' if binary else 'w') as log:
+        finished = hart.run(commit_trace.TraceWriter(log) if binary else log, max_instructions)
+    if not finished:
+        raise IssError(f"No end-of-test signature within {max_instructions} instructions (pc 0x{hart.pc:08x})")
+    return hart.retired
+
+def read_hex(path: str, size: int) -> bytearray:
+    image = bytearray(size)
+    with open(path, 'r') as f:
+        words = [int(tok, 16) for tok in f.read().split() if not tok.startswith("@")][:size // 4]
+    struct.pack_into(f"<{len(words)}I", image, 0, *words)
+    return image
+
+def main():
+    parser = argparse.ArgumentParser(description="RV32IM + MAC reference model on $readmemh images")
+    parser.add_argument("imem", help="ICCM image (imem.hex)")
+    parser.add_argument("-m", "--dmem", help="DCCM image (dmem.hex)")
+    parser.add_argument("-o", "--output", default="iss.log")
+    parser.add_argument("--imem-size", type=int, default=4096)
+    parser.add_argument("--dmem-size", type=int, default=4096)
+    parser.add_argument("--reset-vector", type=lambda s: int(s, 0), default=0)
+    parser.add_argument("--stack", type=lambda s: int(s, 0), default=0x80000000)
+    parser.add_argument("--max-instructions", type=int, default=10_000_000)
+    parser.add_argument("--binary", action="store_true", help="Write a binary commit trace (see commit_trace.py)")
+    args = parser.parse_args()
+    imem = read_hex(args.imem, args.imem_size)
+    dmem = read_hex(args.dmem, args.dmem_size) if args.dmem else bytearray(args.dmem_size)
+    try:
+        retired = run(imem, dmem, args.output, args.reset_vector, args.stack, args.max_instructions, args.binary)
+    except IssError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{retired} instructions retired")
+
+if __name__ == "__main__":
+    main()
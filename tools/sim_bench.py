@@ -0,0 +1,125 @@
+"""--benchmark: runs of the benchmark workloads, optionally on two RTL trees, and their report."""
+
+import csv
+import os
+import shlex
+import statistics
+import subprocess
+from typing import List
+
+import sim_config
+from sim_config import vprint
+import sim_flow
+
+# --- BENCHMARK ---
+def discover_benchmarks() -> List[str]:
+    return sorted(f"bench.{os.path.splitext(name)[0]}" for name in os.listdir(sim_config.BENCH_DIR) if name.endswith(".s"))
+
+def checkout_rtl(spec: str) -> str:
+    """An RTL tree to benchmark: a directory as is, otherwise a git revision exported to work/.trees/<rev>."""
+    if os.path.isdir(spec):
+        return spec
+    rev = subprocess.run(["git", "rev-parse", "--verify", f"{spec}^{{commit}}"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    if not rev:
+        raise Exception(f"'{spec}' is neither a directory nor a git revision")
+    tree = os.path.join("work", ".trees", rev[:12])
+    if not os.path.isdir(tree):
+        os.makedirs(tree + ".tmp", exist_ok=True)
+        subprocess.run(f"git archive {rev} rtl dv | tar -x -C {shlex.quote(tree + '.tmp')}", shell=True, check=True)
+        os.replace(tree + ".tmp", tree)
+    return tree
+
+def run_benchmarks(benchmarks: List[str], simulator: str, repeat: int) -> dict:
+    """Run every benchmark `repeat` times on the current RTL_ROOT and summarise the PMU counters."""
+    runs = {bench: [] for bench in benchmarks}
+    for i in range(repeat):
+        vprint(f"Benchmark repetition {i + 1}/{repeat} on {sim_config.RTL_ROOT}")
+        for result in sim_flow.run_tests(benchmarks, simulator):
+            runs[result["test"]].append(result)
+    summary = {}
+    for bench, results in runs.items():
+        last = results[-1]
+        row = {"status": "PASSED" if all(r["status"] == "PASSED" for r in results) else "FAILED"}
+        for key in ("cycles", "instret", "branches", "mispredicts", "mispredict_rate"):
+            if key in last:
+                row[key] = last[key]
+        if len({r.get("cycles") for r in results}) > 1:
+            row["status"] += " (cycles vary)"
+        if last.get("cycles") and last.get("instret"):
+            row["cpi"] = last["cycles"] / last["instret"]
+        walls = [r["duration"] for r in results if r.get("duration") is not None and not r.get("reused")]
+        if walls:
+            row["wall"] = statistics.median(walls)
+        summary[bench] = row
+    return summary
+
+def fmt_metric(value, spec: str = "") -> str:
+    return "-" if value is None else format(value, spec)
+
+def pct_delta(old, new) -> str:
+    if not old or new is None:
+        return "-"
+    return f"{100.0 * (new - old) / old:+.2f}%"
+
+def benchmark_report(summaries: dict) -> str:
+    """Markdown report: one table per RTL tree, or the deltas between two, plus the MAC speedup."""
+    labels = list(summaries)
+    lines = []
+    if len(labels) == 1:
+        summary = summaries[labels[0]]
+        lines += [f"## Benchmarks ({labels[0]})", "",
+                  "| Benchmark | Status | Cycles | Instructions | CPI | Mispredict % | Wall (s) |",
+                  "|---|---|---:|---:|---:|---:|---:|"]
+        for bench, row in summary.items():
+            lines.append(f"| {bench} | {row['status']} | {fmt_metric(row.get('cycles'))} | {fmt_metric(row.get('instret'))} | "
+                         f"{fmt_metric(row.get('cpi'), '.3f')} | {fmt_metric(row.get('mispredict_rate'), '.2f')} | {fmt_metric(row.get('wall'), '.2f')} |")
+    else:
+        a, b = labels
+        lines += [f"## Benchmarks: {a} vs {b}", "",
+                  f"| Benchmark | Cycles {a} | Cycles {b} | Δ cycles | CPI {a} | CPI {b} | Mispredict % {a} | Mispredict % {b} |",
+                  "|---|---:|---:|---:|---:|---:|---:|---:|"]
+        for bench in summaries[a]:
+            ra, rb = summaries[a][bench], summaries[b].get(bench, {})
+            lines.append(f"| {bench} | {fmt_metric(ra.get('cycles'))} | {fmt_metric(rb.get('cycles'))} | {pct_delta(ra.get('cycles'), rb.get('cycles'))} | "
+                         f"{fmt_metric(ra.get('cpi'), '.3f')} | {fmt_metric(rb.get('cpi'), '.3f')} | "
+                         f"{fmt_metric(ra.get('mispredict_rate'), '.2f')} | {fmt_metric(rb.get('mispredict_rate'), '.2f')} |")
+    lines += ["", "## MAC vs mul+add", "", "| Pair | " + " | ".join(f"Speedup {label}" for label in labels) + " |",
+              "|---|" + "---:|" * len(labels)]
+    for bench in summaries[labels[0]]:
+        name = bench.split(".")[1]
+        if not name.startswith("mac_"):
+            continue
+        muladd = f"muladd_{name[len('mac_'):]}"
+        speedups = []
+        for side in labels:
+            mac_cycles = summaries[side].get(bench, {}).get("cycles")
+            muladd_cycles = summaries[side].get(f"bench.{muladd}", {}).get("cycles")
+            speedups.append(f"{muladd_cycles / mac_cycles:.3f}x" if mac_cycles and muladd_cycles else "-")
+        lines.append(f"| {name} / {muladd} | " + " | ".join(speedups) + " |")
+    return "\n".join(lines) + "\n"
+
+def write_benchmark_csv(path: str, summaries: dict) -> None:
+    fields = ["rtl", "benchmark", "status", "cycles", "instret", "cpi", "branches", "mispredicts", "mispredict_rate", "wall"]
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for label, summary in summaries.items():
+            for bench, row in summary.items():
+                writer.writerow({"rtl": label, "benchmark": bench, **row})
+
+def benchmark_main(args) -> None:
+    sim_config.REUSE_RESULTS = False # Ogni ripetizione deve simulare davvero
+    benchmarks = discover_benchmarks()
+    sides = [(spec, checkout_rtl(spec)) for spec in args.compare_rtl] if args.compare_rtl else [("current", ".")]
+    summaries = {}
+    for label, root in sides:
+        sim_config.RTL_ROOT = root
+        summaries[label] = run_benchmarks(benchmarks, args.simulator, args.repeat)
+    sim_config.RTL_ROOT = "."
+    report = benchmark_report(summaries)
+    print("\n" + report)
+    os.makedirs(os.path.dirname(args.bench_output) or ".", exist_ok=True)
+    with open(args.bench_output + ".md", 'w') as f:
+        f.write(report)
+    write_benchmark_csv(args.bench_output + ".csv", summaries)
+    print(f"Benchmark report written to {args.bench_output}.md and {args.bench_output}.csv")
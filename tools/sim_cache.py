@@ -0,0 +1,177 @@
+"""Content-addressed caches of the test artifacts (compilation + ISS) and of the test verdicts."""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+from typing import Optional
+
+import commit_trace
+import rv_model
+import sim_config
+from sim_config import vprint
+import sim_frontend
+import sim_images
+import sim_rtl
+
+# --- CACHE DEGLI ARTEFATTI (compilazione + ISS) ---
+CACHE_DIR = os.path.join("work", ".cache")
+CACHE_VERSION = 3 # Da incrementare quando cambia il formato degli artefatti (es. prepare_imem)
+CACHED_ARTIFACTS = ["test.elf", "iss.log", "iss.trc", "imem.hex", "dmem.hex"]
+RESULT_CACHE_DIR = os.path.join("work", ".results")
+RESULT_CACHE_VERSION = 1 # Da incrementare quando cambia il modo in cui si ottiene il verdetto (confronto, log)
+
+_tool_ids = {}
+_tool_ids_lock = threading.Lock()
+
+def tool_id(tool: str) -> str:
+    """Identity of an external tool: its --version banner, or the binary itself when it has none."""
+    with _tool_ids_lock:
+        if tool in _tool_ids:
+            return _tool_ids[tool]
+        path = shutil.which(tool) or tool
+        ident = f"missing:{tool}"
+        if os.path.exists(path):
+            if os.path.basename(path) == "spike" or os.path.basename(path) == "riscv_sim":
+                st = os.stat(path)
+                ident = f"{path}:{st.st_size}:{st.st_mtime_ns}"
+            else:
+                try:
+                    out = subprocess.run([path, '--version'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=30).stdout
+                    ident = out.splitlines()[0] if out else path
+                except (OSError, subprocess.SubprocessError):
+                    ident = path
+        _tool_ids[tool] = ident
+        return ident
+
+def artifact_key(test: str) -> str:
+    full_cmd, link_script_content, sources = sim_frontend.gen_command(test)
+    h = hashlib.sha256()
+    imem_size, dmem_size = sim_images.memory_sizes()
+    h.update(f"v{CACHE_VERSION}\0{imem_size}\0{dmem_size}\0{sim_config.COMMIT_TRACE}\0{full_cmd}\0{link_script_content}\0".encode())
+    h.update(tool_id("riscv64-unknown-elf-gcc").encode() + b"\0")
+    if sim_config.ISS == "model":
+        with open(rv_model.__file__, 'rb') as f:
+            h.update(b"rv_model\0" + f.read() + f"\0{sim_config.SPIKE_MAX_INSTRUCTIONS}\0".encode())
+    elif sim_frontend.uses_spike(test):
+        h.update(tool_id("spike").encode() + f"\0{sim_config.SPIKE_MAX_INSTRUCTIONS}\0".encode()) # Spike gira fino alla firma di fine test, entro questo limite
+    else:
+        h.update(tool_id("./tools/riscv_sim").encode() + b"\0")
+    if sim_config.COMMIT_TRACE == "binary":
+        with open(commit_trace.__file__, 'rb') as f:
+            h.update(b"commit_trace\0" + f.read() + b"\0")
+    dmem_path = os.path.splitext(sim_frontend.test_source(test)[0])[0] + ".mem"
+    if os.path.exists(dmem_path):
+        sources = sources + [dmem_path]
+    for src in sources:
+        h.update(src.encode() + b"\0")
+        with open(src, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def link_or_copy(src: str, dst: str) -> None:
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def clear_artifacts(test: str) -> None:
+    """Unlink the artifacts before regenerating them, so tools writing in place never touch a cached inode."""
+    for name in CACHED_ARTIFACTS:
+        path = os.path.join(sim_config.WORK_DIR, test, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def restore_artifacts(test: str, key: str) -> bool:
+    entry = os.path.join(CACHE_DIR, key)
+    if not os.path.isdir(entry):
+        return False
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    os.makedirs(work_dir, exist_ok=True)
+    clear_artifacts(test)
+    try:
+        for name in os.listdir(entry):
+            link_or_copy(os.path.join(entry, name), os.path.join(work_dir, name))
+        os.utime(entry)
+    except OSError as e:
+        vprint(f"Cache entry {key} unusable ({e}), rebuilding")
+        clear_artifacts(test)
+        return False
+    vprint(f"Cache hit for {test} ({key[:12]})")
+    return True
+
+def store_artifacts(test: str, key: str) -> None:
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    if not all(os.path.exists(os.path.join(work_dir, name)) for name in ("test.elf", sim_rtl.iss_trace_name(), "imem.hex")):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entry = os.path.join(CACHE_DIR, key)
+    tmp_entry = f"{entry}.tmp.{os.getpid()}.{threading.get_ident()}"
+    os.makedirs(tmp_entry, exist_ok=True)
+    for name in CACHED_ARTIFACTS:
+        path = os.path.join(work_dir, name)
+        if os.path.exists(path):
+            link_or_copy(path, os.path.join(tmp_entry, name))
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        shutil.rmtree(tmp_entry, ignore_errors=True) # Un altro worker ha già salvato la stessa chiave
+    evict_cache()
+
+def evict_cache() -> None:
+    """Drop least recently used entries until the cache fits in CACHE_MAX_BYTES."""
+    with open(os.path.join(CACHE_DIR, ".lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entries, total = [], 0
+        for name in os.listdir(CACHE_DIR):
+            entry = os.path.join(CACHE_DIR, name)
+            if name.startswith(".") or ".tmp." in name or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, entry))
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= sim_config.CACHE_MAX_BYTES:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+def result_key(test: str, simulator: str) -> str:
+    """Key of a verdict: RTL, testbench, images and reference trace of the test, simulator."""
+    h = hashlib.sha256()
+    h.update(f"v{RESULT_CACHE_VERSION}\0{simulator}\0{tool_id('verilator' if simulator == 'verilator' else 'xvlog')}\0".encode())
+    h.update(f"{sim_frontend.load_base(test)}\0{sim_config.STACK_POINTER_INIT_VALUE}\0{sim_config.TRACE_FAILURE_CYCLES}\0{sim_config.COMMIT_TRACE}\0{sim_config.PMU_SAMPLE}\0".encode())
+    include_dir = os.path.join(sim_config.RTL_ROOT, "rtl", "include")
+    headers = sorted(os.path.join(include_dir, name) for name in os.listdir(include_dir))
+    for src in dict.fromkeys(sim_rtl.model_sources() + headers):
+        h.update(os.path.relpath(src, sim_config.RTL_ROOT).encode() + b"\0")
+        with open(src, 'rb') as f:
+            h.update(f.read())
+    for name in ("imem.hex", "dmem.hex", sim_rtl.iss_trace_name()):
+        path = os.path.join(sim_config.WORK_DIR, test, name)
+        h.update(name.encode() + b"\0")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+def load_result(key: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(RESULT_CACHE_DIR, f"{key}.json"), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def store_result(key: str, result: dict) -> None:
+    """Only verdicts (PASSED/FAILED) and PMU metrics are kept, not the timings of the run that produced them."""
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    record = {k: v for k, v in result.items() if k not in ("stages", "peak_rss_kb", "sim_cycles_per_s", "duration")}
+    tmp_path = os.path.join(RESULT_CACHE_DIR, f"{key}.json.tmp.{os.getpid()}.{threading.get_ident()}")
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f, sort_keys=True)
+    os.replace(tmp_path, os.path.join(RESULT_CACHE_DIR, f"{key}.json"))
@@ -0,0 +1,221 @@
+"""Comparison of the RTL commit trace with the reference, in lockstep or after the simulation."""
+
+import itertools
+import os
+import signal
+import subprocess
+import time
+from typing import Optional
+
+import commit_trace
+import sim_config
+from sim_config import vprint
+import sim_frontend
+import sim_rtl
+import sim_sched
+import sim_timing
+
+# --- CONFRONTO ISS/RTL IN STREAMING ---
+LOCKSTEP_TESTS = set() # Test il cui rtl.log è già stato confrontato durante la simulazione
+
+MAC_TERMINATION_SIGNATURE = "mem[0x10000000]=0xdeadbeef"
+
+def tail_lines(path: str, process: subprocess.Popen, poll: float = 0.05):
+    """Complete lines of a file still being written, until the writer exits."""
+    while not os.path.exists(path):
+        if sim_timing.reap(process, block=False) is not None:
+            return
+        time.sleep(poll)
+    with open(path, 'r') as f:
+        pending, finished = "", False
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if pending.endswith("\n"):
+                    yield pending[:-1]
+                    pending = ""
+            elif finished:
+                if pending:
+                    yield pending
+                return
+            else:
+                finished = sim_timing.reap(process, block=False) is not None
+                if not finished:
+                    time.sleep(poll)
+
+def rtl_trace_lines(lines, drop_termination: bool):
+    """Non-empty rtl.log lines, without the end-of-test store when the reference is Spike."""
+    # Il testbench scrive ogni store una volta sola, anche quelli divisi su due parole
+    for line in lines:
+        if line and not (drop_termination and MAC_TERMINATION_SIGNATURE in line):
+            yield line
+
+def log_events(lines, pc_idx: int):
+    """(PC, INSTR, MODIFICATION) for every line that touches architectural state."""
+    for line in lines:
+        if not line.strip() or ";" not in line: continue
+        parts = line.split(';')
+        if len(parts) >= 4 and parts[3].strip():
+            yield (parts[pc_idx].replace("0x", "").upper(), parts[pc_idx + 1].replace("0x", "").upper(), parts[3].upper())
+
+def iss_events(path: str):
+    with open(path, 'r') as f:
+        yield from log_events((line.rstrip("\n") for line in f), 0)
+
+def rtl_events(lines):
+    yield from log_events(lines, 1)
+
+def rtl_log_lines(test: str):
+    """rtl.log as it is compared with the ISS, in lockstep or afterwards."""
+    with open(os.path.join(sim_config.WORK_DIR, test, "rtl.log"), 'r') as f:
+        yield from rtl_trace_lines((line.rstrip("\n") for line in f), sim_frontend.uses_spike(test))
+
+def first_mismatch(iss_iter, rtl_iter):
+    """Return (index, iss_event, rtl_event) of the first difference, or None. Missing events are padded."""
+    for i, (iss_event, rtl_event) in enumerate(itertools.zip_longest(iss_iter, rtl_iter)):
+        if iss_event != rtl_event:
+            return i, iss_event or ("ISS_MISSING",)*3, rtl_event or ("RTL_MISSING",)*3
+    return None
+
+def lockstep_monitor(test: str, process: subprocess.Popen) -> Optional[int]:
+    """Compare rtl.log with iss.log while the simulator runs, killing it at the first divergence."""
+    # Un rtl.log solo più corto viene giudicato da compare_results a simulazione finita
+    iss_log_path = os.path.join(sim_config.WORK_DIR, test, "iss.log")
+    if not os.path.exists(iss_log_path):
+        return None
+    rtl_iter = rtl_events(rtl_trace_lines(tail_lines(os.path.join(sim_config.WORK_DIR, test, "rtl.log"), process), sim_frontend.uses_spike(test)))
+    for i, (iss_event, rtl_event) in enumerate(itertools.zip_longest(iss_events(iss_log_path), rtl_iter)):
+        if rtl_event is None:
+            break
+        if iss_event != rtl_event:
+            vprint(f"{test}: RTL diverged from ISS at event {i}, stopping the simulation")
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            return i
+    return None
+
+def trace_mismatch(test: str):
+    """first_mismatch over the binary traces: (index, iss_record, rtl_record) or None."""
+    # Spike non registra lo store di fine test: con Spike la traccia RTL si ferma prima
+    iss_path, rtl_path = os.path.join(sim_config.WORK_DIR, test, "iss.trc"), os.path.join(sim_config.WORK_DIR, test, "rtl.trc")
+    limit = commit_trace.find_record(rtl_path, commit_trace.STORE, 0x10000000, 0xdeadbeef) if sim_frontend.uses_spike(test) else None
+    return commit_trace.first_difference(iss_path, rtl_path, limit)
+
+def compare_traces(test: str) -> bool:
+    iss_path, rtl_path = os.path.join(sim_config.WORK_DIR, test, "iss.trc"), os.path.join(sim_config.WORK_DIR, test, "rtl.trc")
+    if not os.path.exists(iss_path) or not os.path.exists(rtl_path):
+        missing = iss_path if not os.path.exists(iss_path) else rtl_path
+        print(f"Error comparing traces: {missing} not found. One of the trace files is missing.")
+        print(f"{test} {'.' * (50 - len(test))}. FAILED")
+        return False
+    mismatch = trace_mismatch(test)
+    print(f"{test} {'.' * (50 - len(test))}. {'PASSED' if mismatch is None else 'FAILED'}")
+    if mismatch is not None and sim_config.VERBOSE:
+        i, iss_record, rtl_record = mismatch
+        with open(os.path.join(sim_config.WORK_DIR, test, 'sim.log'), 'a') as sim_log:
+            sim_log.write("\n--- TRACE MISMATCH DETAILS ---\n")
+            sim_log.write(f"ISS generated {commit_trace.record_count(iss_path)} records.\n")
+            sim_log.write(f"RTL generated {commit_trace.record_count(rtl_path)} records.\n")
+            sim_log.write(f"First mismatch at index {i} (cycle {commit_trace.cycle_at(rtl_path, i)}):\n")
+            sim_log.write(f"  - ISS record: {commit_trace.format_record(iss_record) if iss_record else 'ISS_MISSING'}\n")
+            sim_log.write(f"  - RTL record: {commit_trace.format_record(rtl_record) if rtl_record else 'RTL_MISSING'}\n")
+    return mismatch is None
+
+def log_mismatch(test: str):
+    """First mismatch between the reference and the RTL trace in the current format, None if they match."""
+    if sim_config.COMMIT_TRACE == "binary":
+        return trace_mismatch(test)
+    return first_mismatch(iss_events(os.path.join(sim_config.WORK_DIR, test, "iss.log")), rtl_events(rtl_log_lines(test)))
+
+def compare_results(test: str) -> bool:
+    if sim_config.COMMIT_TRACE == "binary":
+        return compare_traces(test)
+    iss_log_path = os.path.join(sim_config.WORK_DIR, test, "iss.log")
+    rtl_log_path = os.path.join(sim_config.WORK_DIR, test, "rtl.log")
+    if not os.path.exists(iss_log_path) or not os.path.exists(rtl_log_path):
+        missing = iss_log_path if not os.path.exists(iss_log_path) else rtl_log_path
+        print(f"Error comparing logs: {missing} not found. One of the log files is missing.")
+        print(f"{test} {'.' * (50 - len(test))}. FAILED")
+        return False
+    mismatch = log_mismatch(test)
+    if mismatch is None:
+        print(f"{test} {'.' * (50 - len(test))}. PASSED")
+    else:
+        print(f"{test} {'.' * (50 - len(test))}. FAILED")
+        if sim_config.VERBOSE:
+            rtl_count = sum(1 for _ in rtl_events(rtl_log_lines(test)))
+            iss_count = sum(1 for _ in iss_events(iss_log_path))
+            i, iss_event, rtl_event = mismatch
+            sim_log_path = os.path.join(sim_config.WORK_DIR, test, 'sim.log')
+            with open(sim_log_path, 'a') as sim_log:
+                sim_log.write("\n--- LOG MISMATCH DETAILS ---\n")
+                sim_log.write(f"ISS generated {iss_count} events.\n")
+                sim_log.write(f"RTL generated {rtl_count} events.\n")
+                sim_log.write(f"First mismatch at index {i}:\n")
+                sim_log.write(f"  - ISS event: PC={iss_event[0]}, INSTR={iss_event[1]}, MOD={iss_event[2]}\n")
+                sim_log.write(f"  - RTL event: PC={rtl_event[0]}, INSTR={rtl_event[1]}, MOD={rtl_event[2]}\n")
+    return mismatch is None
+
+def event_cycle(test: str, index: int) -> int:
+    """Cycle of the index-th RTL event (or of the last one, when the RTL trace is shorter)."""
+    cycle = 0
+    for line in rtl_log_lines(test):
+        parts = line.split(';')
+        if len(parts) >= 4 and parts[3].strip():
+            try:
+                cycle = int(parts[0])
+            except ValueError:
+                continue
+            if index == 0:
+                break
+            index -= 1
+    return cycle
+
+def rerun_with_waveform(test: str, simulator: str) -> None:
+    """Rerun a failed test in work/<test>/wave, dumping only [N-k, N+k] around the first mismatch cycle N."""
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    if sim_config.COMMIT_TRACE == "binary":
+        rtl_log_path = os.path.join(work_dir, "rtl.trc")
+        iss_log_path = os.path.join(work_dir, "iss.trc")
+    else:
+        rtl_log_path = os.path.join(work_dir, "rtl.log")
+        iss_log_path = os.path.join(work_dir, "iss.log")
+    if not os.path.exists(rtl_log_path) or not os.path.exists(iss_log_path):
+        return
+    mismatch = log_mismatch(test)
+    if mismatch is None:
+        return
+    cycle = commit_trace.cycle_at(rtl_log_path, mismatch[0]) if sim_config.COMMIT_TRACE == "binary" else event_cycle(test, mismatch[0])
+    window = (max(0, cycle - sim_config.TRACE_FAILURE_CYCLES), cycle + sim_config.TRACE_FAILURE_CYCLES)
+    wave_dir = os.path.join(work_dir, "wave")
+    os.makedirs(wave_dir, exist_ok=True)
+    reset_vector = sim_frontend.load_base(test)
+    if simulator == "verilator":
+        binary = sim_rtl.build_verilator_model(sim_config.TRACE_ON_FAILURE)
+        plusargs = " ".join(f"+{arg}" for arg in sim_rtl.image_plusargs(work_dir, reset_vector) + sim_rtl.trace_plusargs(sim_config.TRACE_ON_FAILURE, window, exit_after=True) + sim_rtl.watchdog_plusargs(test))
+        cmd = f"cd {wave_dir} && {binary} {plusargs}"
+    else:
+        xsim_dir = sim_rtl.build_xsim_model(sim_config.TRACE_ON_FAILURE)
+        plusargs = " ".join(f"-testplusarg {arg}" for arg in sim_rtl.image_plusargs(work_dir, reset_vector) + sim_rtl.watchdog_plusargs(test))
+        cmd = f"cd {wave_dir} && xsim sim --xsimdir {xsim_dir} {sim_rtl.xsim_run_args(wave_dir, sim_config.TRACE_ON_FAILURE, window, exit_after=True)} {plusargs}"
+    vprint(f"{test}: first mismatch at cycle {cycle}, capturing waves for cycles {window[0]}-{window[1]} in {wave_dir}")
+    with open(os.path.join(wave_dir, "sim.log"), 'w') as sim_log:
+        sim_timing.run_measured(cmd, shell=True, stdout=sim_log, stderr=subprocess.STDOUT, **sim_sched.child_limits())
+
+def process_rtl_log(test: str):
+    if sim_config.COMMIT_TRACE == "binary":
+        return # trace_mismatch esclude già la firma di fine test
+    if test in LOCKSTEP_TESTS:
+        return # Il confronto legge rtl.log com'è stato scritto, come in lockstep
+    rtl_log_path = os.path.join(sim_config.WORK_DIR, test, "rtl.log")
+    if not os.path.exists(rtl_log_path):
+        vprint(f"Warning: rtl.log not found for test {test}. Skipping log processing.")
+        return
+    tmp_path = rtl_log_path + ".tmp"
+    with open(rtl_log_path, "r") as f_in, open(tmp_path, "w") as f_out:
+        for line in rtl_trace_lines((line.rstrip("\n") for line in f_in), sim_frontend.uses_spike(test)):
+            f_out.write(line + "\n")
+    os.replace(tmp_path, rtl_log_path)
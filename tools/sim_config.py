@@ -0,0 +1,48 @@
+"""Settings of sim_manager.py shared by the flow modules: defaults here, overridden from the command line."""
+
+import os
+import shutil
+
+# --- IMPOSTAZIONI GLOBALI ---
+DRAM_BASE = 0x80000000
+LEGACY_BASE = 0x100000
+IMEM_DEPTH = None # Dimensione in byte di ICCM/DCCM: None = da rtl/include/global.svh (INSTR_MEM_DEPTH, DATA_MEM_DEPTH)
+DMEM_DEPTH = None
+BENCH_DIR = os.path.join("tests", "asm", "report tests") # Workload di benchmark, indirizzati come bench.<nome>
+RTL_ROOT = "." # Albero da cui prendere rtl/ e dv/ (diverso solo nel confronto tra revisioni RTL)
+VERBOSE = False # Variabile globale per la modalità debug
+SIM_SERVER = False # --server: simulazioni Verilator su un pool di modelli persistenti (+SIM_SERVER)
+BUILD_MODE = "shared" # "shared": un solo modello per revisione RTL, "per-test": build in ogni work/<test>
+THREADS = "1" # --threads: numero di thread per simulazione Verilator oppure "auto"
+SIM_THREADS = 1 # Valore risolto da run_tests; ogni simulazione tiene altrettanti job token
+BUILD_PROFILE = "default" # "fast": Verilator -O3 --x-assign fast --x-initial fast, C++ a -O3
+USE_CCACHE = shutil.which("ccache") is not None # Compilazione degli oggetti Verilator tramite ccache
+WORK_DIR = "work" # Directory dei test e dei risultati di questa esecuzione (--work-dir, una per shard)
+MODEL_DIR = os.path.join("work", ".models")
+STACK_POINTER_INIT_VALUE = 0x80000000
+USE_CACHE = True # Cache content-addressed di test.elf/iss.log/imem.hex/dmem.hex
+CACHE_MAX_BYTES = 2048 * 1024 ** 2
+REUSE_RESULTS = True # Verdetto e metriche riusati se RTL, testbench, immagini e simulatore non sono cambiati (--force per rieseguire)
+MEM_LIMIT_BYTES = None # Limite di memoria (RLIMIT_AS) per i processi di build/simulazione di un test
+DURATIONS_PATH = os.path.join("work", ".durations.json")
+SPIKE_MAX_INSTRUCTIONS = 10_000_000 # Rete di sicurezza se l'ISS non raggiunge la firma di fine test
+ISS = "model" # "model": tools/rv_model.py in-process per tutti i test; "legacy": tools/riscv_sim, Spike per i test mac_
+COMMIT_TRACE = "text" # "binary": rtl.trc/iss.trc a record fissi (tools/commit_trace.py) al posto di rtl.log/iss.log
+LOCKSTEP = True # Confronto ISS/RTL durante la simulazione, con kill alla prima divergenza
+TRACE_FORMAT = "off" # Forme d'onda: "off", "vcd" o "fst" (solo Verilator; XSim produce sempre un .wdb)
+TRACE_WINDOW = None # (ciclo_inizio, ciclo_fine) da salvare, None = tutta la simulazione
+CPI_BOUND = 20.0 # Budget di cicli per test = istruzioni dell'ISS * CPI_BOUND + CYCLE_BUDGET_SLACK (0 = nessun limite)
+HANG_CYCLES = 100000 # Simulazione fermata se non si ritira nulla per tanti cicli (0 = disabilitato)
+SIM_TIMEOUT = 1800.0 # Timeout wall-clock in secondi di ogni simulazione (0 = disabilitato)
+PMU_SAMPLE = 0 # --pmu-sample N: contatori PMU scritti ogni N cicli in work/<test>/pmu.smp (0 = disabilitato)
+PMU_TIMELINE_ROWS = 20 # Intervalli della tabella pmu.txt scritta dopo ogni test campionato
+TRACE_ON_FAILURE = "fst" # Formato della rerun automatica attorno al primo mismatch, "off" per disabilitarla
+TRACE_FAILURE_CYCLES = 200 # Semi-ampiezza k della finestra [N-k, N+k] della rerun
+BASELINE_PATH = os.path.join("work", "perf_baseline.json")
+PERF_THRESHOLD = 2.0 # Regressione se i cicli crescono / l'IPC cala oltre questa percentuale
+
+# --- FUNZIONE DI STAMPA VERBOSA ---
+def vprint(*args, **kwargs):
+    """Stampa solo se la modalità VERBOSE è attiva."""
+    if VERBOSE:
+        print(*args, **kwargs)
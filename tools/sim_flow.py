@@ -0,0 +1,107 @@
+"""End-to-end run of a test and of a test list on the shared job budget."""
+
+import concurrent.futures
+import os
+import time
+import traceback
+from typing import List, Optional
+
+import sim_cache
+import sim_compare
+import sim_config
+from sim_config import vprint
+import sim_frontend
+import sim_perf
+import sim_pmu
+import sim_rtl
+import sim_sched
+import sim_server
+import sim_shard
+import sim_timing
+
+def run_e2e(test: str, simulator: str, durations: Optional[dict] = None) -> dict:
+    tokens = sim_sched.sim_tokens(simulator)
+    sim_sched.JOB_TOKENS.acquire(tokens)
+    start = time.monotonic()
+    reused = False
+    try:
+        with sim_timing.stage(test, "test"):
+            sim_frontend.run_frontend(test)
+            with sim_timing.stage(test, "result_cache"):
+                key = sim_cache.result_key(test, simulator) if sim_config.REUSE_RESULTS else None
+                previous = sim_cache.load_result(key) if key else None
+            if previous is not None:
+                print(f"{test} ....... {previous['status']} (inputs unchanged, verdict reused)")
+                reused = True
+                result = {**previous, "reused": True, **sim_timing.test_timing(test, start)}
+                return result
+            if simulator == "verilator":
+                sim_rtl.run_verilator(test)
+            else:
+                sim_rtl.run_xsim(test)
+            timeout = sim_rtl.sim_timeout(test)
+            if timeout is not None:
+                # Il timeout wall-clock dipende dal carico della macchina: i TIMEOUT non vanno in cache
+                print(f"{test} {'.' * (50 - len(test))}. TIMEOUT ({timeout['timeout']}, last retired pc {timeout['last_pc'] or 'none'})")
+                result = {"test": test, "status": "TIMEOUT", **timeout}
+                result.update(sim_timing.test_timing(test, start))
+                return result
+            with sim_timing.stage(test, "process_rtl_log"):
+                sim_compare.process_rtl_log(test)
+            with sim_timing.stage(test, "compare"):
+                passed = sim_compare.compare_results(test)
+            result = {"test": test, "status": "PASSED" if passed else "FAILED", **sim_perf.parse_perf_report(os.path.join(sim_config.WORK_DIR, test, "rtl.log"))}
+            if key:
+                sim_cache.store_result(key, result)
+            if sim_config.PMU_SAMPLE:
+                with sim_timing.stage(test, "pmu"):
+                    try:
+                        sim_pmu.pmu_timeline(test, sim_config.PMU_TIMELINE_ROWS)
+                    except Exception as e:
+                        print(f"{test}: no PMU timeline: {e}")
+            if not passed and sim_config.TRACE_ON_FAILURE != "off":
+                with sim_timing.stage(test, "wave_rerun"):
+                    sim_compare.rerun_with_waveform(test, simulator)
+        result.update(sim_timing.test_timing(test, start))
+        sim_time = result["stages"].get("sim")
+        if sim_time and result.get("cycles"):
+            result["sim_cycles_per_s"] = round(result["cycles"] / sim_time, 1)
+        return result
+    except Exception as e:
+        print(f"Error running test {test}: {e}")
+        if sim_config.VERBOSE:
+            print(traceback.format_exc())
+        raise e
+    finally:
+        sim_sched.JOB_TOKENS.release(tokens)
+        if durations is not None and not reused:
+            durations[test] = round(time.monotonic() - start, 3)
+
+def run_tests(tests: List[str], simulator: str) -> List[dict]:
+    """Run tests longest-first on the job budget; one result dict per test, with its wall-clock duration."""
+    recorded = sim_sched.load_durations()
+    sim_config.SIM_THREADS = sim_sched.auto_threads(tests, recorded) if sim_config.THREADS == "auto" else int(sim_config.THREADS)
+    if simulator == "verilator" and sim_config.SIM_THREADS > 1:
+        print(f"Verilator model with {sim_config.SIM_THREADS} threads, up to {sim_sched.JOB_TOKENS.total // sim_sched.sim_tokens(simulator)} concurrent simulations")
+    if sim_config.BUILD_MODE == "shared":
+        # Il modello condiviso viene compilato prima dei test, con tutto il budget di job
+        sim_rtl.build_verilator_model() if simulator == "verilator" else sim_rtl.build_xsim_model()
+    durations, results = {}, []
+    tests = sim_sched.order_longest_first(tests, recorded)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=sim_sched.JOB_TOKENS.total) as executor:
+            future_to_test = {executor.submit(run_e2e, test, simulator, durations): test for test in tests}
+            for future in concurrent.futures.as_completed(future_to_test):
+                test = future_to_test[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    vprint(f"Error in thread for test {test}: {e}")
+                    results.append({"test": test, "status": "ERROR"})
+    finally:
+        sim_server.shutdown_servers()
+    if sim_shard.SHARD is None:
+        sim_sched.save_durations(durations)
+    for result in results:
+        result["duration"] = durations.get(result["test"])
+    return results
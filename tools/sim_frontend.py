@@ -0,0 +1,205 @@
+"""Frontend of a test: compilation, reference ISS and memory images, through the artifact cache."""
+
+import os
+import re
+import shlex
+import subprocess
+import sys
+from typing import List
+
+import commit_trace
+import rv_model
+import sim_cache
+import sim_config
+from sim_config import vprint
+import sim_images
+import sim_rtl
+import sim_timing
+
+def test_source(test: str):
+    """(source file, include dir) of a test: <dir>.<name> lives in tests/<dir>/, bench.<name> in BENCH_DIR."""
+    test_path = test.split(".")
+    if test_path[0] == "bench":
+        return os.path.join(sim_config.BENCH_DIR, test_path[1] + ".s"), os.path.join("tests", "asm")
+    extension = ".s" if test_path[0] == "asm" else ".c"
+    return os.path.join("tests", test_path[0], test_path[1] + extension), os.path.join("tests", test_path[0])
+
+def uses_spike(test: str) -> bool:
+    test_path = test.split(".")
+    return sim_config.ISS == "legacy" and len(test_path) > 1 and test_path[1].startswith("mac_")
+
+def load_base(test: str) -> int:
+    """Link address and reset vector: Spike needs its DRAM base, every other ISS uses the legacy map."""
+    return sim_config.DRAM_BASE if uses_spike(test) else sim_config.LEGACY_BASE
+
+def gen_command(test: str):
+    """Return (compile command, linker script content or None, source files) for a test."""
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    source_path, include_dir = test_source(test)
+    extension = os.path.splitext(source_path)[1]
+    elf_output_path = os.path.join(work_dir, "test.elf")
+    source_arg = shlex.quote(source_path)
+    helper_paths = [os.path.join(include_dir, 'asm_functions', 'printf.s'), os.path.join(include_dir, 'asm_functions', 'eot_sequence.s')]
+    link_script_content = None
+    if uses_spike(test):
+        link_script_path = os.path.join(work_dir, "linker.ld")
+        link_script_content = f"ENTRY(_start)\nSECTIONS {{\n  . = 0x{sim_config.DRAM_BASE:x};\n  .text : {{ *(.text) }}\n  .rodata : {{ *(.rodata) }}\n  .data : {{ *(.data) }}\n  .bss : {{ *(.bss COMMON) }}\n}}"
+        base_cmd = f"riscv64-unknown-elf-gcc -I{include_dir} -march=rv32im -mabi=ilp32 -o {elf_output_path} -nostdlib -T {link_script_path}"
+        if extension == ".s":
+            full_cmd = f"{base_cmd} {source_arg}"
+        else:
+            full_cmd = f"{base_cmd} -fno-builtin-printf -fno-common -falign-functions=4 {source_arg} {helper_paths[0]} {helper_paths[1]}"
+    else:
+        base_cmd = f"riscv64-unknown-elf-gcc -I{include_dir} -march=rv32im -mabi=ilp32 -o {elf_output_path} -nostdlib"
+        linker_flag = f"-Wl,-Ttext=0x{sim_config.LEGACY_BASE:x}"
+        if extension == ".s":
+            full_cmd = f"{base_cmd} {source_arg} {linker_flag}"
+        else:
+            full_cmd = f"{base_cmd} -fno-builtin-printf -fno-common -falign-functions=4 {source_arg} {helper_paths[0]} {helper_paths[1]} {linker_flag}"
+    if extension == ".s":
+        sources = [source_path] + asm_includes(source_path, include_dir)
+    else:
+        sources = [source_path] + helper_paths
+    return full_cmd, link_script_content, sources
+
+def asm_includes(source_path: str, include_dir: str) -> List[str]:
+    """Files pulled in through .include, resolved like gcc does (source dir first, then -I)."""
+    includes = []
+    try:
+        with open(source_path, 'r') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return includes
+    for name in re.findall(r'^\s*\.include\s+"([^"]+)"', content, re.MULTILINE):
+        for base in (os.path.dirname(source_path), include_dir):
+            candidate = os.path.normpath(os.path.join(base, name))
+            if os.path.exists(candidate):
+                if candidate not in includes:
+                    includes.append(candidate)
+                    includes.extend(p for p in asm_includes(candidate, include_dir) if p not in includes)
+                break
+    return includes
+
+def run_gen(test: str) -> None:
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    os.makedirs(work_dir, exist_ok=True)
+    compile_log_path = os.path.join(work_dir, 'compile.log')
+    full_cmd, link_script_content, _ = gen_command(test)
+    try:
+        if link_script_content is not None:
+            vprint(f"Compiling '{test}' for Spike (address 0x{sim_config.DRAM_BASE:x})")
+            with open(os.path.join(work_dir, "linker.ld"), 'w') as f:
+                f.write(link_script_content)
+        else:
+            vprint(f"Compiling '{test}' for standard ISS (address 0x{sim_config.LEGACY_BASE:x})")
+        sim_timing.run_measured(f"{full_cmd} > {compile_log_path} 2>&1", shell=True)
+    except Exception as e:
+        print(f"Error compiling test {test}: {e}")
+        sys.exit(1)
+
+def run_frontend(test: str) -> None:
+    """Compile, ISS and image preparation, served from the artifact cache when the inputs did not change."""
+    with sim_timing.stage(test, "cache"):
+        key = sim_cache.artifact_key(test) if sim_config.USE_CACHE else None
+        if key and sim_cache.restore_artifacts(test, key):
+            return
+    os.makedirs(os.path.join(sim_config.WORK_DIR, test), exist_ok=True)
+    sim_cache.clear_artifacts(test)
+    with sim_timing.stage(test, "gen"):
+        run_gen(test)
+    with sim_timing.stage(test, "prepare_imem"):
+        sim_images.prepare_imem(test)
+    with sim_timing.stage(test, "iss"):
+        run_iss(test)
+    if key:
+        with sim_timing.stage(test, "cache"):
+            sim_cache.store_artifacts(test, key)
+
+SPIKE_EOT_RE = re.compile(r"\bmem\s+0x0*10000000\s+0x0*deadbeef\b", re.IGNORECASE)
+
+def run_spike_iss(test: str) -> None:
+    """Run Spike up to the end-of-test store, converting its commit log into iss.log."""
+    vprint(f"Running Spike ISS for MAC test: {test}")
+    elf_path = os.path.join(sim_config.WORK_DIR, test, "test.elf")
+    log_path = os.path.join(sim_config.WORK_DIR, test, "iss.log")
+    if not os.path.exists(elf_path):
+        print(f"ERRORE FATALE: Il file ELF '{elf_path}' non è stato trovato.")
+        sys.exit(1)
+    # Il limite di istruzioni è solo una rete di sicurezza: normalmente Spike viene fermato alla firma di fine test
+    cmd = ['spike', '--log-commits', f'--instructions={sim_config.SPIKE_MAX_INSTRUCTIONS}', f'--isa=rv32im', elf_path]
+    vprint(f"Esecuzione comando: {' '.join(cmd)}")
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+    except FileNotFoundError:
+        print("ERRORE FATALE: Il comando 'spike' non è stato trovato.")
+        sys.exit(1)
+    log_re = re.compile(r"core\s+\d+:\s+\d+\s+0x([0-9a-fA-F]+)\s+\((0x[0-9a-fA-F]+)\)(.*)")
+    reg_write_re = re.compile(r"(x\d+)\s+0x([0-9a-fA-F]+)")
+    lines_written, saw_commit, eot_reached = 0, False, False
+    try:
+        with open(log_path, 'w') as out_f:
+            for line in process.stderr:
+                clean_line = line.strip()
+                log_match = log_re.match(clean_line)
+                if not log_match: continue
+                saw_commit = True
+                pc_str, instr_hex, rest_of_line = log_match.groups()
+                pc_val = int(pc_str, 16)
+                if pc_val < sim_config.DRAM_BASE:
+                    continue
+                if SPIKE_EOT_RE.search(rest_of_line):
+                    eot_reached = True
+                    break
+                rest_of_line = rest_of_line.strip()
+                touches, mnemonic = [], rest_of_line
+                reg_match = reg_write_re.search(rest_of_line)
+                if reg_match:
+                    reg_name, reg_val_hex = reg_match.groups()
+                    touches.append(f"{reg_name}=0x{int(reg_val_hex, 16):08x}")
+                    mnemonic = rest_of_line[:reg_match.start()].strip()
+                touch_str = ";".join(touches)
+                log_line = f"0x{pc_str};0x{instr_hex};{mnemonic};{touch_str}"
+                out_f.write(log_line + "\n")
+                lines_written += 1
+    finally:
+        if sim_timing.reap(process, block=False) is None:
+            process.kill()
+        process.stderr.close()
+        sim_timing.reap(process)
+    vprint(f"Spike ISS log generato. Righe scritte: {lines_written}.")
+    if not eot_reached:
+        print(f"ATTENZIONE: {test}: Spike si è fermato senza la firma di fine test (limite di {sim_config.SPIKE_MAX_INSTRUCTIONS} istruzioni?)")
+    if lines_written == 0 and saw_commit:
+        print("\n--- ATTENZIONE: il file iss.log è vuoto! ---")
+        raise Exception("Generazione di iss.log fallita, il log è vuoto.")
+
+def run_iss(test: str) -> None:
+    """Reference trace for the test, from the images prepare_imem gives the RTL."""
+    if sim_config.ISS == "model":
+        vprint(f"Running reference model for test: {test}")
+        imem, dmem, _ = sim_images.memory_images(test)
+        try:
+            retired = rv_model.run(imem, dmem, os.path.join(sim_config.WORK_DIR, test, sim_rtl.iss_trace_name()), load_base(test), sim_config.STACK_POINTER_INIT_VALUE, sim_config.SPIKE_MAX_INSTRUCTIONS, sim_config.COMMIT_TRACE == "binary")
+        except rv_model.IssError as e:
+            raise Exception(f"ISS for test {test}: {e}")
+        vprint(f"{test}: {retired} instructions retired")
+        return
+    if uses_spike(test):
+        run_spike_iss(test)
+    else:
+        run_legacy_iss(test)
+    if sim_config.COMMIT_TRACE == "binary":
+        commit_trace.convert_log(os.path.join(sim_config.WORK_DIR, test, "iss.log"), os.path.join(sim_config.WORK_DIR, test, "iss.trc"))
+
+def run_legacy_iss(test: str) -> None:
+    vprint(f"Running standard ISS for test: {test}")
+    elf_path = os.path.join(sim_config.WORK_DIR, test, "test.elf")
+    dmem_path = os.path.join(sim_config.WORK_DIR, test, "dmem.hex")
+    try:
+        cmd = f"./tools/riscv_sim {elf_path} -o {os.path.join(sim_config.WORK_DIR, test, 'iss.log')}"
+        if os.path.exists(dmem_path):
+            cmd += f" -m {dmem_path}"
+        sim_timing.run_measured(cmd, shell=True)
+    except Exception as e:
+        print(f"Error running ISS for test {test}: {e}")
+        sys.exit(1)
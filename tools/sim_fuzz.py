@@ -0,0 +1,175 @@
+"""`fuzz` subcommand: differential fuzzing of the RTL against the reference model with random programs."""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from typing import List
+
+import rv_fuzz
+import rv_model
+import sim_compare
+import sim_config
+from sim_config import vprint
+import sim_images
+import sim_perf
+import sim_rtl
+import sim_sched
+import sim_server
+
+# --- FUZZING DIFFERENZIALE ---
+FUZZ_REPORT_INTERVAL = 60.0 # Secondi tra due righe di avanzamento della campagna
+
+def fuzz_program(seed: int, length: int):
+    """(items, DCCM image) of a generated program: the same seed always gives the same program."""
+    rng = random.Random(seed)
+    items = rv_fuzz.generate(rng, length)
+    return items, bytes(rv_fuzz.data_image(rng, sim_images.memory_sizes()[1]))
+
+def fuzz_check(test: str, items: List[tuple], ids: List[int], dmem: bytes, simulator: str) -> tuple:
+    """(verdict, ISS instruction count) of a generated program: PASSED, FAILED (trace mismatch) or TIMEOUT."""
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    os.makedirs(work_dir, exist_ok=True)
+    imem = bytearray(sim_images.memory_sizes()[0])
+    sim_images.place_section(imem, ".text", 0, rv_fuzz.assemble(items, ids, sim_config.LEGACY_BASE), "ICCM")
+    sim_images.write_hex_words(os.path.join(work_dir, "imem.hex"), imem)
+    sim_images.write_hex_words(os.path.join(work_dir, "dmem.hex"), dmem)
+    retired = rv_model.run(imem, bytearray(dmem), os.path.join(work_dir, sim_rtl.iss_trace_name()), sim_config.LEGACY_BASE,
+                           sim_config.STACK_POINTER_INIT_VALUE, sim_config.SPIKE_MAX_INSTRUCTIONS, sim_config.COMMIT_TRACE == "binary")
+    if simulator == "verilator":
+        sim_rtl.run_verilator(test)
+    else:
+        sim_rtl.run_xsim(test)
+    if sim_rtl.sim_timeout(test) is not None:
+        return "TIMEOUT", retired
+    sim_compare.process_rtl_log(test)
+    if not os.path.exists(os.path.join(work_dir, "rtl.trc" if sim_config.COMMIT_TRACE == "binary" else "rtl.log")) or sim_compare.log_mismatch(test) is not None:
+        return "FAILED", retired
+    return "PASSED", retired
+
+def minimize_fuzz_failure(test: str, items: List[tuple], dmem: bytes, simulator: str, verdict: str) -> str:
+    """Shrink a failing program keeping its verdict, rerun it in <work-dir>/failures/<test> and return that directory."""
+    trial = f"{test}.min"
+    keep = rv_fuzz.ddmin(items, lambda ids: fuzz_check(trial, [items[i] for i in ids], ids, dmem, simulator)[0] == verdict)
+    shutil.rmtree(os.path.join(sim_config.WORK_DIR, trial), ignore_errors=True)
+    repro = os.path.join("failures", test)
+    shutil.rmtree(os.path.join(sim_config.WORK_DIR, repro), ignore_errors=True)
+    fuzz_check(repro, [items[i] for i in keep], keep, dmem, simulator)
+    repro_dir = os.path.join(sim_config.WORK_DIR, repro)
+    for name, ids in (("program.s", keep), ("original.s", list(range(len(items))))):
+        with open(os.path.join(repro_dir, name), 'w') as f:
+            f.write(rv_fuzz.listing(rv_fuzz.assemble([items[i] for i in ids], ids, sim_config.LEGACY_BASE), sim_config.LEGACY_BASE))
+    vprint(f"{test}: minimized from {len(items)} to {len(keep)} items")
+    return repro_dir
+
+def fuzz_one(seed: int, length: int, simulator: str) -> dict:
+    test = f"fuzz.{seed}"
+    items, dmem = fuzz_program(seed, length)
+    tokens = sim_sched.sim_tokens(simulator)
+    sim_sched.JOB_TOKENS.acquire(tokens)
+    try:
+        verdict, retired = fuzz_check(test, items, list(range(len(items))), dmem, simulator)
+        result = {"test": test, "seed": seed, "status": verdict, "instructions": retired}
+        if verdict != "PASSED":
+            print(f"{test} {'.' * (50 - len(test))}. {verdict}, minimizing")
+            result["repro"] = minimize_fuzz_failure(test, items, dmem, simulator, verdict)
+        return result
+    finally:
+        sim_sched.JOB_TOKENS.release(tokens)
+        shutil.rmtree(os.path.join(sim_config.WORK_DIR, test), ignore_errors=True) # I programmi che passano non servono più
+
+def fuzz_progress(counts: dict, verified: int, elapsed: float) -> str:
+    failing = counts["FAILED"] + counts["TIMEOUT"] + counts["ERROR"]
+    return (f"{sum(counts.values())} programs, {failing} failing, {verified} instructions verified in {elapsed:.0f}s "
+            f"({verified / max(elapsed, 1e-9):.0f} verified instr/s)")
+
+def fuzz_main(argv: List[str]) -> int:
+    """`fuzz`: generated programs run differentially against the reference model, many per simulator build."""
+    parser = argparse.ArgumentParser(prog="sim_manager.py fuzz", description="Differential fuzzing of the RTL against the reference model")
+    parser.add_argument("-s", "--simulator", required=True, choices=["verilator", "xsim"], help="Simulator to use")
+    parser.add_argument("--seed", type=int, help="Seed of the first program, the next ones use seed+1, seed+2, ... (default: current time)")
+    parser.add_argument("--programs", type=int, default=1000, help="Programs to run (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Keep generating programs for this many seconds (e.g. 28800 overnight)")
+    parser.add_argument("--length", type=int, default=300, help="Random instructions, branches and loops per program")
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(), help="Concurrent simulations")
+    parser.add_argument("--no-server", action="store_true", help="Start the Verilator model once per program instead of keeping a pool of servers")
+    parser.add_argument("--commit-trace", choices=["text", "binary"], default="binary", help="Trace format compared for each program")
+    parser.add_argument("--build-profile", choices=["default", "fast"], default=sim_config.BUILD_PROFILE, help="Verilator build profile of the shared model")
+    parser.add_argument("--hang-cycles", type=int, default=sim_config.HANG_CYCLES, help="Stop a program after this many cycles without retiring (0 = off)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Wall-clock limit in seconds for each simulation (0 = none)")
+    parser.add_argument("--imem-size", type=int, help="ICCM size in bytes (default from global.svh)")
+    parser.add_argument("--dmem-size", type=int, help="DCCM size in bytes (default from global.svh)")
+    parser.add_argument("--work-dir", default=os.path.join("work", "fuzz"), help="Directory for the running programs and the minimized failures")
+    parser.add_argument("-d", "--debug", action="store_true", help="Enable verbose/debug printing")
+    args = parser.parse_args(argv)
+    if args.length < 1 or args.programs < 1 or args.duration < 0:
+        parser.error("--length and --programs must be positive, --duration must not be negative")
+    sim_config.VERBOSE = args.debug
+    sim_config.WORK_DIR = args.work_dir
+    sim_sched.JOB_TOKENS = sim_sched.JobTokens(args.jobs)
+    sim_config.COMMIT_TRACE = args.commit_trace
+    sim_config.SIM_SERVER = args.simulator == "verilator" and not args.no_server
+    sim_config.BUILD_PROFILE = args.build_profile
+    sim_config.HANG_CYCLES, sim_config.SIM_TIMEOUT = args.hang_cycles, args.timeout
+    sim_config.IMEM_DEPTH, sim_config.DMEM_DEPTH = args.imem_size, args.dmem_size
+    if sim_images.memory_sizes()[1] < rv_fuzz.DATA_BASE + rv_fuzz.DATA_WINDOW:
+        parser.error(f"the DCCM must hold the data window at 0x{rv_fuzz.DATA_BASE:x}-0x{rv_fuzz.DATA_BASE + rv_fuzz.DATA_WINDOW:x}")
+    seed = args.seed if args.seed is not None else int(time.time())
+    os.makedirs(sim_config.WORK_DIR, exist_ok=True)
+    # Un solo modello per tutta la campagna, compilato con tutto il budget di job
+    sim_rtl.build_verilator_model() if args.simulator == "verilator" else sim_rtl.build_xsim_model()
+    limit = f"for {args.duration:g}s" if args.duration else f"{args.programs} programs"
+    print(f"Fuzzing {args.simulator} from seed {seed}, {limit}, {sim_sched.JOB_TOKENS.total} concurrent simulations")
+
+    counts = {"PASSED": 0, "FAILED": 0, "TIMEOUT": 0, "ERROR": 0}
+    verified, failures = 0, []
+    seeds = itertools.count(seed)
+    start = last_report = time.monotonic()
+    deadline = start + args.duration if args.duration else None
+    submitted = 0
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=sim_sched.JOB_TOKENS.total) as executor:
+            pending = {}
+            while True:
+                while len(pending) < 2 * sim_sched.JOB_TOKENS.total and (time.monotonic() < deadline if deadline else submitted < args.programs):
+                    program_seed = next(seeds)
+                    pending[executor.submit(fuzz_one, program_seed, args.length, args.simulator)] = program_seed
+                    submitted += 1
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, timeout=FUZZ_REPORT_INTERVAL, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    program_seed = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"fuzz.{program_seed}: error: {e}")
+                        result = {"test": f"fuzz.{program_seed}", "seed": program_seed, "status": "ERROR"}
+                    counts[result["status"]] += 1
+                    if result["status"] == "PASSED":
+                        verified += result["instructions"]
+                    else:
+                        failures.append(result)
+                        if "repro" in result:
+                            print(f"{result['test']}: {result['status']}, minimized program in {result['repro']}")
+                if time.monotonic() - last_report >= FUZZ_REPORT_INTERVAL:
+                    last_report = time.monotonic()
+                    print(fuzz_progress(counts, verified, last_report - start))
+    finally:
+        sim_server.shutdown_servers()
+    elapsed = time.monotonic() - start
+    print(fuzz_progress(counts, verified, elapsed))
+    summary_path = os.path.join(sim_config.WORK_DIR, "fuzz_results.json")
+    with open(summary_path, 'w') as f:
+        json.dump({"revision": sim_perf.git_revision(), "simulator": args.simulator, "seed": seed, "length": args.length, **counts,
+                   "verified_instructions": verified, "wall_time": round(elapsed, 3),
+                   "verified_per_s": round(verified / max(elapsed, 1e-9), 1), "failures": failures}, f, indent=1, sort_keys=True)
+    print(f"Campaign summary written to {summary_path}")
+    for result in failures:
+        print(f"Reproduce {result['test']} with: sim_manager.py fuzz -s {args.simulator} --seed {result['seed']} --programs 1 --length {args.length}")
+    return 1 if failures else 0
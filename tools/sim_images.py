@@ -0,0 +1,113 @@
+"""ICCM/DCCM images of a test, built from its ELF sections like core_top addresses its memories."""
+
+import os
+import re
+import struct
+import sys
+from typing import Optional
+from elftools.elf.elffile import ELFFile
+
+import sim_config
+import sim_frontend
+
+def svh_localparams(path: str) -> dict:
+    """Integer localparams of a header, resolving references to earlier ones (e.g. INSTR_MEM_WIDTH = XLEN)."""
+    params = {}
+    with open(path, 'r') as f:
+        content = f.read()
+    for name, expr in re.findall(r"localparam\s+(?:\w+\s+)?(\w+)\s*=\s*([^;]+);", content):
+        expr = re.sub(r"\d+'[hH]([0-9a-fA-F_]+)", lambda m: str(int(m.group(1).replace("_", ""), 16)), expr.strip())
+        if not re.fullmatch(r"[\w\s()+\-*/]+", expr):
+            continue
+        names = re.findall(r"[A-Za-z_]\w*", expr)
+        if any(n not in params for n in names):
+            continue
+        expr = re.sub(r"[A-Za-z_]\w*", lambda m: str(params[m.group(0)]), expr).replace("/", "//")
+        params[name] = int(eval(expr, {"__builtins__": {}}))
+    return params
+
+def memory_sizes():
+    """(ICCM bytes, DCCM bytes): CLI overrides, otherwise the depths and widths in global.svh."""
+    imem_size, dmem_size = sim_config.IMEM_DEPTH, sim_config.DMEM_DEPTH
+    if imem_size is None or dmem_size is None:
+        params = svh_localparams(os.path.join(sim_config.RTL_ROOT, "rtl", "include", "global.svh"))
+        if imem_size is None:
+            imem_size = params["INSTR_MEM_DEPTH"] * params["INSTR_MEM_WIDTH"] // 8
+        if dmem_size is None:
+            dmem_size = params["DATA_MEM_DEPTH"] * params["DATA_MEM_WIDTH"] // 8
+    return imem_size, dmem_size
+
+def write_hex_words(path: str, image: bytes) -> None:
+    """$readmemh image, one little-endian 32-bit word per line, converted in bulk."""
+    n_words = len(image) // 4
+    big_endian = struct.pack(f">{n_words}I", *struct.unpack(f"<{n_words}I", image))
+    with open(path, 'w') as f:
+        f.write(big_endian.hex("\n", 4) + "\n")
+
+def read_hex_words(path: str, size: int) -> bytearray:
+    image = bytearray(size)
+    addr = 0
+    with open(path, 'r') as f:
+        for tok in f.read().split():
+            if tok.startswith("@"):
+                addr = int(tok[1:], 16)
+            else:
+                if addr < size // 4:
+                    struct.pack_into("<I", image, addr * 4, int(tok, 16))
+                addr += 1
+    return image
+
+def place_section(image: bytearray, name: str, offset: int, data: bytes, memory: str, placed: Optional[list] = None) -> None:
+    """Copy a section at its offset folded on the memory size, rejecting overlaps with the ranges in `placed`."""
+    # core_top decodifica solo i bit bassi dell'indirizzo: una .data allineata a pagina finisce in memoria come sull'RTL
+    size = len(image)
+    if len(data) > size:
+        raise Exception(f"Section {name} ({len(data)} bytes) does not fit in {memory} ({size} bytes): "
+                        f"enlarge {'INSTR' if memory == 'ICCM' else 'DATA'}_MEM_DEPTH or pass --{memory[0].lower()}mem-size")
+    start = offset % size
+    ranges = [(start, min(start + len(data), size))] + ([(0, start + len(data) - size)] if start + len(data) > size else [])
+    if placed is not None:
+        for lo, hi in ranges:
+            for other, other_lo, other_hi in placed:
+                if lo < other_hi and other_lo < hi:
+                    raise Exception(f"Sections {other} and {name} overlap in the {memory} once their addresses are folded on its {size} bytes")
+        placed.extend((name, lo, hi) for lo, hi in ranges)
+    copied = 0
+    for lo, hi in ranges:
+        image[lo:hi] = data[copied:copied + hi - lo]
+        copied += hi - lo
+
+def memory_images(test: str):
+    """(ICCM, DCCM, has_dmem) images: executable ELF sections in the ICCM, the other allocated ones in the DCCM."""
+    elf_path = os.path.join(sim_config.WORK_DIR, test, "test.elf")
+    mem_path = os.path.splitext(sim_frontend.test_source(test)[0])[0] + ".mem"
+    base_addr = sim_frontend.load_base(test)
+    imem_size, dmem_size = memory_sizes()
+    imem = bytearray(imem_size)
+    # Il .mem del test è il contenuto iniziale della DCCM, le sezioni dati lo sovrascrivono
+    has_dmem = os.path.exists(mem_path)
+    dmem = read_hex_words(mem_path, dmem_size) if has_dmem else bytearray(dmem_size)
+    placed = {"ICCM": [], "DCCM": []}
+    SHF_ALLOC, SHF_EXECINSTR = 0x2, 0x4
+    with open(elf_path, 'rb') as f:
+        elf = ELFFile(f)
+        if not elf.get_section_by_name('.text'):
+            print("Error: No .text section found in ELF file")
+            sys.exit(1)
+        for section in elf.iter_sections():
+            flags, size = section.header['sh_flags'], section.header['sh_size']
+            if not flags & SHF_ALLOC or size == 0 or section.header['sh_type'] == 'SHT_NOBITS':
+                continue
+            offset = section.header['sh_addr'] - base_addr
+            if flags & SHF_EXECINSTR:
+                place_section(imem, section.name, offset, section.data(), "ICCM", placed["ICCM"])
+            else:
+                place_section(dmem, section.name, offset, section.data(), "DCCM", placed["DCCM"])
+                has_dmem = True
+    return imem, dmem, has_dmem
+
+def prepare_imem(test: str) -> None:
+    imem, dmem, has_dmem = memory_images(test)
+    write_hex_words(os.path.join(sim_config.WORK_DIR, test, "imem.hex"), imem)
+    if has_dmem:
+        write_hex_words(os.path.join(sim_config.WORK_DIR, test, "dmem.hex"), dmem)
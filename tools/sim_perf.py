@@ -0,0 +1,92 @@
+"""Performance metrics from the simulation report, results.jsonl and the performance baseline."""
+
+import json
+import os
+import re
+import subprocess
+import time
+from typing import List
+
+import sim_config
+
+# --- RISULTATI DI PERFORMANCE ---
+PERF_REPORT_RE = {
+    "cycles": re.compile(r"^Total Cycles \(MCYCLE\)\s*:\s*(\d+)"),
+    "instret": re.compile(r"^Retired Instructions\s*:\s*(\d+)"),
+    "ipc": re.compile(r"^IPC \(Instructions/Cycle\)\s*:\s*([0-9.]+)"),
+    "branches": re.compile(r"^Total Conditional Branches\s*:\s*(\d+)"),
+    "mispredicts": re.compile(r"^Total Mispredictions\s*:\s*(\d+)"),
+    "mispredict_rate": re.compile(r"^Misprediction Rate\s*:\s*([0-9.]+)"),
+    "load_use_cycles": re.compile(r"^Load-Use Stall Cycles\s*:\s*(\d+)"),
+    "mul_busy_cycles": re.compile(r"^MUL Busy Cycles\s*:\s*(\d+)"),
+    "div_busy_cycles": re.compile(r"^DIV Busy Cycles\s*:\s*(\d+)"),
+    "mac_busy_cycles": re.compile(r"^MAC Busy Cycles\s*:\s*(\d+)"),
+    "flush_cycles": re.compile(r"^Flush Cycles\s*:\s*(\d+)"),
+    "btb_misses": re.compile(r"^BTB Misses\s*:\s*(\d+)"),
+    "store_forwards": re.compile(r"^Store-to-Load Forwards\s*:\s*(\d+)"),
+}
+
+def parse_perf_report(rtl_log_path: str) -> dict:
+    """Metrics from the SIMULATION REPORT that core_top_tb.sv appends to rtl.log."""
+    metrics = {}
+    try:
+        with open(rtl_log_path, 'r') as f:
+            for line in f:
+                if ";" in line:
+                    continue
+                for name, regex in PERF_REPORT_RE.items():
+                    match = regex.match(line.strip())
+                    if match:
+                        value = match.group(1)
+                        metrics[name] = float(value) if "." in value else int(value)
+    except FileNotFoundError:
+        pass
+    return metrics
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def results_path() -> str:
+    return os.path.join(sim_config.WORK_DIR, "results.jsonl") # Un record JSON per test e per run, con la revisione git
+
+def write_results(results: List[dict], simulator: str) -> None:
+    revision, timestamp = git_revision(), time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(results_path(), 'a') as f:
+        for result in results:
+            f.write(json.dumps({"revision": revision, "timestamp": timestamp, "simulator": simulator, **result}, sort_keys=True) + "\n")
+
+def load_baseline() -> dict:
+    try:
+        with open(sim_config.BASELINE_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_baseline(results: List[dict]) -> None:
+    """Passing tests with a report replace their baseline entry; the others keep the old one."""
+    baseline = load_baseline()
+    for result in results:
+        if result["status"] == "PASSED" and "cycles" in result:
+            baseline[result["test"]] = {k: result[k] for k in PERF_REPORT_RE if k in result}
+    with open(sim_config.BASELINE_PATH, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    print(f"Performance baseline saved to {sim_config.BASELINE_PATH}")
+
+def perf_regressions(results: List[dict], baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for result in sorted(results, key=lambda r: r["test"]):
+        base = baseline.get(result["test"])
+        if not base or "cycles" not in result:
+            continue
+        if base.get("cycles") and result["cycles"] > base["cycles"] * (1 + threshold / 100):
+            delta = 100.0 * (result["cycles"] - base["cycles"]) / base["cycles"]
+            regressions.append(f"{result['test']}: cycles {base['cycles']} -> {result['cycles']} (+{delta:.2f}%)")
+        if base.get("ipc") and "ipc" in result and result["ipc"] < base["ipc"] * (1 - threshold / 100):
+            delta = 100.0 * (base["ipc"] - result["ipc"]) / base["ipc"]
+            regressions.append(f"{result['test']}: IPC {base['ipc']:.3f} -> {result['ipc']:.3f} (-{delta:.2f}%)")
+    return regressions
@@ -0,0 +1,101 @@
+"""PMU counter samples written by core_top_tb.sv (+PMU_SAMPLE) and the `pmu` subcommand that tabulates them."""
+
+import argparse
+import csv
+import os
+import struct
+from typing import List
+
+import sim_config
+import sim_images
+
+# --- CAMPIONI DEI CONTATORI PMU ---
+PMU_SAMPLE_MAGIC = 0x31534d50 # "PMS1", intestazione di pmu.smp (core_top_tb.sv)
+
+def pmu_event_names() -> List[str]:
+    """Event counters in mhpmcounter order, named after the PMU_* localparams of global.svh."""
+    params = sim_images.svh_localparams(os.path.join(sim_config.RTL_ROOT, "rtl", "include", "global.svh"))
+    events = sorted((value, name) for name, value in params.items() if name.startswith("PMU_") and name != "PMU_EVENTS")
+    return [name[len("PMU_"):].lower() for _, name in events]
+
+def read_pmu_samples(path: str) -> List[tuple]:
+    """(mcycle, minstret, events...) running totals of a pmu.smp file, 32-bit wrap-around undone."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8 or struct.unpack_from("<I", data)[0] != PMU_SAMPLE_MAGIC:
+        raise Exception(f"{path} is not a PMU sample file")
+    record = struct.Struct(f"<{struct.unpack_from('<I', data, 4)[0]}I")
+    samples, last, wraps = [], None, [0] * (record.size // 4)
+    for offset in range(8, len(data) - record.size + 1, record.size):
+        raw = record.unpack_from(data, offset)
+        if last is not None:
+            wraps = [w + (1 << 32) if r < l else w for w, r, l in zip(wraps, raw, last)]
+        samples.append(tuple(w + r for w, r in zip(wraps, raw)))
+        last = raw
+    return samples
+
+def pmu_timeline(test: str, rows: int) -> str:
+    """IPC and stalls over time from pmu.smp, in at most `rows` lines; also writes pmu.txt and pmu.csv."""
+    # Eventi in cicli come quota dei cicli, gli altri ogni 1000 istruzioni
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    path = os.path.join(work_dir, "pmu.smp")
+    if not os.path.exists(path):
+        raise Exception(f"no PMU samples for {test}, run it with --pmu-sample N")
+    samples = read_pmu_samples(path)
+    names = pmu_event_names()
+    if not samples:
+        raise Exception(f"{path} holds no samples")
+    if len(samples[0]) != len(names) + 2:
+        raise Exception(f"{path} has {len(samples[0]) - 2} event counters, global.svh defines {len(names)}")
+    points = [(0,) * len(samples[0])] + samples
+    intervals = [(a, b) for a, b in zip(points, points[1:]) if b[0] > a[0]]
+    with open(os.path.join(work_dir, "pmu.csv"), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["start_cycle", "end_cycle", "instret", "ipc"] + names)
+        for a, b in intervals:
+            delta = [y - x for x, y in zip(a, b)]
+            writer.writerow([a[0], b[0], delta[1], round(delta[1] / delta[0], 4)] + delta[2:])
+
+    labels = [name[:-len("_cycles")] + "%" if name.endswith("_cycles") else name + "/ki" for name in names]
+    widths = [max(len(label), 7) for label in labels]
+
+    def row(title, a, b):
+        cycles, instret = b[0] - a[0], b[1] - a[1]
+        ipc = instret / cycles if cycles else 0.0
+        cells = []
+        for name, width, x, y in zip(names, widths, a[2:], b[2:]):
+            if name.endswith("_cycles"):
+                cells.append(f"{100.0 * (y - x) / cycles if cycles else 0.0:>{width}.1f}")
+            else:
+                cells.append(f"{1000.0 * (y - x) / instret if instret else 0.0:>{width}.2f}")
+        return f"{title:<23} {ipc:>6.3f} {'#' * round(min(ipc, 1.0) * 10):<10} {' '.join(cells)}"
+
+    step = -(-len(intervals) // max(rows, 1))
+    lines = [f"PMU timeline of {test}: {len(samples)} samples, {samples[-1][0]} cycles, {samples[-1][1]} instructions",
+             f"{'cycles':<23} {'IPC':>6} {'':<10} {' '.join(f'{label:>{width}}' for label, width in zip(labels, widths))}"]
+    for i in range(0, len(intervals), step):
+        a, b = intervals[i][0], intervals[min(i + step, len(intervals)) - 1][1]
+        lines.append(row(f"{a[0]}-{b[0]}", a, b))
+    lines.append(row("total", points[0], points[-1]))
+    report = "\n".join(lines)
+    with open(os.path.join(work_dir, "pmu.txt"), 'w') as f:
+        f.write(report + "\n")
+    return report
+
+def pmu_main(argv: List[str]) -> int:
+    """`pmu`: IPC and stall breakdown over time of tests that ran with --pmu-sample."""
+    parser = argparse.ArgumentParser(prog="sim_manager.py pmu", description="Time series of the PMU counters sampled during a run")
+    parser.add_argument("tests", nargs="+", help="Tests to report (as run, e.g. c.helloworld)")
+    parser.add_argument("--work-dir", default=sim_config.WORK_DIR, help="Work directory of the run")
+    parser.add_argument("--rows", type=int, default=sim_config.PMU_TIMELINE_ROWS, help="Maximum number of intervals per table")
+    args = parser.parse_args(argv)
+    sim_config.WORK_DIR = args.work_dir
+    status = 0
+    for test in args.tests:
+        try:
+            print(pmu_timeline(test, args.rows))
+            print(f"Every sampled interval written to {os.path.join(sim_config.WORK_DIR, test, 'pmu.csv')}\n")
+        except Exception as e:
+            print(f"Error reporting {test}: {e}")
+            status = 1
+    return status
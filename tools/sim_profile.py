@@ -0,0 +1,161 @@
+"""`profile` subcommand: time spent per function and per basic block from the cycle stamps of rtl.log."""
+
+import argparse
+import bisect
+import os
+from typing import List
+from elftools.elf.elffile import ELFFile
+
+import commit_trace
+import rv_model
+import sim_compare
+import sim_config
+
+# --- PROFILO DEL PROGRAMMA ---
+def elf_functions(elf_path: str) -> List[tuple]:
+    """Sorted (address, name) of the code symbols: functions, plus global labels such as _start of asm tests."""
+    functions = {}
+    with open(elf_path, 'rb') as f:
+        elf = ELFFile(f)
+        symtab = elf.get_section_by_name(".symtab")
+        if symtab is None:
+            return []
+        for sym in symtab.iter_symbols():
+            shndx = sym["st_shndx"]
+            if not sym.name or not isinstance(shndx, int):
+                continue
+            if not elf.get_section(shndx)["sh_flags"] & 0x4: # SHF_EXECINSTR
+                continue
+            is_func = sym["st_info"]["type"] == "STT_FUNC"
+            if is_func or (sym["st_info"]["type"] == "STT_NOTYPE" and sym["st_info"]["bind"] in ("STB_GLOBAL", "STB_WEAK")):
+                if is_func or sym["st_value"] not in functions:
+                    functions[sym["st_value"]] = sym.name
+    return sorted(functions.items())
+
+def profile_events(test: str):
+    """(cycle, pc, instr) of every retired event of the last run, from rtl.trc/rtl.cyc or rtl.log."""
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    trace_path = os.path.join(work_dir, "rtl.trc")
+    if os.path.exists(trace_path):
+        with open(trace_path, 'rb') as f, open(commit_trace.cycles_path(trace_path), 'rb') as fc:
+            records, cycles = f.read(), fc.read()
+        for (pc, instr, _, _, _), (cycle,) in zip(commit_trace.RECORD.iter_unpack(records), commit_trace.CYCLE.iter_unpack(cycles)):
+            yield cycle, pc, instr
+        return
+    for line in sim_compare.rtl_log_lines(test):
+        parts = line.split(";")
+        if len(parts) >= 4 and parts[3].strip():
+            yield int(parts[0]), int(parts[1], 16), int(parts[2], 16)
+
+def profile_mispredicts(test: str) -> dict:
+    """pc -> mispredictions, from the annotations core_top_tb.sv writes to rtl.log in both trace formats."""
+    counts = {}
+    with open(os.path.join(sim_config.WORK_DIR, test, "rtl.log"), 'r') as f:
+        for line in f:
+            if line.rstrip().endswith(";;mispredict"):
+                pc = int(line.split(";")[1], 16)
+                counts[pc] = counts.get(pc, 0) + 1
+    return counts
+
+def is_control_transfer(instr: int) -> bool:
+    return instr & 0x7f in (0x63, 0x6f, 0x67)
+
+def profile_test(test: str, top: int) -> str:
+    """Per-function and per-basic-block report of one run; also writes profile.txt and profile.folded."""
+    # I cicli di un evento sono quelli trascorsi dal precedente, gli stalli quelli oltre il primo
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    functions = elf_functions(os.path.join(work_dir, "test.elf"))
+    addresses = [addr for addr, _ in functions]
+    def function_of(pc):
+        i = bisect.bisect_right(addresses, pc) - 1
+        return functions[i] if i >= 0 else (0, f"0x{pc:08x}")
+
+    per_pc, leaders, folded = {}, set(), {}
+    stack, pending, prev_cycle, prev_instr = [], None, 0, None
+    for cycle, pc, instr in profile_events(test):
+        cycles = cycle - prev_cycle
+        prev_cycle = cycle
+        entry = per_pc.setdefault(pc, [instr, 0, 0, 0]) # instr, eventi, cicli, stall
+        entry[1] += 1
+        entry[2] += cycles
+        entry[3] += max(0, cycles - 1)
+        if prev_instr is None or is_control_transfer(prev_instr):
+            leaders.add(pc)
+        # Stack ricostruito dal trace: jal/jalr con rd=ra chiamano, jalr x0, 0(ra) ritorna
+        name = function_of(pc)[1]
+        if pending == "call":
+            stack.append(name)
+        elif pending == "ret" and len(stack) > 1:
+            stack.pop()
+        if not stack:
+            stack.append(name)
+        stack[-1] = name
+        key = ";".join(stack)
+        folded[key] = folded.get(key, 0) + cycles
+        opcode, rd, rs1 = instr & 0x7f, (instr >> 7) & 0x1f, (instr >> 15) & 0x1f
+        pending = "call" if opcode in (0x6f, 0x67) and rd == 1 else "ret" if opcode == 0x67 and rd == 0 and rs1 == 1 else None
+        prev_instr = instr
+    if not per_pc:
+        raise Exception(f"no retired instructions in the trace of {test}, run it first")
+    mispredicts = profile_mispredicts(test)
+    leaders.update(addr for addr in addresses if addr in per_pc)
+    leaders = sorted(leaders)
+    total_cycles = prev_cycle
+
+    def add(table, key, pc, entry):
+        row = table.setdefault(key, [0, 0, 0, 0])
+        row[0] += entry[1]
+        row[1] += entry[2]
+        row[2] += entry[3]
+        row[3] += mispredicts.get(pc, 0)
+    by_function, by_block = {}, {}
+    for pc, entry in per_pc.items():
+        base, name = function_of(pc)
+        add(by_function, name, pc, entry)
+        leader = leaders[bisect.bisect_right(leaders, pc) - 1]
+        if leader < base:
+            leader = base # Un blocco non attraversa l'inizio di una funzione
+        lbase, lname = function_of(leader)
+        add(by_block, f"{lname}+0x{leader - lbase:x}", pc, entry)
+
+    def table(title, rows):
+        lines = [f"\n{title}", f"{'':<32} {'instr':>9} {'cycles':>10} {'%cyc':>6} {'CPI':>6} {'stalls':>9} {'mispred':>7}"]
+        for name, (count, cycles, stalls, mispred) in sorted(rows.items(), key=lambda r: -r[1][1])[:top]:
+            share = 100.0 * cycles / total_cycles if total_cycles else 0.0
+            lines.append(f"{name[:32]:<32} {count:>9} {cycles:>10} {share:>5.1f}% {cycles / count:>6.2f} {stalls:>9} {mispred:>7}")
+        return lines
+
+    lines = [f"Profile of {test}: {sum(e[1] for e in per_pc.values())} retired events, {total_cycles} cycles, "
+             f"{sum(mispredicts.values())} mispredictions"]
+    lines += table("Functions", by_function)
+    lines += table("Basic blocks", by_block)
+    lines += ["\nInstructions with the most stall cycles", f"{'pc':<10} {'instruction':<30} {'count':>9} {'stalls':>9} {'mispred':>7}"]
+    for pc, (instr, count, _, stalls) in sorted(per_pc.items(), key=lambda r: -r[1][3])[:top]:
+        mnemonic = rv_model.decode(pc, instr)[5]
+        lines.append(f"{pc:08x}   {mnemonic[:30]:<30} {count:>9} {stalls:>9} {mispredicts.get(pc, 0):>7}")
+    report = "\n".join(lines)
+    with open(os.path.join(work_dir, "profile.txt"), 'w') as f:
+        f.write(report + "\n")
+    with open(os.path.join(work_dir, "profile.folded"), 'w') as f:
+        for stack_key, cycles in sorted(folded.items()):
+            if cycles:
+                f.write(f"{stack_key} {cycles}\n")
+    return report
+
+def profile_main(argv: List[str]) -> int:
+    """`profile`: hotspot report of tests that already ran, from their RTL trace and ELF symbols."""
+    parser = argparse.ArgumentParser(prog="sim_manager.py profile", description="Per-function and per-basic-block profile of simulated programs")
+    parser.add_argument("tests", nargs="+", help="Tests to profile (as run, e.g. c.helloworld)")
+    parser.add_argument("--work-dir", default=sim_config.WORK_DIR, help="Work directory of the run")
+    parser.add_argument("--top", type=int, default=20, help="Rows per table")
+    args = parser.parse_args(argv)
+    sim_config.WORK_DIR = args.work_dir
+    status = 0
+    for test in args.tests:
+        try:
+            print(profile_test(test, args.top))
+            print(f"Folded stacks written to {os.path.join(sim_config.WORK_DIR, test, 'profile.folded')} (flamegraph.pl, speedscope)\n")
+        except Exception as e:
+            print(f"Error profiling {test}: {e}")
+            status = 1
+    return status
@@ -0,0 +1,331 @@
+"""Simulation models (Verilator, XSim) shared per RTL revision, their plusargs, watchdog and timeouts."""
+
+import fcntl
+import hashlib
+import os
+import re
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+import commit_trace
+import sim_compare
+import sim_config
+from sim_config import vprint
+import sim_frontend
+import sim_sched
+import sim_server
+import sim_timing
+
+CYCLE_BUDGET_SLACK = 10000 # Reset, riempimento della pipeline e test di poche istruzioni
+SIM_KILL_GRACE = 5.0 # Secondi tra SIGTERM e SIGKILL
+SIM_TIMEOUTS = {} # test -> motivo, per le simulazioni uccise dal timeout wall-clock
+CLK_PERIOD_PS = 10000 # always #5 clk con `timescale 1ns/1ps in core_top_tb.sv
+RESET_CYCLES = 10 # Cicli di reset prima che cycle_count inizi a contare
+
+def model_sources() -> List[str]:
+    """Files the compiled simulation model depends on: the flist, every file it lists and the C++ harness."""
+    flist_path = os.path.join(sim_config.RTL_ROOT, "rtl", "core_top.flist")
+    sources = [flist_path]
+    with open(flist_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                sources.append(line.replace("$PROJ", sim_config.RTL_ROOT))
+    sources.append(os.path.join(sim_config.RTL_ROOT, "dv", "verilator", "core_top_tb.cpp"))
+    return sources
+
+def model_hash(simulator: str, build_cmd: str) -> str:
+    h = hashlib.sha256()
+    h.update(f"{simulator}\0{build_cmd}\0".encode())
+    for src in model_sources():
+        h.update(os.path.relpath(src, sim_config.RTL_ROOT).encode() + b"\0")
+        with open(src, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def build_model(simulator: str, build_cmd: str) -> str:
+    """Build the simulation model once per RTL revision and return its directory."""
+    # Chiamanti concorrenti (thread o altri processi) attendono il lock e riusano il modello; {jobs} = token presi in prestito
+    model_dir = os.path.abspath(os.path.join(sim_config.MODEL_DIR, f"{simulator}_{model_hash(simulator, build_cmd)}"))
+    os.makedirs(model_dir, exist_ok=True)
+    done_marker = os.path.join(model_dir, ".built")
+    build_log_path = os.path.join(model_dir, "build.log")
+    with open(os.path.join(model_dir, ".lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(done_marker):
+            return model_dir
+        jobs = 1 + sim_sched.JOB_TOKENS.try_acquire(sim_sched.JOB_TOKENS.total - 1)
+        vprint(f"Building shared {simulator} model in {model_dir} with {jobs} jobs")
+        try:
+            with open(build_log_path, 'w') as build_log:
+                with sim_timing.stage(None, f"build_{simulator}_model"):
+                    returncode = sim_timing.run_measured(f"export PROJ={shlex.quote(os.path.abspath(sim_config.RTL_ROOT))} && cd {model_dir} && {build_cmd.format(jobs=jobs)}", shell=True,
+                                              stdout=build_log, stderr=subprocess.STDOUT, **sim_sched.child_limits())
+        finally:
+            sim_sched.JOB_TOKENS.release(jobs - 1)
+        if returncode != 0:
+            raise Exception(f"{simulator} model build failed, see {build_log_path}")
+        open(done_marker, 'w').close()
+    return model_dir
+
+def verilator_build_flags():
+    """(verilator options, make variables) for the thread count, build profile and ccache."""
+    flags = f"--threads {sim_config.SIM_THREADS} " if sim_config.SIM_THREADS > 1 else ""
+    make_vars = []
+    if sim_config.BUILD_PROFILE == "fast":
+        flags += "-O3 --x-assign fast --x-initial fast "
+        make_vars.append("OPT_FAST=-O3")
+    if sim_config.USE_CCACHE:
+        make_vars.append("OBJCACHE=ccache")
+    if make_vars:
+        flags += f"-MAKEFLAGS '{' '.join(make_vars)}' "
+    # Percorsi relativi alla directory del modello: i modelli di revisioni diverse condividono gli oggetti invariati
+    env = "export CCACHE_BASEDIR=$PWD CCACHE_NOHASHDIR=1 && " if sim_config.USE_CCACHE else ""
+    return flags, "".join(f" {var}" for var in make_vars), env
+
+def verilator_trace_flags(trace_format: str) -> str:
+    return {"off": "", "vcd": "--trace --trace-structs ", "fst": "--trace-fst --trace-structs "}[trace_format]
+
+def build_verilator_model(trace_format: Optional[str] = None) -> str:
+    """Models with and without tracing are distinct builds, each cached by its own hash."""
+    trace_format = trace_format or sim_config.TRACE_FORMAT
+    flags, make_vars, env = verilator_build_flags()
+    build_cmd = (
+        f"{env}verilator --cc {verilator_trace_flags(trace_format)}{flags}--build -j {{jobs}} --timing "
+        f"--top-module core_top_tb --exe $PROJ/dv/verilator/core_top_tb.cpp "
+        f"-f $PROJ/rtl/core_top.flist "
+        f"-DSTACK_POINTER_INIT_VALUE=32\\'h{sim_config.STACK_POINTER_INIT_VALUE:x}"
+        f" && make -j {{jobs}} -C obj_dir -f Vcore_top_tb.mk Vcore_top_tb{make_vars}"
+    )
+    return os.path.join(build_model("verilator", build_cmd), "obj_dir", "Vcore_top_tb")
+
+def build_xsim_model(trace_format: Optional[str] = None) -> str:
+    trace_format = trace_format or sim_config.TRACE_FORMAT
+    build_cmd = (
+        f"xvlog -sv -f $PROJ/rtl/core_top.flist "
+        f"--define STACK_POINTER_INIT_VALUE=32\\'h{sim_config.STACK_POINTER_INIT_VALUE:x}"
+        f" && xelab -top core_top_tb -snapshot sim{' --debug wave' if trace_format != 'off' else ''}"
+    )
+    return os.path.join(build_model("xsim", build_cmd), "xsim.dir")
+
+def image_plusargs(work_dir: str, reset_vector: int) -> List[str]:
+    """Runtime image selection for the shared model (read by mem_lib.sv and core_top_tb.sv)."""
+    dmem_path = os.path.join(work_dir, "dmem.hex")
+    plusargs = [f"ICCM_INIT_FILE={os.path.abspath(os.path.join(work_dir, 'imem.hex'))}"]
+    if os.path.exists(dmem_path):
+        plusargs.append(f"DCCM_INIT_FILE={os.path.abspath(dmem_path)}")
+    plusargs.append(f"RESET_VECTOR={reset_vector:x}")
+    return plusargs
+
+def cycle_to_time_ps(cycle: int) -> int:
+    return (RESET_CYCLES + cycle) * CLK_PERIOD_PS
+
+def commit_trace_plusargs() -> List[str]:
+    return ["COMMIT_TRACE"] if sim_config.COMMIT_TRACE == "binary" else []
+
+def iss_trace_name() -> str:
+    return "iss.trc" if sim_config.COMMIT_TRACE == "binary" else "iss.log"
+
+def iss_instruction_count(test: str) -> Optional[int]:
+    """Instructions in the reference trace (binary records leave out the few with no effect, e.g. nop)."""
+    path = os.path.join(sim_config.WORK_DIR, test, iss_trace_name())
+    if not os.path.exists(path):
+        return None
+    if sim_config.COMMIT_TRACE == "binary":
+        return commit_trace.record_count(path)
+    with open(path, 'rb') as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+def watchdog_limits(test: str) -> tuple:
+    """(cycle budget from the ISS instruction count, no-retire limit), 0 = off, enforced by core_top_tb.sv."""
+    count = iss_instruction_count(test)
+    max_cycles = min(int(count * sim_config.CPI_BOUND) + CYCLE_BUDGET_SLACK, 0xffffffff) if sim_config.CPI_BOUND and count is not None else 0
+    return max_cycles, sim_config.HANG_CYCLES
+
+def watchdog_plusargs(test: str) -> List[str]:
+    max_cycles, hang_cycles = watchdog_limits(test)
+    plusargs = []
+    if max_cycles:
+        plusargs.append(f"MAX_CYCLES={max_cycles}")
+    if hang_cycles:
+        plusargs.append(f"HANG_CYCLES={hang_cycles}")
+    return plusargs
+
+def pmu_plusargs() -> List[str]:
+    return [f"PMU_SAMPLE={sim_config.PMU_SAMPLE}"] if sim_config.PMU_SAMPLE else []
+
+def sim_plusargs(test: str) -> List[str]:
+    return commit_trace_plusargs() + watchdog_plusargs(test) + pmu_plusargs()
+
+def trace_plusargs(trace_format: str, window: Optional[tuple], exit_after: bool = False) -> List[str]:
+    """Plusargs read by core_top_tb.cpp: dump only inside [waves_start, waves_end] (simulation time)."""
+    if trace_format == "off":
+        return []
+    if window is None:
+        return ["waves_start=0"]
+    plusargs = [f"waves_start={cycle_to_time_ps(window[0])}", f"waves_end={cycle_to_time_ps(window[1])}"]
+    if exit_after:
+        plusargs.append("waves_exit")
+    return plusargs
+
+def xsim_run_args(run_dir: str, trace_format: str, window: Optional[tuple], exit_after: bool = False) -> str:
+    """XSim logs waves through a Tcl batch; a window is a run up to its start followed by log_wave."""
+    if trace_format == "off":
+        return "--runall"
+    if window is None:
+        tcl = "log_wave -recursive *\nrun all\nexit\n"
+    else:
+        start_ns, end_ns = cycle_to_time_ps(window[0]) // 1000, cycle_to_time_ps(window[1]) // 1000
+        tcl = f"run {start_ns} ns\nlog_wave -recursive *\nrun {end_ns - start_ns} ns\n" + ("exit\n" if exit_after else "run all\nexit\n")
+    with open(os.path.join(run_dir, "wave.tcl"), 'w') as f:
+        f.write(tcl)
+    return "-tclbatch wave.tcl --wdb core_top.wdb"
+
+def run_sim_cmd(test: str, cmd: str, simulator: str, append: bool = False, lockstep: bool = False) -> None:
+    sim_log_path = os.path.join(sim_config.WORK_DIR, test, 'sim.log')
+    rtl_log_path = os.path.join(sim_config.WORK_DIR, test, 'rtl.log')
+    if lockstep:
+        for path in (rtl_log_path, rtl_log_path[:-4] + ".trc", rtl_log_path[:-4] + ".cyc", os.path.join(sim_config.WORK_DIR, test, "pmu.smp")):
+            if os.path.exists(path):
+                os.remove(path) # Non leggere il log della run precedente
+    SIM_TIMEOUTS.pop(test, None)
+    sim_compare.LOCKSTEP_TESTS.discard(test)
+    with open(sim_log_path, 'a' if append else 'w') as sim_log, sim_timing.stage(test, "sim" if lockstep else "build"):
+        process = subprocess.Popen(cmd, shell=True, stdout=sim_log, stderr=subprocess.STDOUT, **sim_sched.child_limits(), start_new_session=True)
+        timer = None
+        if lockstep and sim_config.SIM_TIMEOUT:
+            timer = threading.Timer(sim_config.SIM_TIMEOUT, kill_on_timeout, (test, process))
+            timer.daemon = True
+            timer.start()
+        try:
+            if lockstep and sim_config.LOCKSTEP and sim_config.COMMIT_TRACE == "text":
+                sim_compare.LOCKSTEP_TESTS.add(test)
+                divergence = sim_compare.lockstep_monitor(test, process)
+                if divergence is not None:
+                    sim_log.write(f"\n--- Simulation aborted: RTL diverged from ISS at event {divergence} ---\n")
+            exit_code = sim_timing.reap(process)
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if test in SIM_TIMEOUTS:
+            sim_log.write(f"\n--- Simulation killed: {SIM_TIMEOUTS[test]} ---\n")
+        if exit_code != 0:
+            vprint(f"Error: {simulator} returned exit code {exit_code}")
+
+def kill_on_timeout(test: str, process: subprocess.Popen) -> None:
+    """Timer callback: SIGTERM to the simulator's process group, then SIGKILL after a grace period."""
+    SIM_TIMEOUTS[test] = f"wall-clock timeout of {sim_config.SIM_TIMEOUT:g} s"
+    vprint(f"{test}: simulation exceeded {sim_config.SIM_TIMEOUT:g} s, stopping it")
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        if process.returncode is not None:
+            return
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        time.sleep(SIM_KILL_GRACE)
+
+TIMEOUT_RE = re.compile(r"^TIMEOUT: (.*), last retired pc 0x([0-9a-fA-F]+)")
+
+def log_tail(path: str, size: int = 65536) -> List[str]:
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - size))
+            return f.read().decode(errors='replace').splitlines()
+    except FileNotFoundError:
+        return []
+
+def last_retired_pc(test: str) -> Optional[int]:
+    """PC of the last event in the RTL trace of a simulation that was stopped."""
+    if sim_config.COMMIT_TRACE == "binary":
+        path = os.path.join(sim_config.WORK_DIR, test, "rtl.trc")
+        count = commit_trace.record_count(path) if os.path.exists(path) else 0
+        if not count:
+            return None
+        with open(path, 'rb') as f:
+            f.seek((count - 1) * commit_trace.RECORD.size)
+            return commit_trace.RECORD.unpack(f.read(commit_trace.RECORD.size))[0]
+    for line in reversed(log_tail(os.path.join(sim_config.WORK_DIR, test, "rtl.log"))):
+        parts = line.split(";")
+        if len(parts) >= 4 and parts[3].strip():
+            try:
+                return int(parts[1], 16)
+            except ValueError:
+                continue
+    return None
+
+def sim_timeout(test: str) -> Optional[dict]:
+    """Timeout of the last simulation: testbench watchdog or wall-clock kill."""
+    reason, pc = SIM_TIMEOUTS.pop(test, None), None
+    if reason is None:
+        for line in log_tail(os.path.join(sim_config.WORK_DIR, test, "rtl.log")):
+            match = TIMEOUT_RE.match(line.strip())
+            if match:
+                reason, pc = match.group(1), int(match.group(2), 16)
+        if reason is None:
+            return None
+    if pc is None:
+        pc = last_retired_pc(test)
+    return {"timeout": reason, "last_pc": None if pc is None else f"0x{pc:08x}"}
+
+def run_verilator(test: str) -> None:
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    reset_vector = sim_frontend.load_base(test)
+    if sim_config.BUILD_MODE == "shared" and sim_config.SIM_SERVER and sim_config.TRACE_FORMAT == "off" and not re.search(r"\s", os.path.abspath(work_dir)):
+        sim_server.run_server_job(test)
+        return
+    if sim_config.BUILD_MODE == "shared":
+        binary = build_verilator_model()
+        plusargs = " ".join(f"+{arg}" for arg in image_plusargs(work_dir, reset_vector) + trace_plusargs(sim_config.TRACE_FORMAT, sim_config.TRACE_WINDOW) + sim_plusargs(test))
+        run_sim_cmd(test, f"cd {work_dir} && {binary} {plusargs}", "Verilator", lockstep=True)
+        return
+    imem_path = os.path.join(work_dir, "imem.hex")
+    imem_abs_path = os.path.abspath(imem_path)
+    flags, make_vars, env = verilator_build_flags()
+    verilator_cmd = (
+        f"export PROJ={shlex.quote(os.path.abspath(sim_config.RTL_ROOT))} && "
+        f"cd {work_dir} && {env}"
+        f"verilator --cc {verilator_trace_flags(sim_config.TRACE_FORMAT)}{flags}--build -j {{jobs}} --timing "
+        f"--top-module core_top_tb --exe $PROJ/dv/verilator/core_top_tb.cpp "
+        f"-f $PROJ/rtl/core_top.flist "
+        f"-DICCM_INIT_FILE='\"{imem_abs_path}\"' "
+        f"-DRESET_VECTOR=32\\'h{reset_vector:x} -DSTACK_POINTER_INIT_VALUE=32\\'h{sim_config.STACK_POINTER_INIT_VALUE:x}"
+    )
+    dmem_path = os.path.join(work_dir, "dmem.hex")
+    if os.path.exists(dmem_path):
+        dmem_abs_path = os.path.abspath(dmem_path)
+        verilator_cmd += f" -DDCCM_INIT_FILE='\"{dmem_abs_path}\"'"
+    else:
+        verilator_cmd += f" -DDCCM_INIT_FILE='\"\"'"
+    verilator_cmd += f" && make -j {{jobs}} -C obj_dir -f Vcore_top_tb.mk Vcore_top_tb{make_vars}"
+    extra_jobs = sim_sched.JOB_TOKENS.try_acquire(sim_sched.JOB_TOKENS.total - 1)
+    try:
+        run_sim_cmd(test, verilator_cmd.format(jobs=1 + extra_jobs), "Verilator")
+    finally:
+        sim_sched.JOB_TOKENS.release(extra_jobs)
+    plusargs = " ".join(f"+{arg}" for arg in trace_plusargs(sim_config.TRACE_FORMAT, sim_config.TRACE_WINDOW) + sim_plusargs(test))
+    run_sim_cmd(test, f"cd {work_dir} && ./obj_dir/Vcore_top_tb {plusargs}", "Verilator", append=True, lockstep=True)
+
+def run_xsim(test: str) -> None:
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    reset_vector = sim_frontend.load_base(test)
+    if sim_config.BUILD_MODE == "shared":
+        xsim_dir = build_xsim_model()
+        plusargs = " ".join(f"-testplusarg {arg}" for arg in image_plusargs(work_dir, reset_vector) + sim_plusargs(test))
+        run_args = xsim_run_args(work_dir, sim_config.TRACE_FORMAT, sim_config.TRACE_WINDOW)
+        run_sim_cmd(test, f"cd {work_dir} && xsim sim --xsimdir {xsim_dir} {run_args} {plusargs}", "XSim", lockstep=True)
+        return
+    has_dmem = os.path.exists(os.path.join(work_dir, "dmem.hex"))
+    xsim_cmd = f"export PROJ={shlex.quote(os.path.abspath(sim_config.RTL_ROOT))} && cd {work_dir} && xvlog -sv -f $PROJ/rtl/core_top.flist --define ICCM_INIT_FILE='\"imem.hex\"' --define RESET_VECTOR=32\\'h{reset_vector:x} --define STACK_POINTER_INIT_VALUE=32\\'h{sim_config.STACK_POINTER_INIT_VALUE:x}"
+    if has_dmem:
+        xsim_cmd += f" --define DCCM_INIT_FILE='\"dmem.hex\"'"
+    else:
+        xsim_cmd += f" --define DCCM_INIT_FILE='\"\"'"
+    debug_flag = " --debug wave" if sim_config.TRACE_FORMAT != "off" else ""
+    xsim_cmd += f" && xelab -top core_top_tb -snapshot sim{debug_flag} && xsim sim {xsim_run_args(work_dir, sim_config.TRACE_FORMAT, sim_config.TRACE_WINDOW)}"
+    xsim_cmd += "".join(f" -testplusarg {arg}" for arg in sim_plusargs(test))
+    run_sim_cmd(test, xsim_cmd, "XSim", lockstep=True)
@@ -0,0 +1,82 @@
+"""Job budget shared by the parallel tests and the builds, and the recorded test durations used to order them."""
+
+import json
+import multiprocessing
+import os
+import resource
+import threading
+from typing import List
+
+import sim_config
+
+# --- SCHEDULER ---
+LONG_TEST_SECONDS = 60.0 # Sopra questa durata attesa una simulazione beneficia di più thread
+MAX_SIM_THREADS = 4
+
+class JobTokens:
+    """Job budget shared by the parallel tests and the builds."""
+    # Ogni test in corso tiene un token, le build prendono in prestito quelli liberi per make -j
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self.free = self.total
+        self.cond = threading.Condition()
+
+    def acquire(self, n: int = 1) -> None:
+        with self.cond:
+            while self.free < n:
+                self.cond.wait()
+            self.free -= n
+
+    def try_acquire(self, n: int) -> int:
+        """Take up to n tokens without blocking, return how many were taken."""
+        with self.cond:
+            taken = max(0, min(n, self.free))
+            self.free -= taken
+            return taken
+
+    def release(self, n: int = 1) -> None:
+        with self.cond:
+            self.free += n
+            self.cond.notify_all()
+
+JOB_TOKENS = JobTokens(multiprocessing.cpu_count())
+
+def child_limits() -> dict:
+    """Popen arguments applying --mem-limit to the build and simulation processes."""
+    # preexec_fn non è sicuro con altri thread attivi: solo se il limite è impostato
+    if not sim_config.MEM_LIMIT_BYTES:
+        return {}
+    return {"preexec_fn": lambda: resource.setrlimit(resource.RLIMIT_AS, (sim_config.MEM_LIMIT_BYTES, sim_config.MEM_LIMIT_BYTES))}
+
+def load_durations() -> dict:
+    try:
+        with open(sim_config.DURATIONS_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_durations(durations: dict) -> None:
+    merged = load_durations()
+    merged.update(durations)
+    tmp_path = f"{sim_config.DURATIONS_PATH}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(merged, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, sim_config.DURATIONS_PATH)
+
+def order_longest_first(tests: List[str], durations: dict) -> List[str]:
+    """Longest recorded duration first; tests never seen before go first since they may be the long ones."""
+    unknown = float('inf')
+    return sorted(tests, key=lambda t: -durations.get(t, unknown))
+
+def sim_tokens(simulator: str) -> int:
+    return min(sim_config.SIM_THREADS, JOB_TOKENS.total) if simulator == "verilator" else 1
+
+def auto_threads(tests: List[str], durations: dict) -> int:
+    """--threads auto: one single-threaded simulation per CPU, unless few long tests can use more threads."""
+    # Test C mai misurati contano come lunghi
+    cpus = JOB_TOKENS.total
+    concurrent = min(len(tests), cpus)
+    expected = max((durations.get(t, LONG_TEST_SECONDS if t.startswith("c.") else 0.0) for t in tests), default=0.0)
+    if concurrent >= cpus or expected < LONG_TEST_SECONDS:
+        return 1
+    return max(1, min(MAX_SIM_THREADS, cpus // concurrent))
@@ -0,0 +1,132 @@
+"""--server: Verilator models kept running between tests and fed through Unix sockets (+SIM_SERVER)."""
+
+import contextlib
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+import sim_config
+import sim_frontend
+import sim_images
+import sim_rtl
+import sim_sched
+import sim_timing
+
+# --- SERVER DI SIMULAZIONE ---
+SERVER_DIR = os.path.join("work", ".servers") # Log dei processi server
+SERVER_START_TIMEOUT = 30.0
+
+class SimServer:
+    """Verilator model kept running between tests: each job reloads the memories and resets the core."""
+    def __init__(self, binary: str):
+        os.makedirs(SERVER_DIR, exist_ok=True)
+        self.binary = binary
+        self.sock_dir = tempfile.mkdtemp(prefix="sim-server-") # sun_path è limitato a ~108 caratteri
+        self.path = os.path.join(self.sock_dir, "sock")
+        self.log = open(os.path.join(SERVER_DIR, f"{os.getpid()}.{os.path.basename(self.sock_dir)}.log"), 'w')
+        self.process = subprocess.Popen([os.path.abspath(binary), f"+SIM_SERVER={self.path}"], cwd=SERVER_DIR, stdout=self.log,
+                                        stderr=subprocess.STDOUT, **sim_sched.child_limits(), start_new_session=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                self.sock.connect(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if sim_timing.reap(self.process, block=False) is not None or time.monotonic() > deadline:
+                    self.close(kill=True)
+                    raise Exception(f"simulation server did not start, see {self.log.name}")
+                time.sleep(0.05)
+        self.reader = self.sock.makefile('r')
+
+    def run(self, job_dir: str, imem: str, dmem: str, reset_vector: int, max_cycles: int, hang_cycles: int) -> Optional[List[int]]:
+        """[mcycle, minstret, branches, mispredicts] of one job, None if it exceeded SIM_TIMEOUT."""
+        request = f"RUN {job_dir} {imem} {dmem} {reset_vector:x} {max_cycles} {hang_cycles} {int(sim_config.COMMIT_TRACE == 'binary')} {sim_config.PMU_SAMPLE}\n"
+        self.sock.settimeout(sim_config.SIM_TIMEOUT or None)
+        try:
+            self.sock.sendall(request.encode())
+            reply = self.reader.readline()
+        except socket.timeout:
+            return None
+        fields = reply.split()
+        if not fields or fields[0] != "DONE":
+            raise Exception(f"simulation server: unexpected reply '{reply.strip()}', see {self.log.name}")
+        return [int(v) for v in fields[1:]]
+
+    def close(self, kill: bool = False) -> None:
+        if not kill:
+            try:
+                self.sock.sendall(b"QUIT\n")
+            except OSError:
+                kill = True
+        self.sock.close()
+        if kill:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(self.process.pid, signal.SIGKILL)
+        sim_timing.reap(self.process)
+        self.log.close()
+        shutil.rmtree(self.sock_dir, ignore_errors=True)
+
+_idle_servers = []
+_servers_lock = threading.Lock()
+
+def acquire_server(binary: str) -> SimServer:
+    with _servers_lock:
+        for i, server in enumerate(_idle_servers):
+            if server.binary == binary:
+                return _idle_servers.pop(i)
+    return SimServer(binary)
+
+def release_server(server: SimServer) -> None:
+    with _servers_lock:
+        _idle_servers.append(server)
+
+def shutdown_servers() -> None:
+    with _servers_lock:
+        servers = list(_idle_servers)
+        _idle_servers.clear()
+    for server in servers:
+        server.close()
+
+def zero_dmem_image() -> str:
+    """All-zero DCCM image for tests without data: the server always reloads both memories in full."""
+    path = os.path.join(sim_config.MODEL_DIR, f"zero_dmem_{sim_images.memory_sizes()[1]}.hex")
+    if not os.path.exists(path):
+        os.makedirs(sim_config.MODEL_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        sim_images.write_hex_words(tmp_path, bytes(sim_images.memory_sizes()[1]))
+        os.replace(tmp_path, path)
+    return path
+
+def run_server_job(test: str) -> None:
+    work_dir = os.path.join(sim_config.WORK_DIR, test)
+    binary = sim_rtl.build_verilator_model()
+    for name in ("rtl.log", "rtl.trc", "rtl.cyc", "pmu.smp"):
+        path = os.path.join(work_dir, name)
+        if os.path.exists(path):
+            os.remove(path) # Non leggere il log della run precedente
+    dmem_path = os.path.join(work_dir, "dmem.hex")
+    dmem_path = os.path.abspath(dmem_path) if os.path.exists(dmem_path) else os.path.abspath(zero_dmem_image())
+    max_cycles, hang_cycles = sim_rtl.watchdog_limits(test)
+    sim_rtl.SIM_TIMEOUTS.pop(test, None)
+    with open(os.path.join(work_dir, 'sim.log'), 'w') as sim_log, sim_timing.stage(test, "sim"):
+        server = acquire_server(binary)
+        try:
+            counters = server.run(os.path.abspath(work_dir), os.path.abspath(os.path.join(work_dir, "imem.hex")), dmem_path,
+                                  sim_frontend.load_base(test), max_cycles, hang_cycles)
+        except Exception:
+            server.close(kill=True)
+            raise
+        if counters is None:
+            server.close(kill=True)
+            sim_rtl.SIM_TIMEOUTS[test] = f"wall-clock timeout of {sim_config.SIM_TIMEOUT:g} s"
+            sim_log.write(f"--- Simulation killed: {sim_rtl.SIM_TIMEOUTS[test]} ---\n")
+        else:
+            release_server(server)
+            sim_log.write(f"Simulation server job: MCYCLE={counters[0]} MINSTRET={counters[1]} branches={counters[2]} mispredicts={counters[3]}\n")
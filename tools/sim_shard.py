@@ -0,0 +1,108 @@
+"""--shard: duration-balanced slices of a test list, and the `merge` subcommand that combines their results."""
+
+import argparse
+import hashlib
+import json
+import os
+import statistics
+from typing import List
+
+import sim_perf
+import sim_sched
+
+# --- SHARDING ---
+SHARD = None # (i, N) con --shard i/N: i risultati vanno in SHARD_RESULTS_NAME e le durate vengono aggiornate solo da merge
+SHARD_RESULTS_NAME = "shard_results.json"
+
+def parse_shard(spec: str):
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}': expected i/N with 1 <= i <= N")
+    return index, count
+
+def split_shards(tests: List[str], count: int, durations: dict):
+    """(tests per shard, estimated load): longest tests first, each to the least loaded shard."""
+    # Deterministico: a parità di durata decide il nome; i test mai misurati pesano la mediana
+    unique = sorted(set(tests))
+    known = [durations[t] for t in unique if t in durations]
+    default = statistics.median(known) if known else 1.0
+    loads, shards = [0.0] * count, [[] for _ in range(count)]
+    for test in sorted(unique, key=lambda t: (-durations.get(t, default), t)):
+        k = min(range(count), key=lambda k: (loads[k], k))
+        loads[k] += durations.get(test, default)
+        shards[k].append(test)
+    return shards, loads
+
+def tests_digest(tests: List[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(set(tests))).encode()).hexdigest()[:16]
+
+def write_shard_results(path: str, all_tests: List[str], results: List[dict], simulator: str, wall_time: float) -> None:
+    report = {"shard": SHARD[0], "shards": SHARD[1], "tests_digest": tests_digest(all_tests), "revision": sim_perf.git_revision(),
+              "simulator": simulator, "host": os.uname().nodename, "wall_time": round(wall_time, 3), "results": results}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def merge_main(argv: List[str]) -> int:
+    """`merge`: combine shard results into one pass/fail and timing report, and record the durations."""
+    parser = argparse.ArgumentParser(prog="sim_manager.py merge", description="Merge --shard results")
+    parser.add_argument("inputs", nargs="+", help=f"Shard work directories or {SHARD_RESULTS_NAME} files")
+    parser.add_argument("-o", "--output", default=os.path.join("work", "merged_results.json"), help="Merged JSON report")
+    args = parser.parse_args(argv)
+    shards = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            path = os.path.join(path, SHARD_RESULTS_NAME)
+        with open(path, 'r') as f:
+            shards.append(json.load(f))
+    shards.sort(key=lambda r: r["shard"])
+    counts = {r["shards"] for r in shards}
+    digests = {r["tests_digest"] for r in shards}
+    revisions = {r["revision"] for r in shards}
+    problems = []
+    if len(counts) > 1 or len(digests) > 1:
+        problems.append("shards come from different splits (shard count or test list differ)")
+    if len(revisions) > 1:
+        problems.append(f"shards ran different revisions: {', '.join(sorted(revisions))}")
+    seen = [r["shard"] for r in shards]
+    missing_shards = sorted(set(range(1, max(counts) + 1)) - set(seen))
+    if missing_shards:
+        problems.append(f"missing shards: {', '.join(map(str, missing_shards))}")
+    results, owner = [], {}
+    for report in shards:
+        for result in report["results"]:
+            if result["test"] in owner:
+                problems.append(f"{result['test']} ran in shards {owner[result['test']]} and {report['shard']}")
+                continue
+            owner[result["test"]] = report["shard"]
+            results.append(result)
+
+    def totals(records):
+        statuses = [r["status"] for r in records]
+        return {"tests": len(records), "passed": statuses.count("PASSED"), "failed": statuses.count("FAILED"),
+                "timeout": statuses.count("TIMEOUT"), "error": statuses.count("ERROR"), "test_time": round(sum(r.get("duration") or 0 for r in records), 3)}
+
+    lines = [f"{'shard':<7} {'host':<16} {'tests':>5} {'passed':>6} {'failed':>6} {'timeout':>7} {'error':>5} {'test time':>10} {'wall time':>10}"]
+    for report in shards:
+        t = totals(report["results"])
+        lines.append(f"{report['shard']}/{report['shards']:<5} {report['host'][:16]:<16} {t['tests']:>5} {t['passed']:>6} {t['failed']:>6} {t['timeout']:>7} "
+                     f"{t['error']:>5} {t['test_time']:>9.1f}s {report['wall_time']:>9.1f}s")
+    total = totals(results)
+    total["wall_time"] = max((r["wall_time"] for r in shards), default=0)
+    lines.append(f"{'total':<7} {'':<16} {total['tests']:>5} {total['passed']:>6} {total['failed']:>6} {total['timeout']:>7} {total['error']:>5} "
+                 f"{total['test_time']:>9.1f}s {total['wall_time']:>9.1f}s")
+    print("\n".join(lines))
+    for result in sorted(results, key=lambda r: r["test"]):
+        if result["status"] != "PASSED":
+            print(f"{result['test']} ....... {result['status']} (shard {owner[result['test']]})")
+    for problem in problems:
+        print(f"WARNING: {problem}")
+    sim_sched.save_durations({r["test"]: r["duration"] for r in results if r.get("duration") is not None})
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({"totals": total, "shards": [{k: v for k, v in r.items() if k != "results"} for r in shards],
+                   "problems": problems, "results": sorted(results, key=lambda r: r["test"])}, f, indent=1, sort_keys=True)
+    print(f"Merged report written to {args.output}")
+    return 0 if total["passed"] == total["tests"] and not problems else 1
@@ -0,0 +1,100 @@
+"""Per-stage timing of the flow, peak RSS of the child processes and the Chrome trace of a run."""
+
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+import sim_config
+
+# --- PROFILING DEGLI STADI ---
+TIMING_EVENTS = [] # Un record per stadio eseguito: test, stage, start, end, tid, rss_kb
+_timing_lock = threading.Lock()
+_timing_local = threading.local()
+
+@contextlib.contextmanager
+def stage(test: Optional[str], name: str):
+    """Time a flow stage; processes reaped inside it charge their peak RSS to it and to the enclosing ones."""
+    record = {"test": test, "stage": name, "tid": threading.get_ident(), "rss_kb": 0}
+    parent = getattr(_timing_local, "current", None)
+    _timing_local.current = record
+    record["start"] = time.monotonic()
+    try:
+        yield record
+    finally:
+        record["end"] = time.monotonic()
+        _timing_local.current = parent
+        if parent is not None:
+            parent["rss_kb"] = max(parent["rss_kb"], record["rss_kb"])
+        with _timing_lock:
+            TIMING_EVENTS.append(record)
+
+def reap(process: subprocess.Popen, block: bool = True) -> Optional[int]:
+    """Popen.wait/poll replacement based on wait4, so the child's peak RSS is not lost."""
+    if process.returncode is not None:
+        return process.returncode
+    pid, status, usage = os.wait4(process.pid, 0 if block else os.WNOHANG)
+    if pid == 0:
+        return None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    record = getattr(_timing_local, "current", None)
+    if record is not None:
+        record["rss_kb"] = max(record["rss_kb"], usage.ru_maxrss)
+    return process.returncode
+
+def run_measured(cmd, **kwargs) -> int:
+    return reap(subprocess.Popen(cmd, **kwargs))
+
+def test_timing(test: str, since: float) -> dict:
+    """Per-stage seconds and peak child RSS of the run of a test started at `since`."""
+    # Lo stesso test può girare più volte nello stesso processo (--benchmark --repeat)
+    with _timing_lock:
+        events = [e for e in TIMING_EVENTS if e["test"] == test and e["stage"] != "test" and e["start"] >= since]
+    stages = {}
+    for e in events:
+        stages[e["stage"]] = round(stages.get(e["stage"], 0.0) + e["end"] - e["start"], 3)
+    return {"stages": stages, "peak_rss_kb": max((e["rss_kb"] for e in events), default=0)}
+
+def timing_summary(results: List[dict]) -> str:
+    per_stage = {}
+    with _timing_lock:
+        events = [e for e in TIMING_EVENTS if e["stage"] != "test"]
+    for e in events:
+        per_stage.setdefault(e["stage"], []).append(e)
+    lines = ["", "--- STAGE TIMING ---", f"{'Stage':<16}{'Count':>7}{'Total (s)':>12}{'Mean (s)':>11}{'Max (s)':>10}{'Peak RSS (MB)':>15}"]
+    for name, stage_events in sorted(per_stage.items(), key=lambda kv: -sum(e["end"] - e["start"] for e in kv[1])):
+        durations = [e["end"] - e["start"] for e in stage_events]
+        lines.append(f"{name:<16}{len(durations):>7}{sum(durations):>12.2f}{statistics.mean(durations):>11.2f}{max(durations):>10.2f}{max(e['rss_kb'] for e in stage_events) / 1024:>15.1f}")
+    lines += ["", f"{'Test':<40}{'Total (s)':>10}{'Sim (s)':>9}{'Cycles/s':>12}{'Peak RSS (MB)':>15}"]
+    for result in sorted(results, key=lambda r: -(r.get("duration") or 0)):
+        sim_time = result.get("stages", {}).get("sim")
+        cps = f"{result['sim_cycles_per_s']:.0f}" if result.get("sim_cycles_per_s") else "-"
+        name = f"{result['test']} (reused)" if result.get("reused") else result['test'] # Verdetto riusato: nessuna simulazione
+        lines.append(f"{name:<40}{result.get('duration') or 0:>10.2f}{sim_time or 0:>9.2f}{cps:>12}{result.get('peak_rss_kb', 0) / 1024:>15.1f}")
+    return "\n".join(lines)
+
+def timing_trace_path() -> str:
+    return os.path.join(sim_config.WORK_DIR, "timing_trace.json")
+
+def write_chrome_trace(path: str) -> None:
+    """Chrome trace-event JSON (chrome://tracing, Perfetto): one row per worker thread."""
+    with _timing_lock:
+        events = list(TIMING_EVENTS)
+    if not events:
+        return
+    t0 = min(e["start"] for e in events)
+    tids = {}
+    for e in sorted(events, key=lambda e: e["start"]):
+        tids.setdefault(e["tid"], len(tids))
+    main_tid = threading.main_thread().ident
+    trace = [{"ph": "M", "name": "thread_name", "pid": 1, "tid": idx, "args": {"name": "main" if tid == main_tid else f"worker {idx}"}} for tid, idx in tids.items()]
+    for e in events:
+        trace.append({"name": e["test"] if e["stage"] == "test" else e["stage"], "cat": e["stage"], "ph": "X", "pid": 1, "tid": tids[e["tid"]],
+                      "ts": round((e["start"] - t0) * 1e6), "dur": round((e["end"] - e["start"]) * 1e6),
+                      "args": {"test": e["test"], "peak_rss_kb": e["rss_kb"]}})
+    with open(path, 'w') as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,160 @@
+"""Checks of the reference model against the conventions of the RTL and its testbench (python -m pytest tools)."""
+
+import random
+import struct
+
+import pytest
+
+import rv_model
+
+EOT = [0x10000e37, 0x000e0e13, 0xdeadcdb7, 0xeefd8d93, 0x01be2023] # li x28, 0x10000000; li x27, 0xdeadbeef; sw x27, 0(x28)
+EOT_LINE = "0x{:08x};0x01be2023;sw x27, 0(x28);mem[0x10000000]=0xdeadbeef"
+
+def image(words, size=4096):
+    mem = bytearray(size)
+    struct.pack_into(f"<{len(words)}I", mem, 0, *words)
+    return mem
+
+def run_program(tmp_path, words, dmem=None, binary=False):
+    """iss.log lines (or iss.trc bytes) and the final DCCM of a program loaded at address 0."""
+    dmem = bytearray(4096) if dmem is None else dmem
+    path = tmp_path / ("iss.trc" if binary else "iss.log")
+    rv_model.run(image(words + EOT), dmem, str(path), 0, 0x80000000, 1000, binary)
+    return (path.read_bytes() if binary else path.read_text().splitlines()), dmem
+
+@pytest.mark.parametrize("instr, fields", [
+    (0x00b50633, (12, 10, 11, 0, "add x12, x10, x11", False)),
+    (0x34408093, (1, 1, 0, 836, "addi x1, x1, 836", False)),
+    (0xfff00293, (5, 0, 0, -1, "addi x5, x0, -1", False)),
+    (0x01f02323, (0, 0, 31, 6, "sw x31, 6(x0)", False)),
+    (0x00301203, (4, 0, 0, 3, "lh x4, 3(x0)", False)),
+    (0x00000463, (0, 0, 0, 8, "beq x0, x0, 0x108", True)),
+    (0x008000ef, (1, 0, 0, 8, "jal x1, 0x108", True)),
+    (0x00b5060b, (12, 10, 11, 0, "mac x12, x10, x11", False)),
+    (0x0000100b, (0, 0, 0, 0, "macrst", False)),
+    (0x00000013, (0, 0, 0, 0, "nop", False)),
+])
+def test_decode(instr, fields):
+    assert rv_model.decode(0x100, instr)[1:] == fields
+
+def test_log_format_and_x0_writes(tmp_path):
+    """Register writes are logged with their destination, x0 included (with the computed value, as the
+    RTL monitor does), but x0 keeps reading 0; the canonical nop has an empty effect."""
+    lines, _ = run_program(tmp_path, [
+        0xfff00293, # addi x5, x0, -1
+        0x00328013, # addi x0, x5, 3
+        0x00000333, # add x6, x0, x0
+        0x00000013, # nop
+        0x008000ef, # jal x1, +8
+        0x00000013, # nop (skipped)
+        0x00000463, # beq x0, x0, +8
+        0x00000013, # nop (skipped)
+    ])
+    assert lines == [
+        "0x00000000;0xfff00293;addi x5, x0, -1;x5=0xffffffff",
+        "0x00000004;0x00328013;addi x0, x5, 3;x0=0x00000002",
+        "0x00000008;0x00000333;add x6, x0, x0;x6=0x00000000",
+        "0x0000000c;0x00000013;nop;",
+        "0x00000010;0x008000ef;jal x1, 0x18;x1=0x00000014;pc=0x00000018",
+        "0x00000018;0x00000463;beq x0, x0, 0x20;taken=true;pc=0x00000020",
+        "0x00000020;0x10000e37;lui x28, 0x10000;x28=0x10000000",
+        "0x00000024;0x000e0e13;addi x28, x28, 0;x28=0x10000000",
+        "0x00000028;0xdeadcdb7;lui x27, 0xdeadc;x27=0xdeadc000",
+        "0x0000002c;0xeefd8d93;addi x27, x27, -273;x27=0xdeadbeef",
+        EOT_LINE.format(0x30),
+    ]
+
+def test_ecall_is_an_error(tmp_path):
+    """The core does not implement ecall/ebreak: the model must not end the test there."""
+    for instr in (0x00000073, 0x00100073):
+        with pytest.raises(rv_model.IssError):
+            run_program(tmp_path, [0x00000013, instr])
+
+def booth_rtl(rs1, rs2):
+    """Bit-level transcription of rp_to_pa and the partial-product sum of rtl/exu/mac.sv."""
+    a17 = ((rs1 >> 15) & 1) << 16 | rs1 & 0xffff
+    total = 0
+    for idx in range(8):
+        triplet = ((rs2 >> (2 * idx + 1)) & 1) << 2 | ((rs2 >> (2 * idx)) & 1) << 1 | ((rs2 >> (2 * idx - 1)) & 1 if idx else 0)
+        if triplet in (0b001, 0b010):
+            rp = a17
+        elif triplet == 0b011:
+            rp = (a17 << 1) & 0x1ffff
+        elif triplet == 0b100:
+            rp = (~(a17 << 1) + 1) & 0x1ffff
+        elif triplet in (0b101, 0b110):
+            rp = (~a17 + 1) & 0x1ffff
+        else:
+            rp = 0
+        partial = rp | 0xfffe0000 if rp >> 16 else rp # {{(XLEN-17){rp[16]}}, rp}
+        total += partial << (2 * idx)
+    return total & 0xffffffff
+
+@pytest.mark.parametrize("rs1, rs2, product", [
+    (7, 3, 21),
+    (2, 5, 10),
+    (0x12340003, 0xffff0005, 15), # Solo i 16 bit bassi degli operandi
+    (0xffff, 3, 0xfffffffd), # -1 * 3
+    (0x8000, 0x8000, 0xc0000000), # -32768 * -32768: il prodotto parziale -2a a 17 bit va in overflow in mac.sv
+    (0x7fff, 0x8000, 0xc0008000), # 32767 * -32768
+    (0x8000, 0x7fff, 0xc0008000),
+    (0x7fff, 0x7fff, 0x3fff0001),
+])
+def test_booth_mac_product(rs1, rs2, product):
+    assert booth_rtl(rs1, rs2) == product
+    assert rv_model.booth_mac_product(rs1, rs2) == product
+
+def test_booth_mac_product_random():
+    rng = random.Random(1)
+    for _ in range(2000):
+        rs1, rs2 = rng.getrandbits(32), rng.getrandbits(32)
+        assert rv_model.booth_mac_product(rs1, rs2) == booth_rtl(rs1, rs2)
+
+def test_mac_accumulates_and_resets(tmp_path):
+    lines, _ = run_program(tmp_path, [
+        0x00700513, # addi x10, x0, 7
+        0x00300593, # addi x11, x0, 3
+        0x00b5060b, # mac x12, x10, x11
+        0x00b5060b, # mac x12, x10, x11
+        0x0000100b, # macrst
+        0x00b5060b, # mac x12, x10, x11
+    ])
+    assert [line.rsplit(";", 1)[1] for line in lines[2:6]] == ["x12=0x00000015", "x12=0x0000002a", "", "x12=0x00000015"]
+
+def test_sub_word_and_misaligned_accesses(tmp_path):
+    """Stores log the whole access at its byte address (split ones included) and loads read across words."""
+    lines, dmem = run_program(tmp_path, [
+        0x112230b7, 0x34408093, # li x1, 0x11223344
+        0x00102023, 0x00102223, 0x00102423, # sw x1, 0/4/8(x0)
+        0xcafecfb7, 0xabef8f93, # li x31, 0xcafebabe
+        0x01f000a3, # sb x31, 1(x0)
+        0x01f011a3, # sh x31, 3(x0) (split)
+        0x01f02323, # sw x31, 6(x0) (split)
+        0x00100103, # lb x2, 1(x0)
+        0x00104183, # lbu x3, 1(x0)
+        0x00301203, # lh x4, 3(x0) (split)
+        0x00305283, # lhu x5, 3(x0) (split)
+        0x00502303, # lw x6, 5(x0) (split)
+        0x00402383, # lw x7, 4(x0)
+    ])
+    assert [line.split(";", 3)[3] for line in lines[7:16]] == [
+        "mem[0x00000001]=0x000000be",
+        "mem[0x00000003]=0x0000babe",
+        "mem[0x00000006]=0xcafebabe",
+        "x2=0xffffffbe",
+        "x3=0x000000be",
+        "x4=0xffffbabe",
+        "x5=0x0000babe",
+        "x6=0xfebabe33",
+        "x7=0xbabe33ba",
+    ]
+    assert bytes(dmem[:12]) == bytes([0x44, 0xbe, 0x22, 0xbe, 0xba, 0x33, 0xbe, 0xba, 0xfe, 0xca, 0x22, 0x11])
+
+def test_binary_trace_matches_text_log(tmp_path):
+    words = [0x112230b7, 0x34408093, 0x01f011a3, 0x00301203, 0x00000463, 0x00000013]
+    lines, _ = run_program(tmp_path, words)
+    (tmp_path / "bin").mkdir()
+    trace, _ = run_program(tmp_path / "bin", words, binary=True)
+    records = [rv_model.commit_trace.effect_record(int(p[0], 16), int(p[1], 16), p[3])
+               for p in (line.split(";", 3) for line in lines) if p[3]]
+    assert trace == b"".join(records)
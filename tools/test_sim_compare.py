@@ -0,0 +1,65 @@
+"""Checks of the ISS/RTL trace comparison (python -m pytest tools)."""
+
+import pytest
+
+import sim_compare
+import sim_config
+
+ISS_LOG = [
+    "0x00100000;0x00700513;addi x10, x0, 7;x10=0x00000007",
+    "0x00100004;0x00000013;nop;",
+    "0x00100008;0x00000463;beq x0, x0, 0x100010;taken=true;pc=0x00100010",
+    "0x00100010;0x01be2023;sw x27, 0(x28);mem[0x10000000]=0xdeadbeef",
+]
+RTL_LOG = [
+    "5;0x00100000;0x00700513;x10=0x00000007",
+    "",
+    "9;0x00100008;0x00000463;taken=true;pc=0x00100010",
+    "12;0x00100010;0x01be2023;mem[0x10000000]=0xdeadbeef",
+    "Total Cycles (MCYCLE) : 14",
+]
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sim_config, "WORK_DIR", str(tmp_path))
+    monkeypatch.setattr(sim_config, "COMMIT_TRACE", "text")
+    monkeypatch.setattr(sim_config, "VERBOSE", True)
+    (tmp_path / "t").mkdir()
+    return tmp_path / "t"
+
+def write_logs(work_dir, iss, rtl):
+    (work_dir / "iss.log").write_text("\n".join(iss) + "\n")
+    (work_dir / "rtl.log").write_text("\n".join(rtl) + "\n")
+
+def test_events_skip_lines_without_effect():
+    assert list(sim_compare.log_events(ISS_LOG, 0)) == list(sim_compare.rtl_events(RTL_LOG))
+
+def test_rtl_trace_lines_drop_termination():
+    assert list(sim_compare.rtl_trace_lines(RTL_LOG, False)) == [line for line in RTL_LOG if line]
+    assert list(sim_compare.rtl_trace_lines(RTL_LOG, True)) == [RTL_LOG[0], RTL_LOG[2], RTL_LOG[4]]
+
+def test_first_mismatch_pads_the_shorter_trace():
+    events = [("1", "2", "X1=0X1"), ("2", "3", "X2=0X2")]
+    assert sim_compare.first_mismatch(iter(events), iter(events)) is None
+    assert sim_compare.first_mismatch(iter(events), iter(events[:1])) == (1, events[1], ("RTL_MISSING",) * 3)
+    assert sim_compare.first_mismatch(iter(events[:1]), iter(events)) == (1, ("ISS_MISSING",) * 3, events[1])
+
+def test_compare_results(work_dir, capsys):
+    write_logs(work_dir, ISS_LOG, RTL_LOG)
+    assert sim_compare.compare_results("t")
+    assert capsys.readouterr().out.rstrip().endswith("PASSED")
+    write_logs(work_dir, ISS_LOG, RTL_LOG[:2] + ["9;0x00100008;0x00000463;taken=false"] + RTL_LOG[3:])
+    assert not sim_compare.compare_results("t")
+    assert "First mismatch at index 1:" in (work_dir / "sim.log").read_text()
+    assert sim_compare.event_cycle("t", 1) == 9
+
+def test_process_rtl_log_keeps_lockstep_logs(work_dir):
+    write_logs(work_dir, ISS_LOG, RTL_LOG)
+    sim_compare.LOCKSTEP_TESTS.add("t")
+    try:
+        sim_compare.process_rtl_log("t")
+    finally:
+        sim_compare.LOCKSTEP_TESTS.discard("t")
+    assert (work_dir / "rtl.log").read_text() == "\n".join(RTL_LOG) + "\n"
+    sim_compare.process_rtl_log("t")
+    assert (work_dir / "rtl.log").read_text() == "\n".join(line for line in RTL_LOG if line) + "\n"
@@ -0,0 +1,80 @@
+"""Checks of the memory images built from the ELF sections (python -m pytest tools)."""
+
+import os
+import shutil
+import struct
+
+import pytest
+
+import sim_config
+import sim_frontend
+import sim_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHF_WRITE, SHF_ALLOC, SHF_EXECINSTR = 0x1, 0x2, 0x4
+SHT_PROGBITS, SHT_NOBITS, SHT_STRTAB = 1, 8, 3
+
+def write_elf(path, sections):
+    """Minimal ELF32 RISC-V with the given (name, type, flags, addr, data or size) sections."""
+    names = b"\0" + b"".join(s[0].encode() + b"\0" for s in sections) + b".shstrtab\0"
+    body, headers, name_off = b"", [struct.pack("<10I", *[0] * 10)], 1
+    for name, sh_type, flags, addr, data in sections:
+        offset = 52 + len(body)
+        size = data if sh_type == SHT_NOBITS else len(data)
+        body += b"" if sh_type == SHT_NOBITS else data
+        headers.append(struct.pack("<10I", name_off, sh_type, flags, addr, offset, size, 0, 0, 4, 0))
+        name_off += len(name) + 1
+    headers.append(struct.pack("<10I", name_off, SHT_STRTAB, 0, 0, 52 + len(body), len(names), 0, 0, 1, 0))
+    body += names
+    body += b"\0" * (-len(body) % 4)
+    ident = b"\x7fELF\x01\x01\x01" + b"\0" * 9
+    header = ident + struct.pack("<HHIIIIIHHHHHH", 2, 0xf3, 1, 0x100000, 0, 52 + len(body), 0, 52, 0, 0, 40,
+                                 len(headers), len(headers) - 1)
+    with open(path, "wb") as f:
+        f.write(header + body + b"".join(headers))
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(sim_config, "WORK_DIR", str(tmp_path))
+    (tmp_path / "c.helloworld").mkdir()
+    return tmp_path
+
+def test_default_link_layout(work_dir):
+    """Layout of a C test linked with -Ttext only: page-aligned data past the DCCM end and a .bss bigger
+    than the memory. The data aliases on the low address bits like on the RTL, .bss is not loaded."""
+    write_elf(work_dir / "c.helloworld" / "test.elf", [
+        (".text", SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, 0x100000, bytes(range(1, 17))),
+        (".rodata", SHT_PROGBITS, SHF_ALLOC, 0x100010, b"hello\0\0\0"),
+        (".sdata", SHT_PROGBITS, SHF_ALLOC | SHF_WRITE, 0x101ffc, b"\xaa\xbb\xcc\xdd\xee\xff\x11\x22"),
+        (".bss", SHT_NOBITS, SHF_ALLOC | SHF_WRITE, 0x102004, 0x4000),
+    ])
+    imem, dmem, has_dmem = sim_images.memory_images("c.helloworld")
+    assert has_dmem and len(imem) == len(dmem) == 4096
+    assert imem[:16] == bytes(range(1, 17))
+    assert dmem[0x10:0x18] == b"hello\0\0\0"
+    assert dmem[0xffc:] == b"\xaa\xbb\xcc\xdd" and dmem[:4] == b"\xee\xff\x11\x22"
+    assert not any(dmem[4:0x10]) and not any(dmem[0x18:0xffc])
+
+def test_sections_overlapping_once_folded(work_dir):
+    write_elf(work_dir / "c.helloworld" / "test.elf", [
+        (".text", SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, 0x100000, b"\x13\0\0\0"),
+        (".rodata", SHT_PROGBITS, SHF_ALLOC, 0x100010, b"\1" * 8),
+        (".data", SHT_PROGBITS, SHF_ALLOC | SHF_WRITE, 0x101014, b"\2" * 8),
+    ])
+    with pytest.raises(Exception, match="overlap"):
+        sim_images.memory_images("c.helloworld")
+
+def test_section_larger_than_memory(work_dir):
+    write_elf(work_dir / "c.helloworld" / "test.elf", [
+        (".text", SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, 0x100000, b"\x13\0\0\0" * 1025),
+    ])
+    with pytest.raises(Exception, match="does not fit in ICCM"):
+        sim_images.memory_images("c.helloworld")
+
+@pytest.mark.skipif(not shutil.which("riscv64-unknown-elf-gcc"), reason="RISC-V toolchain not installed")
+def test_helloworld_build(work_dir):
+    """The real C test, compiled with the command of the flow, loads in both memories."""
+    sim_frontend.run_gen("c.helloworld")
+    imem, _, has_dmem = sim_images.memory_images("c.helloworld")
+    assert has_dmem and any(imem)
@@ -0,0 +1,30 @@
+"""Checks of the performance report parsing, baseline regressions and PMU samples (python -m pytest tools)."""
+
+import struct
+
+import sim_perf
+import sim_pmu
+
+def test_parse_perf_report(tmp_path):
+    path = tmp_path / "rtl.log"
+    path.write_text("12;0x00100000;0x00000013;x0=0x00000000\n"
+                    "Total Cycles (MCYCLE)      : 1200\n"
+                    "Retired Instructions       : 1000\n"
+                    "IPC (Instructions/Cycle)   : 0.833\n"
+                    "Misprediction Rate        : 2.50\n")
+    assert sim_perf.parse_perf_report(str(path)) == {"cycles": 1200, "instret": 1000, "ipc": 0.833, "mispredict_rate": 2.5}
+    assert sim_perf.parse_perf_report(str(tmp_path / "missing.log")) == {}
+
+def test_perf_regressions():
+    baseline = {"a": {"cycles": 1000, "ipc": 1.0}, "b": {"cycles": 1000, "ipc": 1.0}}
+    results = [{"test": "b", "cycles": 1010, "ipc": 0.99}, {"test": "a", "cycles": 1100, "ipc": 0.9}, {"test": "c", "cycles": 5}]
+    assert sim_perf.perf_regressions(results, baseline, 2.0) == [
+        "a: cycles 1000 -> 1100 (+10.00%)",
+        "a: IPC 1.000 -> 0.900 (-10.00%)",
+    ]
+
+def test_pmu_samples_undo_wrap_around(tmp_path):
+    path = tmp_path / "pmu.smp"
+    samples = [(0xfffffff0, 10, 1), (0x00000010, 20, 2), (0x00000020, 30, 2)]
+    path.write_bytes(struct.pack("<II", sim_pmu.PMU_SAMPLE_MAGIC, 3) + b"".join(struct.pack("<3I", *s) for s in samples))
+    assert sim_pmu.read_pmu_samples(str(path)) == [(0xfffffff0, 10, 1), (0x100000010, 20, 2), (0x100000020, 30, 2)]
@@ -0,0 +1,53 @@
+"""Checks of the --shard split and of the merge subcommand (python -m pytest tools)."""
+
+import json
+
+import pytest
+
+import sim_config
+import sim_shard
+
+def test_parse_shard():
+    assert sim_shard.parse_shard("2/3") == (2, 3)
+    for spec in ("0/3", "4/3"):
+        with pytest.raises(ValueError):
+            sim_shard.parse_shard(spec)
+
+def test_split_shards_balances_and_covers():
+    durations = {"a": 10.0, "b": 6.0, "c": 5.0, "d": 4.0, "e": 1.0}
+    shards, loads = sim_shard.split_shards(["e", "d", "c", "b", "a", "a"], 2, durations)
+    assert shards == [["a", "d"], ["b", "c", "e"]]
+    assert loads == [14.0, 12.0]
+    # Lo split non dipende dall'ordine della lista, i test mai misurati pesano la mediana
+    assert sim_shard.split_shards(["new", "a", "b"], 2, durations) == sim_shard.split_shards(["b", "new", "a"], 2, durations)
+    assert sorted(sum(sim_shard.split_shards(["new", "a", "b"], 2, durations)[0], [])) == ["a", "b", "new"]
+
+def shard_report(tmp_path, index, results, tests):
+    work_dir = tmp_path / f"shard{index}"
+    work_dir.mkdir()
+    sim_shard.SHARD = (index, 2)
+    sim_shard.write_shard_results(str(work_dir / sim_shard.SHARD_RESULTS_NAME), tests, results, "verilator", 1.5)
+    return str(work_dir)
+
+def test_merge(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sim_config, "DURATIONS_PATH", str(tmp_path / "durations.json"))
+    monkeypatch.setattr(sim_shard, "SHARD", None)
+    tests = ["t1", "t2", "t3"]
+    first = shard_report(tmp_path, 1, [{"test": "t1", "status": "PASSED", "duration": 2.0}], tests)
+    second = shard_report(tmp_path, 2, [{"test": "t2", "status": "FAILED", "duration": 1.0},
+                                        {"test": "t3", "status": "PASSED", "duration": 3.0}], tests)
+    output = tmp_path / "merged.json"
+    assert sim_shard.merge_main([first, second, "-o", str(output)]) == 1
+    merged = json.loads(output.read_text())
+    assert merged["problems"] == []
+    assert merged["totals"]["tests"] == 3 and merged["totals"]["passed"] == 2 and merged["totals"]["failed"] == 1
+    assert json.loads((tmp_path / "durations.json").read_text()) == {"t1": 2.0, "t2": 1.0, "t3": 3.0}
+    assert "t2 ....... FAILED (shard 2)" in capsys.readouterr().out
+
+def test_merge_reports_missing_shard(tmp_path, monkeypatch):
+    monkeypatch.setattr(sim_config, "DURATIONS_PATH", str(tmp_path / "durations.json"))
+    monkeypatch.setattr(sim_shard, "SHARD", None)
+    first = shard_report(tmp_path, 1, [{"test": "t1", "status": "PASSED", "duration": 2.0}], ["t1", "t2"])
+    output = tmp_path / "merged.json"
+    assert sim_shard.merge_main([first, "-o", str(output)]) == 1
+    assert json.loads(output.read_text())["problems"] == ["missing shards: 2"]